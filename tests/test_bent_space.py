@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from wormhole import create_bent_space
+
+
+def _is_inside_circle(x, z, circle_center_x, circle_center_z, circle_radius):
+    return (x - circle_center_x) ** 2 + (z - circle_center_z) ** 2 <= circle_radius ** 2
+
+
+def _create_bent_space_loops(num_u, num_v, width, radius, extension_length, hole_radius):
+    """The original nested-loop builder, the reference of the vectorized one."""
+    vertices = []
+    faces = []
+    num_bend = num_v // 3
+    num_extension = num_v - num_bend
+
+    for i in range(num_bend):
+        angle = np.pi * (i / (num_bend - 1))
+        y = radius * np.cos(angle) - radius
+        z = radius * np.sin(angle)
+        for j in range(num_u):
+            u = j / (num_u - 1)
+            x = (u - 0.5) * width
+            vertices.append((x, y, z))
+    for i in range(num_extension):
+        y = -2 * radius
+        z = -i / (num_extension - 1) * extension_length
+        for j in range(num_u):
+            u = j / (num_u - 1)
+            x = (u - 0.5) * width
+            vertices.append((x, y, z))
+    for i in range(num_extension):
+        y = 0
+        z = -i / (num_extension - 1) * extension_length
+        for j in range(num_u):
+            u = j / (num_u - 1)
+            x = (u - 0.5) * width
+            vertices.append((x, y, z))
+
+    hole_center_x = 0
+    hole_center_z = -extension_length / 2
+
+    for i in range(num_bend - 1):
+        for j in range(num_u - 1):
+            x_center = (j + 0.5) / num_u * width - width / 2
+            z_center = radius * np.sin(np.pi * (i + 0.5) / (num_bend - 1))
+            if _is_inside_circle(x_center, z_center, hole_center_x, hole_center_z, hole_radius):
+                continue
+            idx1 = i * num_u + j
+            idx2 = idx1 + num_u
+            faces.append([idx1, idx2, idx2 + 1])
+            faces.append([idx1, idx2 + 1, idx1 + 1])
+    for base_idx in (num_bend * num_u, num_v * num_u):
+        for i in range(num_extension - 1):
+            for j in range(num_u - 1):
+                x_center = (j + 0.5) / num_u * width - width / 2
+                z_center = - (i + 0.5) / (num_extension - 1) * extension_length
+                if _is_inside_circle(x_center, z_center, hole_center_x, hole_center_z, hole_radius):
+                    continue
+                idx1 = base_idx + i * num_u + j
+                idx2 = idx1 + num_u
+                faces.append([idx1, idx2, idx2 + 1])
+                faces.append([idx1, idx2 + 1, idx1 + 1])
+
+    return np.array(vertices), np.array(faces)
+
+
+@pytest.mark.parametrize("params", [
+    (100, 90, 10, 5, 10, 1.0),  # the defaults of the script
+    (100, 90, 10, 5, 10, 0.0),  # no hole
+    (40, 30, 10, 5, 10, 12.0),  # a hole wider than the plane: no extension faces
+    (2, 6, 10, 5, 10, 1.0),  # the smallest grid
+    (7, 13, 3.5, 2.0, 6.0, 1.3),  # odd resolutions, num_v not a multiple of 3
+    (33, 47, 8.0, 1.5, 4.0, 0.7),
+])
+def test_matches_loop_builder(params):
+    vertices, faces = create_bent_space(*params)
+    expected_vertices, expected_faces = _create_bent_space_loops(*params)
+    np.testing.assert_array_equal(faces, expected_faces.reshape(-1, 3))
+    assert vertices.dtype == np.float32
+    np.testing.assert_array_equal(vertices, expected_vertices.astype(np.float32))
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from wormhole import boundary_loops, create_bent_space_adaptive
+from wormhole_sdf import HalfPipe, HoledRectangle, Union
+
+WIDTH, RADIUS, EXTENSION_LENGTH, HOLE_RADIUS = 10, 5, 10, 1.0
+
+
+def _ideal_surface():
+    """The surface create_bent_space_adaptive approximates, as in wormhole_sdf.bent_space_scene without the cylinder."""
+    plate = HoledRectangle(WIDTH, EXTENSION_LENGTH, HOLE_RADIUS)
+    return Union(HalfPipe(WIDTH, RADIUS).translate([0, -RADIUS, 0]),
+                 plate.translate([0, -2 * RADIUS, -EXTENSION_LENGTH / 2]),
+                 plate.translate([0, 0, -EXTENSION_LENGTH / 2]))
+
+
+def _face_samples(vertices, faces):
+    """The vertices, edge midpoints and centroid of every face, and points in between."""
+    weights = np.array([[a, b, 4 - a - b] for a in range(5) for b in range(5 - a)], dtype=np.float64) / 4
+    return np.einsum("sk,fkd->fsd", weights, vertices[faces]).reshape(-1, 3)
+
+
+@pytest.mark.parametrize("tolerance", [0.1, 0.01, 0.001])
+def test_surface_error(tolerance):
+    vertices, faces = create_bent_space_adaptive(WIDTH, RADIUS, EXTENSION_LENGTH, HOLE_RADIUS, tolerance,
+                                                 dtype=np.float64)
+    distance = _ideal_surface()(_face_samples(vertices, faces))
+    assert distance.max() <= tolerance * (1 + 1e-9)
+    # and the vertices lie on the surface
+    np.testing.assert_allclose(_ideal_surface()(vertices), 0, atol=1e-12)
+
+
+@pytest.mark.parametrize("tolerance", [0.1, 0.01, 0.001])
+def test_manifold_and_oriented(tolerance):
+    vertices, faces = create_bent_space_adaptive(WIDTH, RADIUS, EXTENSION_LENGTH, HOLE_RADIUS, tolerance)
+    assert faces.dtype == np.int32
+    assert np.array_equal(np.unique(faces), np.arange(len(vertices)))
+
+    # consistently oriented: every half-edge once, and an edge has at most two faces
+    half_edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    assert len(np.unique(half_edges, axis=0)) == len(half_edges)
+    edges, counts = np.unique(np.sort(half_edges, axis=1), axis=0, return_counts=True)
+    assert counts.max() == 2
+    # connected, a rectangle (1) with two holes (-2)
+    assert len(vertices) - len(edges) + len(faces) == -1
+
+    loops = sorted(boundary_loops(faces), key=len)
+    assert len(loops) == 3
+    # the two holes are circles, the longest loop is the outer rim
+    assert sorted(float(vertices[hole[0], 1]) for hole in loops[:2]) == [-2 * RADIUS, 0]
+    for hole in loops[:2]:
+        points = vertices[hole].astype(np.float64)
+        np.testing.assert_allclose(np.hypot(points[:, 0], points[:, 2] + EXTENSION_LENGTH / 2), HOLE_RADIUS,
+                                   rtol=1e-6)
+
+
+def test_normals_away_from_the_bend_axis():
+    vertices, faces = create_bent_space_adaptive(WIDTH, RADIUS, EXTENSION_LENGTH, HOLE_RADIUS, 0.01,
+                                                 dtype=np.float64)
+    v = vertices[faces]
+    normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    centroids = v.mean(axis=1)
+    # from the axis of the bend (y = -radius, z = 0), or from the plane between the extensions
+    away = centroids - [0, -RADIUS, 0]
+    flat = centroids[:, 2] < -1e-9
+    away[flat, 2] = 0
+    away[:, 0] = 0
+    assert np.all(np.einsum("ij,ij->i", normals, away) > 0)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from wormhole import create_bent_space, create_wormhole
+from wormhole_bvh import TriangleBVH, closest_point_on_triangles
+
+
+def _brute_force(vertices, faces, points):
+    """Distance to every triangle of every point, the nearest kept."""
+    a, b, c = (np.repeat(vertices[faces[:, k]][None], len(points), axis=0).reshape(-1, 3) for k in range(3))
+    p = np.repeat(points, len(faces), axis=0)
+    closest, _ = closest_point_on_triangles(p, a, b, c)
+    distance = np.linalg.norm(closest - p, axis=1).reshape(len(points), len(faces))
+    return distance.min(axis=1), distance
+
+
+def _cube():
+    """The unit cube [-1, 1]^3, outward oriented."""
+    vertices = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=np.float64)
+    quads = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    faces = np.array([t for a, b, c, d in quads for t in ((a, b, c), (a, c, d))])
+    return vertices, faces
+
+
+@pytest.mark.parametrize("mesh", ["bent_space", "cylinder"])
+@pytest.mark.parametrize("leaf_size", [1, 8])
+def test_query_matches_brute_force(mesh, leaf_size):
+    if mesh == "bent_space":
+        vertices, faces = create_bent_space(20, 18, 10, 5, 10, 1.0, dtype=np.float64)
+    else:
+        vertices, faces = create_wormhole(1, 0.5, 3, 12)
+    vertices = np.asarray(vertices, dtype=np.float64)
+    rng = np.random.default_rng(0)
+    lo, hi = vertices.min(axis=0) - 1, vertices.max(axis=0) + 1
+    points = rng.uniform(lo, hi, (200, 3))
+
+    distance, closest, triangle = TriangleBVH(vertices, faces, leaf_size=leaf_size).query(points, batch_size=64)
+    expected, per_triangle = _brute_force(vertices, faces, points)
+    np.testing.assert_allclose(distance, expected, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(np.linalg.norm(closest - points, axis=1), distance, rtol=0, atol=1e-12)
+    # the triangle reported is one of the nearest (ties between neighbors are possible)
+    np.testing.assert_allclose(per_triangle[np.arange(len(points)), triangle], expected, rtol=0, atol=1e-12)
+
+
+def test_workers_give_the_same_result():
+    vertices, faces = create_bent_space(20, 18, 10, 5, 10, 1.0, dtype=np.float64)
+    points = np.random.default_rng(1).uniform(-6, 6, (500, 3))
+    bvh = TriangleBVH(vertices, faces)
+    for serial, threaded in zip(bvh.query(points, batch_size=50), bvh.query(points, workers=3, batch_size=50)):
+        np.testing.assert_array_equal(serial, threaded)
+
+
+def test_signed_distance_of_a_cube():
+    vertices, faces = _cube()
+    rng = np.random.default_rng(2)
+    points = rng.uniform(-2, 2, (1000, 3))
+    signed = TriangleBVH(vertices, faces).signed_distance(points)
+    # exact signed distance of the box, also in the regions of its edges and corners
+    q = np.abs(points) - 1
+    expected = np.linalg.norm(np.maximum(q, 0), axis=1) + np.minimum(q.max(axis=1), 0)
+    np.testing.assert_allclose(signed, expected, rtol=0, atol=1e-12)
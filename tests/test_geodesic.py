@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from wormhole_geodesic import HeatGeodesics
+
+
+def _grid(n):
+    """A flat unit square of n x n vertices."""
+    u = np.linspace(0, 1, n)
+    x, y = np.meshgrid(u, u, indexing="ij")
+    vertices = np.stack([x.ravel(), y.ravel(), np.zeros(n * n)], axis=-1)
+    index = np.arange(n * n).reshape(n, n)
+    a, b, c, d = index[:-1, :-1].ravel(), index[1:, :-1].ravel(), index[1:, 1:].ravel(), index[:-1, 1:].ravel()
+    return vertices, np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+
+
+def _cylinder(num_u, num_v, radius=1.0, height=3.0):
+    """An open cylinder, with the angle and height of every vertex."""
+    theta, z = np.meshgrid(np.linspace(0, 2 * np.pi, num_u, endpoint=False), np.linspace(0, height, num_v),
+                           indexing="ij")
+    vertices = np.stack([radius * np.cos(theta).ravel(), radius * np.sin(theta).ravel(), z.ravel()], axis=-1)
+    index = np.arange(num_u * num_v).reshape(num_u, num_v)
+    next_u = np.roll(index, -1, axis=0)
+    a, b, c, d = index[:, :-1].ravel(), next_u[:, :-1].ravel(), next_u[:, 1:].ravel(), index[:, 1:].ravel()
+    faces = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+    return vertices, faces, theta.ravel(), z.ravel()
+
+
+def _relative_errors(distance, exact, near):
+    # the heat method smooths the cone at the source, the first rings are left out
+    far = exact > near
+    return np.abs(distance - exact)[far] / exact[far]
+
+
+@pytest.mark.parametrize("boundary", ["neumann", "average"])
+@pytest.mark.parametrize("source", ["corner", "center"])
+def test_flat_grid(boundary, source):
+    n = 41
+    vertices, faces = _grid(n)
+    index = 0 if source == "corner" else n * n // 2
+    exact = np.linalg.norm(vertices - vertices[index], axis=1)
+    errors = _relative_errors(HeatGeodesics(vertices, faces, boundary=boundary).distance(index), exact, 0.2)
+    assert errors.max() < 0.05
+    assert errors.mean() < 0.02
+
+
+@pytest.mark.parametrize("boundary", ["neumann", "average"])
+def test_cylinder(boundary):
+    num_u, num_v, radius = 96, 80, 1.0
+    vertices, faces, theta, z = _cylinder(num_u, num_v, radius)
+    index = num_v // 2
+    # unrolled, the cylinder is a strip that wraps around
+    angle = np.abs((theta - theta[index] + np.pi) % (2 * np.pi) - np.pi)
+    exact = np.hypot(radius * angle, z - z[index])
+    errors = _relative_errors(HeatGeodesics(vertices, faces, boundary=boundary).distance(index), exact, 0.3)
+    assert errors.max() < 0.07
+    assert errors.mean() < 0.025
+
+
+def test_batch_matches_single_queries():
+    vertices, faces = _grid(21)
+    geodesics = HeatGeodesics(vertices, faces)
+    batch = geodesics.distance([[0], [220, 10]])
+    np.testing.assert_allclose(batch[0], geodesics.distance(0))
+    np.testing.assert_allclose(batch[1], geodesics.distance([220, 10]))
+
+
+def test_disconnected_parts_are_inf():
+    vertices, faces = _grid(11)
+    shifted = np.concatenate([vertices, vertices + [2, 0, 0]])
+    distance = HeatGeodesics(shifted, np.concatenate([faces, faces + len(vertices)])).distance(0)
+    assert np.all(np.isfinite(distance[:len(vertices)]))
+    assert np.all(np.isinf(distance[len(vertices):]))
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from wormhole_incremental import IncrementalWormhole
+from wormhole_pipelines import run_pipeline
+
+CHOICES = {
+    "num_u": [2, 7, 20, 31],
+    "num_v": [6, 21, 33, 40],
+    "width": [3.0, 10.0],
+    "radius": [2.0, 5.0],
+    "extension_length": [4.0, 10.0],
+    "hole_radius": [0.0, 1.0, 20.0],
+    "cylinder_radius_top": [0.5, 1.0],
+    "cylinder_segments": [6, 30],
+    "cylinder_height": [None, 7.5],
+    "precision": ["float32", "float64"],
+}
+
+
+def _assert_full_rebuild(wormhole, vertices, faces):
+    expected = run_pipeline("bent-space", **wormhole.params)
+    assert vertices.dtype == expected["vertices"].dtype
+    np.testing.assert_array_equal(vertices, expected["vertices"])
+    np.testing.assert_array_equal(faces, expected["faces"])
+
+
+def test_offsets_move_with_num_v():
+    # the extension and cylinder face blocks keep their length but not their vertex offset
+    wormhole = IncrementalWormhole(num_u=20, num_v=21, hole_radius=20.0)
+    _assert_full_rebuild(wormhole, *wormhole.update(num_v=33))
+    _assert_full_rebuild(wormhole, *wormhole.update(width=5.0))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_random_updates_match_full_rebuilds(seed):
+    rng = np.random.default_rng(seed)
+    wormhole = IncrementalWormhole(num_u=7, num_v=21)
+    for _ in range(12):
+        names = rng.choice(list(CHOICES), size=rng.integers(1, 4), replace=False)
+        changes = {name: CHOICES[name][rng.integers(len(CHOICES[name]))] for name in names}
+        _assert_full_rebuild(wormhole, *wormhole.update(**changes))
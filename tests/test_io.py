@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from wormhole import create_bent_space
+from wormhole_io import create_volume, load_mesh, load_ply, load_volume, save_mesh, save_ply, save_volume
+
+
+@pytest.fixture
+def mesh():
+    vertices, faces = create_bent_space(12, 10, 4, 1, 0.5, 0.5)
+    return vertices.astype(np.float32), faces.astype(np.int32)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_ply_round_trip(tmp_path, mesh, mmap):
+    path = str(tmp_path / "mesh.ply")
+    save_mesh(path, *mesh)
+    vertices, faces = load_mesh(path, mmap=mmap)
+    assert isinstance(faces, np.memmap) == mmap
+    np.testing.assert_array_equal(vertices, mesh[0])
+    np.testing.assert_array_equal(faces, mesh[1])
+
+
+def test_obj_round_trip(tmp_path, mesh):
+    path = str(tmp_path / "mesh.obj")
+    save_mesh(path, *mesh)
+    vertices, faces = load_mesh(path)
+    np.testing.assert_array_equal(vertices, mesh[0])
+    np.testing.assert_array_equal(faces, mesh[1])
+
+
+def _write_ply(path, ply_format, header, body):
+    with open(path, "wb") as f:
+        f.write(f"ply\nformat {ply_format} 1.0\n{header}end_header\n".encode("ascii"))
+        f.write(body)
+
+
+def test_binary_ply_other_layouts(tmp_path, mesh):
+    vertices, faces = mesh
+    # big endian doubles with an extra property, then int counts and uint indices
+    vertex_records = np.empty(len(vertices), dtype=[("x", ">f8"), ("y", ">f8"), ("z", ">f8"), ("s", ">u2")])
+    for axis, values in zip("xyz", vertices.T):
+        vertex_records[axis] = values
+    vertex_records["s"] = 7
+    face_records = np.empty(len(faces), dtype=[("n", ">i4"), ("v", ">u4", (3,))])
+    face_records["n"], face_records["v"] = 3, faces
+    header = (f"element vertex {len(vertices)}\nproperty double x\nproperty double y\nproperty double z\n"
+              f"property ushort s\nelement face {len(faces)}\nproperty list int uint vertex_index\n")
+    path = str(tmp_path / "big.ply")
+    _write_ply(path, "binary_big_endian", header, vertex_records.tobytes() + face_records.tobytes())
+    loaded_vertices, loaded_faces = load_ply(path)
+    np.testing.assert_array_equal(loaded_vertices, vertices)
+    np.testing.assert_array_equal(loaded_faces, faces)
+
+    face_records["n"][1] = 4
+    _write_ply(path, "binary_big_endian", header, vertex_records.tobytes() + face_records.tobytes())
+    with pytest.raises(ValueError, match="not triangles"):
+        load_ply(path)
+
+
+def test_ascii_ply(tmp_path, mesh):
+    vertices, faces = mesh
+    header = (f"element vertex {len(vertices)}\nproperty float x\nproperty float y\nproperty float z\n"
+              f"element face {len(faces)}\nproperty list uchar int vertex_indices\n")
+    body = "".join("%.9g %.9g %.9g\n" % tuple(v) for v in vertices) + "".join("3 %d %d %d\n" % tuple(f) for f in faces)
+    path = str(tmp_path / "ascii.ply")
+    _write_ply(path, "ascii", header, body.encode("ascii"))
+    loaded_vertices, loaded_faces = load_ply(path)
+    np.testing.assert_array_equal(loaded_vertices, vertices)
+    np.testing.assert_array_equal(loaded_faces, faces)
+
+
+def test_ply_index_overflow(tmp_path, mesh):
+    path = tmp_path / "overflow.ply"
+    faces = mesh[1].astype(np.int64)
+    faces[0, 0] = np.iinfo(np.int32).max + 1
+    with pytest.raises(ValueError, match="int32"):
+        save_ply(str(path), mesh[0], faces)
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_volume_round_trip(tmp_path, dtype):
+    volume = np.random.default_rng(0).standard_normal((5, 6, 7)).astype(dtype)
+    path = str(tmp_path / "field.vol")
+    save_volume(path, volume, origin=(-1.0, -2.0, -3.0), spacing=(0.5, 0.25, 0.125))
+    loaded, header = load_volume(path)
+    assert isinstance(loaded, np.memmap)
+    assert loaded.dtype == dtype and header["shape"] == volume.shape
+    assert header["origin"] == [-1.0, -2.0, -3.0] and header["spacing"] == [0.5, 0.25, 0.125]
+    np.testing.assert_array_equal(loaded, volume)
+
+    # streamed into a created volume instead
+    out = create_volume(path, volume.shape, dtype=dtype)
+    out[...] = volume
+    out.flush()
+    del out
+    np.testing.assert_array_equal(load_volume(path)[0], volume)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors
+
+from wormhole_knn import knn_triangles, laplacian_smooth, smoothing_operator
+
+
+def _knn_triangles_loop(indices):
+    """The original loop of wormhole_df_kNN.py, the reference of knn_triangles."""
+    vertex_map = {}
+    faces = []
+    for i in range(len(indices)):
+        if i not in vertex_map:
+            vertex_map[i] = len(vertex_map)
+        for j in indices[i]:
+            if j != i and j in vertex_map:
+                for k in indices[j]:
+                    if k != j and k in vertex_map and k != i:
+                        face = sorted([vertex_map[i], vertex_map[j], vertex_map[k]])
+                        if face not in faces:
+                            faces.append(face)
+    return np.array(faces).reshape(-1, 3)
+
+
+def _smooth_loop(vertices, indices, iterations):
+    """The original smoothing loop of wormhole_df_kNN.py."""
+    for _ in range(iterations):
+        smoothed_vertices = np.copy(vertices)
+        for i in range(len(vertices)):
+            smoothed_vertices[i] = np.mean(vertices[indices[i]], axis=0)
+        vertices = smoothed_vertices
+    return vertices
+
+
+def _sphere_cloud(n, seed=0, noise=0.0):
+    rng = np.random.default_rng(seed)
+    points = rng.standard_normal((n, 3))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points + noise * rng.standard_normal((n, 3))
+
+
+@pytest.mark.parametrize("k", [3, 5, 8])
+def test_knn_triangles_matches_loop(k):
+    points = _sphere_cloud(300)
+    _, indices = NearestNeighbors(n_neighbors=k).fit(points).kneighbors(points)
+    faces = knn_triangles(indices)
+    assert faces.dtype == np.int32
+    np.testing.assert_array_equal(faces, _knn_triangles_loop(indices))
+
+
+def test_uniform_smoothing_matches_loop():
+    points = _sphere_cloud(300, noise=0.05)
+    _, indices = NearestNeighbors(n_neighbors=5).fit(points).kneighbors(points)
+    smoothed = laplacian_smooth(points, smoothing_operator(len(points), indices=indices), iterations=5)
+    np.testing.assert_allclose(smoothed, _smooth_loop(points, indices, 5), rtol=0, atol=1e-12)
+
+
+def test_taubin_steps():
+    points = _sphere_cloud(500, noise=0.02)
+    _, indices = NearestNeighbors(n_neighbors=8).fit(points).kneighbors(points)
+    operator = smoothing_operator(len(points), indices=indices)
+    dense = operator.toarray()
+    expected = points
+    for _ in range(3):
+        for step in (0.5, -0.53):
+            expected = expected + step * (dense @ expected - expected)
+    taubin = laplacian_smooth(points, operator, iterations=3, lam=0.5, mu=-0.53)
+    np.testing.assert_allclose(taubin, expected, rtol=0, atol=1e-12)
+    # plain averaging shrinks the sphere, Taubin's inflating steps keep it close to its radius
+    plain = laplacian_smooth(points, operator, iterations=3)
+    assert abs(np.linalg.norm(taubin, axis=1).mean() - 1) < abs(np.linalg.norm(plain, axis=1).mean() - 1)
+
+
+@pytest.mark.parametrize("weights", ["uniform", "cotangent"])
+def test_mesh_operator_fixes_flat_interior(weights):
+    # a flat regular grid: every interior vertex is the (cotangent or uniform) mean of its edge neighbors
+    n = 8
+    x, y = np.meshgrid(np.arange(n, dtype=np.float64), np.arange(n, dtype=np.float64), indexing="ij")
+    vertices = np.stack([x.ravel(), y.ravel(), np.zeros(n * n)], axis=-1)
+    index = np.arange(n * n).reshape(n, n)
+    a, b, c, d = index[:-1, :-1].ravel(), index[1:, :-1].ravel(), index[1:, 1:].ravel(), index[:-1, 1:].ravel()
+    faces = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+    operator = smoothing_operator(len(vertices), vertices=vertices, faces=faces, weights=weights)
+    np.testing.assert_allclose(np.asarray(operator.sum(axis=1)).ravel(), 1)
+    interior = index[1:-1, 1:-1].ravel()
+    np.testing.assert_allclose((operator @ vertices)[interior], vertices[interior], atol=1e-12)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from wormhole_bvh import TriangleBVH
+from wormhole_lod import build_lod, load_lod, save_lod, select_level
+from wormhole_pipelines import run_pipeline
+
+
+def _surface_samples(vertices, faces, per_face, rng):
+    """The vertices, edge midpoints and random points of every face."""
+    a, b, c = (vertices[faces[:, k]] for k in range(3))
+    r = rng.random((len(faces), per_face, 2))
+    r[r.sum(axis=2) > 1] = 1 - r[r.sum(axis=2) > 1]
+    interior = a[:, None] + r[..., :1] * (b - a)[:, None] + r[..., 1:] * (c - a)[:, None]
+    return np.concatenate([vertices[np.unique(faces)], (a + b) / 2, (b + c) / 2, (c + a) / 2,
+                           interior.reshape(-1, 3)])
+
+
+def _dense_hausdorff(vertices, faces, level_vertices, level_faces, per_face=4):
+    rng = np.random.default_rng(0)
+    vertices, level_vertices = np.asarray(vertices, np.float64), np.asarray(level_vertices, np.float64)
+    to_level = TriangleBVH(level_vertices, level_faces).query(_surface_samples(vertices, faces, per_face, rng))[0]
+    to_full = TriangleBVH(vertices, faces).query(_surface_samples(level_vertices, level_faces, per_face, rng))[0]
+    return max(to_level.max(), to_full.max())
+
+
+@pytest.fixture(scope="module")
+def wormhole_lod():
+    mesh = run_pipeline("bent-space", stitch=True, num_u=50, num_v=45)
+    return mesh, build_lod(mesh["vertices"], mesh["faces"], min_faces=200)
+
+
+def test_levels_halve(wormhole_lod):
+    mesh, levels = wormhole_lod
+    assert len(levels) > 4
+    assert levels[0]["error_estimate"] == 0.0 and len(levels[0]["faces"]) == len(mesh["faces"])
+    for coarse, fine in zip(levels[1:], levels):
+        assert len(coarse["faces"]) <= 0.75 * len(fine["faces"])
+
+
+@pytest.mark.parametrize("max_estimate", [1e-6, 0.2])
+def test_selected_level_against_dense_hausdorff(wormhole_lod, max_estimate):
+    mesh, levels = wormhole_lod
+    level = select_level(levels, max_estimate)
+    assert level["error_estimate"] <= max_estimate
+    assert all(len(other["faces"]) >= len(level["faces"]) for other in levels
+               if other["error_estimate"] <= max_estimate)
+    dense = _dense_hausdorff(mesh["vertices"], mesh["faces"], level["vertices"], level["faces"])
+    # the vertices are among the dense samples: the estimate is a lower bound, and a close one
+    assert level["error_estimate"] <= dense + 1e-9
+    assert dense <= level["error_estimate"] + 1e-3
+
+
+def test_save_load(wormhole_lod, tmp_path):
+    _, levels = wormhole_lod
+    save_lod(tmp_path, levels)
+    loaded = load_lod(tmp_path)
+    for level, read in zip(levels, loaded):
+        np.testing.assert_array_equal(read["faces"], level["faces"])
+        np.testing.assert_array_equal(read["vertices"], level["vertices"].astype(np.float32))
+        assert read["error_estimate"] == level["error_estimate"]
+    assert len(load_lod(tmp_path, max_estimate=0.2)["faces"]) == len(select_level(levels, 0.2)["faces"])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+from wormhole_grid import evaluate_grid, rounding_margin, scene_axes
+from wormhole_marching import LEVEL_SNAP, chunked_marching_cubes
+from wormhole_sdf import wormhole_scene
+
+
+@pytest.fixture(scope="module")
+def scene():
+    x, y, z, grid_spacing = scene_axes(40, 0.5, 3, 1.5)
+    return wormhole_scene(0.5, 3, 1.5, grid_spacing), x, y, z, grid_spacing
+
+
+def _dense_marching_cubes(sdf, x, y, z, dtype):
+    """marching_cubes of the whole field, with the snap of the chunked version."""
+    from skimage.measure import marching_cubes
+
+    field = evaluate_grid(sdf, x, y, z, dtype=dtype)
+    snap = max(LEVEL_SNAP * min(np.min(np.diff(axis)) for axis in (x, y, z)), rounding_margin(x, y, z, dtype))
+    field[np.abs(field) < snap] = -snap
+    verts, faces, _, _ = marching_cubes(field, level=0.0, allow_degenerate=True)
+    world = np.stack([np.interp(verts[:, a].astype(np.float64), np.arange(len(axis)), axis)
+                      for a, axis in enumerate((x, y, z))], axis=-1)
+    return world, faces
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("block_size", [4, 7, 16, 64])
+def test_chunked_matches_dense(scene, dtype, block_size):
+    sdf, x, y, z, grid_spacing = scene
+    expected_verts, expected_faces = _dense_marching_cubes(sdf, x, y, z, dtype)
+    verts, faces = chunked_marching_cubes(sdf, x, y, z, block_size=block_size, dtype=dtype)
+    assert verts.dtype == dtype and faces.dtype == np.int32
+    assert len(verts) == len(expected_verts)
+    # the dense vertices are float32 grid indices, the chunked ones block-local: equal up to their rounding
+    distance, match = cKDTree(expected_verts).query(verts)
+    assert distance.max() < 1e-5 * grid_spacing
+    assert len(np.unique(match)) == len(verts)
+    # the welded blocks have the same triangles
+    triangles = {tuple(face) for face in np.sort(match[faces], axis=1).tolist()}
+    assert triangles == {tuple(face) for face in np.sort(expected_faces, axis=1).tolist()}
+
+
+def test_workers_give_the_same_mesh(scene):
+    sdf, x, y, z, grid_spacing = scene
+    verts, faces = chunked_marching_cubes(sdf, x, y, z, block_size=8)
+    threaded_verts, threaded_faces = chunked_marching_cubes(sdf, x, y, z, block_size=8, workers=3)
+    np.testing.assert_array_equal(threaded_verts, verts)
+    np.testing.assert_array_equal(threaded_faces, faces)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from wormhole_cache import ArrayCache
+from wormhole_pipelines import run_pipeline
+
+
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+@pytest.mark.parametrize("name, params", [("point-cloud", {}), ("knn", {}), ("marching-cubes", {"block_size": 16})])
+def test_cached_matches_uncached(tmp_path, name, params, precision):
+    expected = run_pipeline(name, grid_size=32, precision=precision, **params)
+    cache = ArrayCache(str(tmp_path))
+    # the first run fills the cache, the second reads the volume back
+    for _ in range(2):
+        results = run_pipeline(name, cache=cache, grid_size=32, precision=precision, **params)
+        assert results.keys() == expected.keys()
+        for key, value in expected.items():
+            assert results[key].dtype == value.dtype
+            np.testing.assert_array_equal(results[key], value)
+
+
+def test_render_rejects_cache(tmp_path):
+    with pytest.raises(ValueError, match="can not use a cache"):
+        run_pipeline("render", cache=ArrayCache(str(tmp_path)), width=8, image_height=8)
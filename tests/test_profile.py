@@ -0,0 +1,62 @@
+import tracemalloc
+
+import wormhole_profile
+from wormhole_profile import span
+
+
+def test_keeps_the_callers_trace():
+    tracemalloc.start()
+    try:
+        with wormhole_profile.profile(trace_memory=True) as profiler:
+            with span("stage"):
+                data = bytearray(2**20)
+        assert tracemalloc.is_tracing()
+        assert profiler.spans and len(data)
+    finally:
+        tracemalloc.stop()
+
+
+def test_stops_its_own_trace():
+    assert not tracemalloc.is_tracing()
+    wormhole_profile.enable(trace_memory=True)
+    assert tracemalloc.is_tracing()
+    wormhole_profile.disable()
+    assert not tracemalloc.is_tracing()
+
+
+def _peak(profiler, name):
+    return next(s.peak for s in profiler.spans if s.name == name)
+
+
+def test_keeps_the_callers_peak():
+    tracemalloc.start()
+    try:
+        big = bytearray(8 * 2**20)
+        del big
+        callers_peak = tracemalloc.get_traced_memory()[1]
+        with wormhole_profile.profile(trace_memory=True) as profiler:
+            with span("small"):
+                small = bytearray(2**20)
+                del small
+        assert tracemalloc.get_traced_memory()[1] >= callers_peak
+        # a peak below the caller's is not seen, one above it is
+        assert 0 <= _peak(profiler, "small") < 8 * 2**20
+        with wormhole_profile.profile(trace_memory=True) as profiler:
+            with span("large"):
+                large = bytearray(16 * 2**20)
+                del large
+        assert 16 * 2**20 <= _peak(profiler, "large") < 17 * 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def test_span_peaks_of_its_own_trace():
+    with wormhole_profile.profile(trace_memory=True) as profiler:
+        with span("outer"):
+            with span("inner"):
+                data = bytearray(4 * 2**20)
+                del data
+            data = bytearray(2**20)
+            del data
+    assert 4 * 2**20 <= _peak(profiler, "inner") < 5 * 2**20
+    assert 4 * 2**20 <= _peak(profiler, "outer") < 5 * 2**20
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from wormhole_grid import scene_axes
+from wormhole_sdf import (Box, HalfPipe, HoledRectangle, OpenCylinder, SemiCylinder, Shell, Tube, Union,
+                          bent_space_scene, wormhole_scene)
+
+
+def _unculled(node, p):
+    """The field of node with every child evaluated on every point, the reference of the culled evaluation."""
+    moved = node._transform(p)
+    if moved is not None:
+        return _unculled(node.node, moved)
+    children = node.children()
+    if not children:
+        return node._field(p, None, ())
+    return node._combine([_unculled(child, p) for child in children])
+
+
+def _primitive(rng):
+    kind = rng.integers(6)
+    size = rng.uniform(0.2, 1.5, 3)
+    if kind == 0:
+        return OpenCylinder(size[0], size[1])
+    if kind == 1:
+        return SemiCylinder(size[0], size[1], size[2])
+    if kind == 2:
+        return Box(size)
+    if kind == 3:
+        return HalfPipe(size[0] * 2, size[1])
+    if kind == 4:
+        return HoledRectangle(size[0] * 2, size[1] * 2, size[2] / 3)
+    return Tube(size[0], size[1], size[2])
+
+
+def _grid(n, extent):
+    """Points of an n^3 grid in C order, so the blocks of evaluate are slabs the bounds can cull."""
+    axis = np.linspace(-extent, extent, n)
+    return np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def _random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        node = _primitive(rng)
+    else:
+        children = [_random_tree(rng, depth - 1) for _ in range(rng.integers(2, 4))]
+        kind = rng.integers(4)
+        if kind == 0:
+            node = Union(*children)
+        elif kind == 1:
+            node = children[0] & children[1]
+        elif kind == 2:
+            node = children[0] - children[1]
+        else:
+            node = Shell(Union(*children), rng.uniform(0.01, 0.2))
+    move = rng.integers(3)
+    if move == 1:
+        node = node.translate(rng.uniform(-2, 2, 3))
+    elif move == 2:
+        node = node.rotate(rng.standard_normal(3), rng.uniform(0, np.pi))
+    return node
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_scenes_match_unculled(dtype):
+    x, y, z, grid_spacing = scene_axes(24, 0.5, 3, 1.5)
+    points = np.stack(np.meshgrid(x, y, z, indexing="ij"), axis=-1).reshape(-1, 3).astype(dtype)
+    for scene in (wormhole_scene(0.5, 3, 1.5, grid_spacing), bent_space_scene(10, 5, 10, 1.0, 1.0, 10.4),
+                  bent_space_scene(10, 5, 10, 1.0, 1.0, 10.4, thickness=0.1)):
+        np.testing.assert_array_equal(scene.evaluate(points, block_size=1000), _unculled(scene, points))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_trees_match_unculled(seed):
+    rng = np.random.default_rng(seed)
+    tree = _random_tree(rng, 3)
+    points = _grid(20, 4)
+    np.testing.assert_array_equal(tree.evaluate(points, block_size=400), _unculled(tree, points))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_bounds_are_lower_bounds(seed):
+    rng = np.random.default_rng(seed)
+    tree = _random_tree(rng, 3)
+    points = rng.uniform(-6, 6, (5000, 3))
+    lo, hi = tree.bounds()
+    # outside its box the field is at least the Chebyshev distance to it
+    gap = np.max(np.maximum(lo - points, points - hi), axis=1)
+    outside = gap > 0
+    assert np.all(_unculled(tree, points)[outside] >= gap[outside] - 1e-12)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import wormhole
+from wormhole import (boundary_loops, create_bent_space, create_bent_space_adaptive, create_wormhole,
+                      spanning_height, stitch_wormhole)
+
+
+@pytest.fixture(params=["uniform", "adaptive"])
+def bent_space(request):
+    if request.param == "uniform":
+        return create_bent_space(wormhole.num_u, wormhole.num_v, wormhole.width, wormhole.radius,
+                                 wormhole.extension_length, wormhole.hole_radius)
+    return create_bent_space_adaptive(wormhole.width, wormhole.radius, wormhole.extension_length,
+                                      wormhole.hole_radius)
+
+
+def test_default_stitched_mesh(bent_space):
+    # the mesh of the wormhole.py script
+    cylinder = create_wormhole(wormhole.cylinder_radius_top, wormhole.cylinder_radius_bottom,
+                               spanning_height(wormhole.radius, wormhole.cylinder_segments),
+                               wormhole.cylinder_segments)
+    vertices, faces = stitch_wormhole(*bent_space, *cylinder, wormhole.radius, wormhole.extension_length)
+
+    edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+    edges, counts = np.unique(edges, axis=0, return_counts=True)
+    assert counts.max() == 2
+    assert np.array_equal(np.unique(faces), np.arange(len(vertices)))
+    # the Euler characteristic of a rectangle (1) with two holes (-2) joined by a tube (0)
+    assert len(vertices) - len(edges) + len(faces) == -1
+
+    loops = boundary_loops(faces)
+    assert len(loops) == 1
+    # the outer rim of the plane: its sides and the far ends of both extensions
+    rim = vertices[loops[0]]
+    on_rim = np.isclose(np.abs(rim[:, 0]), wormhole.width / 2) | np.isclose(rim[:, 2], -wormhole.extension_length)
+    assert on_rim.all()
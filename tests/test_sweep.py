@@ -0,0 +1,32 @@
+import pytest
+
+from wormhole_pipelines import PIPELINES
+from wormhole_sweep import _parse_set, complete_configs, expand_grid
+
+
+def test_configs_override_base():
+    configs = expand_grid({"grid_size": [24, 32]})
+    completed = complete_configs("marching-cubes", configs, base={"grid_size": 32, "cube_size": 1.0})
+    assert [params["grid_size"] for _, params in completed] == [24, 32]
+    assert all(params["cube_size"] == 1.0 for _, params in completed)
+    # the base alone and the config repeating it are the same run
+    (key, _), = complete_configs("marching-cubes", [{}], base={"grid_size": 32, "cube_size": 1.0})
+    assert completed[1][0] == key
+
+
+def test_base_overrides_defaults():
+    _, defaults = PIPELINES["marching-cubes"]
+    (_, params), = complete_configs("marching-cubes", [{}], base={"height": 2.0})
+    assert params == dict(defaults, height=2.0)
+
+
+def test_unknown_parameter():
+    with pytest.raises(ValueError, match="unknown parameters"):
+        complete_configs("marching-cubes", [{}], base={"grid_sise": 32})
+
+
+def test_parse_set():
+    assert _parse_set("marching-cubes", "grid_size=24,32.0") == ("grid_size", [24, 32])
+    assert _parse_set("marching-cubes", "cube-size=1,1.5") == ("cube_size", [1.0, 1.5])
+    with pytest.raises(ValueError, match="grid_size"):
+        _parse_set("marching-cubes", "grid_size=32.5")
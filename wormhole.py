@@ -1,9 +1,6 @@
 import numpy as np
-import polyscope as ps
 
-
-# Initialize polyscope
-ps.init()
+from wormhole_profile import span
 
 
 # Parameters for the bent plane
@@ -27,7 +24,36 @@ def is_inside_circle(x, z, circle_center_x, circle_center_z, circle_radius):
     return (x - circle_center_x) ** 2 + (z - circle_center_z) ** 2 <= circle_radius ** 2
 
 
-def create_bent_space(num_u, num_v, width, radius, extension_length, hole_radius):
+def _index_dtype(num_vertices):
+    """Smallest index type able to address num_vertices (int32 unless the mesh is huge)."""
+    return np.int32 if num_vertices <= np.iinfo(np.int32).max else np.int64
+
+
+def _quad_faces(row_start, z_center, num_u, width, hole_center_x, hole_center_z, hole_radius):
+    """
+    Triangulate rows of quads of a num_u wide grid, dropping the quads whose center falls in the hole.
+    row_start holds the index of the first vertex of every quad row and z_center the z of its quad centers.
+    Returns the faces in the same order as walking the rows and columns one by one (two triangles per quad).
+    """
+    index_dtype = _index_dtype(int(row_start.max(initial=0)) + 2 * num_u)
+    j = np.arange(num_u - 1, dtype=index_dtype)
+    x_center = (j + 0.5) / num_u * width - width / 2 # (j + 0.5) / num_u finds the center of the quad instead of its boundary
+
+    # one boolean mask for all quads of all rows
+    keep = ~is_inside_circle(x_center[None, :], z_center[:, None], hole_center_x, hole_center_z, hole_radius)
+
+    idx1 = row_start.astype(index_dtype)[:, None] + j[None, :] # index of a vertex in the 1D array that represents the 2D mesh grid
+    idx2 = idx1 + num_u # the vertex one place up from idx1 in the mesh grid
+    idx3 = idx1 + 1 # the vertex next to idx1
+    idx4 = idx2 + 1 # the vertex next to idx2
+    quads = np.stack([
+        np.stack([idx1, idx2, idx4], axis=-1), # counter clockwise
+        np.stack([idx1, idx4, idx3], axis=-1), # counter clockwise
+    ], axis=2)
+    return quads[keep].reshape(-1, 3)
+
+
+def create_bent_space(num_u, num_v, width, radius, extension_length, hole_radius, dtype=np.float32):
     """ 
     Function to create bent space. Use the parameters in the beginning to adjust the geometric parameters
     of the bent space. The space consists of a semi-circular bent plane with planar extensions from both 
@@ -48,128 +74,266 @@ def create_bent_space(num_u, num_v, width, radius, extension_length, hole_radius
     - radius (float): The radius of the semi-circle part of the bent plane.
     - extension_length (float): The length of the straight extensions from each end of the semi-circle.
     - hole_radius (float): The radius of the circular holes to be subtracted from the bent plane.
+    - dtype (np.dtype): The dtype of the vertices, float32 by default (float64 to join a float64 cylinder).
     
     Returns:
     - A tuple containing two elements:
-      1. vertices (np.array): An array of 3D coordinates for each vertex of the mesh.
-      2. faces (list of lists): A list where each sublist contains indices of vertices that form a face.
+      1. vertices (np.array): A (N, 3) array (in dtype) of 3D coordinates for each vertex of the mesh.
+      2. faces (np.array): A (M, 3) int32 array where each row contains indices of vertices that form a face.
+
+    All rows (yz) and columns (x) are built at once from broadcasted index grids and the hole quads are
+    dropped with a single boolean mask, so the cost stays in NumPy even for thousands of divisions. The
+    result is identical (up to the compact dtypes) to building every vertex and face one by one.
 
     Example usage:
     >>> vertices, faces = create_bent_space(100, 90, 10, 5, 10, 0.5)
     """
 
-    vertices = []
-    faces = []
-
     # Choose the number of vertices in the bend and extensions
-    num_bend = num_v // 3  # 1/3 for the bend
-    num_extension = num_v - num_bend  # 1/3 for each extension
-
-
-    ########### semi-circular bend: dimensions yz ###########
-    for i in range(num_bend):
-        angle = np.pi * (i / (num_bend - 1))  # angle from 0 to pi and I normalize/divide by num_bend - 1 to distribute the vertices across 0 and pi
-        
-        # we use the circle's formula in 3D (cosa+cosb, restricted to pi)
-        y = radius * np.cos(angle) - radius  # Y-coordinates from 0 downward to -2*radius. Remove -radious to get a restaurant booth :).
-        z = radius * np.sin(angle)  # Z extension to bring bend forward
-               
-        ########### making it 3D: dimension x ###########
-        for j in range(num_u): # num_u is the resolution across the width
-            u = j / (num_u - 1)  # u ranges from 0 to 1 across the width, so that we multiply by width and place vertices across the whole width 
-            x = (u - 0.5) * width  # x ranges from -width/2 to width/2, to align with plane
-            vertices.append((x, y, z)) # so for every vertice in yz add all of the neigboring vertices in x to make the shape 3D
-   
-
-    ########### bottom planar extension: dimensions yz ###########
-    for i in range(num_extension):
-        y = -2 * radius  # constant Y-coordinate making plane parallel to floor and also placed at the bottom of the semi circle to connect with it
-        z = -i / (num_extension - 1) * extension_length 
-        # Z-coordinates: explanation
-        # place the vertices across the length of the extension planes. 
-        # it normalises by the number of the total vertices
-        # it places them across the extension_length
-        
-        ########### making it 3D: dimension x ###########
-        for j in range(num_u): 
-            u = j / (num_u - 1)  
-            x = (u - 0.5) * width  
-            vertices.append((x, y, z)) 
-   
-
-    ########### upper planar extension: dimensions yz ###########
-    for i in range(num_extension):
-        y = 0  # constant Y-coordinate for upper extension aligned with the top edge of the semi-circle
-        z = -i / (num_extension - 1) * extension_length  # Z-coordinates, similar to bottom plane
-        
-        ########### making it 3D: dimension x ###########
-        for j in range(num_u):
-            u = j / (num_u - 1)  
-            x = (u - 0.5) * width  
-            vertices.append((x, y, z))
-
-
-    # Define the circle centers for holes in both planes
-    bottom_hole_center_x = 0
-    bottom_hole_center_z = -extension_length / 2 # negative because all orientations are assumed negative
-    upper_hole_center_x = 0
-    upper_hole_center_z = -extension_length / 2
-
-
-
-    ########### quad faces, semi-circle ########### 
-    for i in range(num_bend - 1): # we stop one row short because the last row is included by the second to last row
-        for j in range(num_u - 1): # same
-            x_center = (j + 0.5) / num_u * width - width / 2 
-            # (j + 0.5) / num_u this term finds the center of the quad instead of its boundary.
-            # because we have range from -width / 2 to -width / 2
-
-            z_center = radius * np.sin(np.pi * (i + 0.5) / (num_bend - 1))
-            # np.sin(np.pi * (i + 0.5) / (num_bend - 1)): the sin of the centers of the quad faces of the semi circle
-            
-            if is_inside_circle(x_center, z_center, bottom_hole_center_x, bottom_hole_center_z, hole_radius):
-                continue # no holes will be found here
-            idx1 = i * num_u + j # calculates the index of a vertex in a 1D array that represents a 2D mesh grid, i changes row, j iterates columns. num_v simulate changing a row in the hypothetical 2D array, but we have 1D
-            idx2 = idx1 + num_u # the vertex one place up from idx1 in the mesh grid, one rown down in the data structure
-            idx3 = idx1 + 1 # the vertex next to idx1
-            idx4 = idx2 + 1 # the vertex next to idx2
-            faces.append([idx1, idx2, idx4]) # counter clockwise
-            faces.append([idx1, idx4, idx3]) # counter clockwise
-
-    ########### quad faces, bottom plane ########### 
-    base_idx = num_bend * num_u  # Starting index for bottom extension in 1D array that represents 2D mesh
-    for i in range(num_extension - 1):
-        for j in range(num_u - 1):
-            x_center = (j + 0.5) / num_u * width - width / 2
-            z_center = - (i + 0.5) / (num_extension - 1) * extension_length    
-            if is_inside_circle(x_center, z_center, bottom_hole_center_x, bottom_hole_center_z, hole_radius):
-                continue  # Skip faces that would be in the hole
-            idx1 = base_idx + i * num_u + j
-            idx2 = idx1 + num_u
-            idx3 = idx1 + 1
-            idx4 = idx2 + 1
-            faces.append([idx1, idx2, idx4]) # counter clockwise (light blue, else dark blue)
-            faces.append([idx1, idx4, idx3]) # counter clockwise
-
-    ########### quad faces, upper plane ########### 
-    offset = num_v * num_u # Starting index for upper extension in 1D array that represents 2D mesh
-    for i in range(num_extension - 1):
-        for j in range(num_u - 1):
-            x_center = (j + 0.5) / num_u * width - width / 2
-            z_center = - (i + 0.5) / (num_extension - 1) * extension_length    
-            if is_inside_circle(x_center, z_center, upper_hole_center_x, upper_hole_center_z, hole_radius):
-                continue  # Skip faces that would be in the hole 
-            idx1 = offset + i * num_u + j
-            idx2 = idx1 + num_u
-            idx3 = idx1 + 1
-            idx4 = idx2 + 1
-            faces.append([idx1, idx2, idx4]) # counter clockwise
-            faces.append([idx1, idx4, idx3]) # counter clockwise
-
-    return np.array(vertices), np.array(faces)
+    num_bend, num_extension = _split_rows(num_v)
+
+    ########### making it 3D: dimension x ###########
+    x = _columns(num_u, width)
+
+    ########### semi-circular bend and planar extensions: dimensions yz ###########
+    bend_y, bend_z = _bend_rows(num_bend, radius)
+    extension_z = _extension_rows(num_extension, extension_length)
+
+    row_y = np.concatenate([bend_y, np.full(num_extension, -2.0 * radius), np.zeros(num_extension)])
+    row_z = np.concatenate([bend_z, extension_z, extension_z])
+
+    with span("bent_space.vertices", row_y.size * num_u):
+        vertices = _row_vertices(x, row_y, row_z, dtype)
+
+    ########### quad faces: semi-circle, bottom plane, upper plane ###########
+    with span("bent_space.faces", (num_v + num_extension - 3) * (num_u - 1)):
+        faces = _join_region_faces(
+            num_u, num_v,
+            _bend_faces(num_u, num_bend, width, radius, extension_length, hole_radius),
+            _extension_faces(num_u, num_extension, width, extension_length, hole_radius),
+        )
+
+    return vertices, faces
+
+
+########### bent space regions ###########
+# create_bent_space assembled from independent parts, so that wormhole_incremental can rebuild only the parts
+# a parameter change touches. Every part depends on the parameters in its signature only.
+
+def _split_rows(num_v):
+    """The rows of the bend (1/3 of num_v) and of each extension (the remaining 2/3, shared by both planes)."""
+    num_bend = num_v // 3
+    return num_bend, num_v - num_bend
+
+
+def _columns(num_u, width):
+    """u ranges from 0 to 1 across the width and x from -width/2 to width/2, shared by every row of every part."""
+    return (np.arange(num_u) / (num_u - 1) - 0.5) * width
+
+
+def _bend_rows(num_bend, radius):
+    """Y and Z of the rows of the semi-circular bend."""
+    angle = np.pi * (np.arange(num_bend) / (num_bend - 1))  # angle from 0 to pi, one per row of the bend
+    bend_y = radius * np.cos(angle) - radius  # Y-coordinates from 0 downward to -2*radius
+    bend_z = radius * np.sin(angle)  # Z extension to bring bend forward
+    return bend_y, bend_z
+
+
+def _extension_rows(num_extension, extension_length):
+    """Z of the rows of an extension: both extensions share them, only their constant Y differs (-2*radius bottom, 0 upper)."""
+    return -np.arange(num_extension) / (num_extension - 1) * extension_length
+
+
+def _row_vertices(x, row_y, row_z, dtype=np.float32):
+    """Broadcast the rows (yz) against the columns (x), same vertex order as the row by row construction."""
+    vertices = np.empty((row_y.size, x.size, 3), dtype=dtype)
+    vertices[:, :, 0] = x[None, :]
+    vertices[:, :, 1] = row_y[:, None]
+    vertices[:, :, 2] = row_z[:, None]
+    return vertices.reshape(-1, 3)
+
+
+def _bend_faces(num_u, num_bend, width, radius, extension_length, hole_radius):
+    """Quads of the bend, indexed from its first vertex (the hole mask is applied to every part, as before)."""
+    bend_rows = np.arange(num_bend - 1)  # we stop one row short because the last row is included by the second to last row
+    z_center = radius * np.sin(np.pi * (bend_rows + 0.5) / (num_bend - 1))  # sin of the centers of the quad faces of the semi circle
+    # the circle centers for holes in both planes (negative z because all orientations are assumed negative)
+    return _quad_faces(bend_rows * num_u, z_center, num_u, width, 0, -extension_length / 2, hole_radius)
+
+
+def _extension_faces(num_u, num_extension, width, extension_length, hole_radius):
+    """Quads of one extension with its hole, indexed from its first vertex (the same for the bottom and upper plane)."""
+    extension_rows = np.arange(num_extension - 1)
+    z_center = - (extension_rows + 0.5) / (num_extension - 1) * extension_length
+    return _quad_faces(extension_rows * num_u, z_center, num_u, width, 0, -extension_length / 2, hole_radius)
+
+
+def _join_region_faces(num_u, num_v, bend_faces, extension_faces):
+    """Faces of the bend, bottom and upper plane as indices into the vertices of create_bent_space."""
+    num_bend, num_extension = _split_rows(num_v)
+    index_dtype = _index_dtype((num_v + num_extension) * num_u)
+    faces = np.empty((len(bend_faces) + 2 * len(extension_faces), 3), dtype=index_dtype)
+    bottom = len(bend_faces)
+    upper = bottom + len(extension_faces)
+    faces[:bottom] = bend_faces
+    faces[bottom:upper] = extension_faces
+    faces[bottom:upper] += num_bend * num_u  # starting index for bottom extension
+    faces[upper:] = extension_faces
+    faces[upper:] += num_v * num_u  # starting index for upper extension
+    return faces
+
+########### adaptive bent space ###########
+
+def create_bent_space_adaptive(width, radius, extension_length, hole_radius, tolerance=0.01, dtype=np.float32):
+    """
+    The surface of create_bent_space with vertices only where the geometry needs them: the bend gets as many
+    rows as its chords need to stay within tolerance of the semi-circle, the holes are true circles (within
+    tolerance) instead of staircases of quads, and the flat extensions are covered by a few large triangles
+    that only get smaller around the holes.
+
+    Every extension is a tensor grid of columns and rows whose lines pass through the corners of a square
+    around the hole (the nodes on its sides are the circle vertices pushed out radially), with the square
+    replaced by rings of quads from the circle to the sides, geometrically graded so the cells stay close to
+    squares. The bend uses the columns of the extensions and shares its first and last row with them, so
+    unlike create_bent_space the mesh is connected, and it is consistently oriented (normals away from the
+    axis of the bend).
+
+    Parameters:
+    - width (float): The total width of the bent plane.
+    - radius (float): The radius of the semi-circle part of the bent plane.
+    - extension_length (float): The length of the straight extensions from each end of the semi-circle.
+    - hole_radius (float): The radius of the holes (0 for none), less than half the width and the length.
+    - tolerance (float): The largest distance between the mesh and the surface it approximates.
+    - dtype (np.dtype): The dtype of the vertices, float32 by default (as create_bent_space).
+
+    Returns:
+    - vertices (np.array): A (N, 3) array in dtype, the upper extension, the bottom one, then the bend.
+    - faces (np.array): A (M, 3) int32 array of triangles.
+
+    Example usage:
+    >>> vertices, faces = create_bent_space_adaptive(10, 5, 10, 1.0, tolerance=0.01)
+    """
+    half = min(width, extension_length) / 2
+    if hole_radius >= half:
+        raise ValueError(f"hole_radius {hole_radius} must be less than half the width and the extension length")
+    if tolerance <= 0:
+        raise ValueError(f"tolerance must be positive, got {tolerance}")
+
+    with span("bent_space.plate"):
+        plate, plate_faces, x, edge = _holed_plate(width, extension_length, hole_radius, tolerance)
+    with span("bent_space.bend"):
+        bend_y, bend_z = _bend_rows(_arc_segments(np.pi, radius, tolerance) + 1, radius)
+
+    # upper extension (y = 0), bottom extension (y = -2 * radius), then the rows of the bend between them
+    vertices = np.concatenate([
+        _plate_vertices(plate, 0.0, dtype),
+        _plate_vertices(plate, -2.0 * radius, dtype),
+        _row_vertices(x, bend_y[1:-1], bend_z[1:-1], dtype),
+    ])
+
+    index_dtype = _index_dtype(len(vertices))
+    rows = np.concatenate([
+        edge[None, :],  # the bend starts on the front edge of the upper extension
+        len(plate) * 2 + np.arange((len(bend_y) - 2) * len(x)).reshape(-1, len(x)),
+        len(plate) + edge[None, :],  # and ends on the front edge of the bottom extension
+    ]).astype(index_dtype)
+    bend_faces = _grid_faces(rows)
+    plate_faces = plate_faces.astype(index_dtype)
+    # the plate faces look down (-y): away from the bend on the bottom extension, flipped on the upper one
+    faces = np.concatenate([plate_faces[:, ::-1], plate_faces + len(plate), bend_faces])
+    return vertices, faces
+
+
+def _arc_segments(angle, radius, tolerance):
+    """Segments of an arc of angle (radians) whose chords stay within tolerance of it (sagitta <= tolerance)."""
+    step = 2 * np.arccos(np.clip(1 - tolerance / radius, -1, 1))
+    return max(1, int(np.ceil(angle / step)))
+
+
+def _plate_vertices(plate, y, dtype=np.float32):
+    """The x, z vertices of _holed_plate in the plane at height y, as vertices in dtype."""
+    return np.stack([plate[:, 0], np.full(len(plate), y), plate[:, 1]], axis=-1).astype(dtype)
+
+
+def _grid_faces(ids):
+    """Two triangles per quad of a grid of vertex ids (rows, columns), winding as in _quad_faces."""
+    idx1, idx2, idx3, idx4 = ids[:-1, :-1], ids[1:, :-1], ids[:-1, 1:], ids[1:, 1:]
+    quads = np.stack([np.stack([idx1, idx2, idx4], axis=-1), np.stack([idx1, idx4, idx3], axis=-1)], axis=2)
+    return quads.reshape(-1, 3)
+
+
+def _holed_plate(width, extension_length, hole_radius, tolerance):
+    """
+    Triangulation of an extension in its own plane: x across the width, z from 0 back to -extension_length,
+    with the hole at (0, -extension_length / 2). Returns the (N, 2) x, z vertices, the faces (normals -y), the
+    columns x of the tensor grid and the indices of the vertices of the front edge (z = 0) along them.
+    """
+    x = np.array([-width / 2, width / 2])
+    z = np.array([-extension_length, 0.0])
+    center_z = -extension_length / 2
+    half = min(width, extension_length) / 2
+    if hole_radius > 0:
+        segments = 4 * max(2, -(-_arc_segments(2 * np.pi, hole_radius, tolerance) // 4))  # a multiple of 4, >= 8
+        quarter = segments // 4
+        # lines of the tensor grid through the points of the square sides where the circle vertices project
+        offsets = half * np.tan(np.linspace(-np.pi / 4, np.pi / 4, quarter + 1))
+        offsets[0], offsets[-1] = -half, half
+        x = np.unique(np.concatenate([x, offsets]))
+        z = np.unique(np.concatenate([z, center_z + offsets]))
+
+    ids = np.full((len(z), len(x)), -1, dtype=np.int64)
+    keep = np.ones(ids.shape, dtype=bool)
+    cells = np.ones((len(z) - 1, len(x) - 1), dtype=bool)
+    if hole_radius > 0:
+        x0, x1 = np.searchsorted(x, [-half, half])
+        z0, z1 = np.searchsorted(z, [center_z - half, center_z + half])
+        keep[z0 + 1:z1, x0 + 1:x1] = False  # the nodes strictly inside the square, replaced by the rings
+        cells[z0:z1, x0:x1] = False
+    ids[keep] = np.arange(keep.sum())
+    grid_x, grid_z = np.meshgrid(x, z)
+    vertices = [np.stack([grid_x[keep], grid_z[keep]], axis=-1)]
+
+    # cells a (i, j), b (i, j + 1), c (i + 1, j + 1), d (i + 1, j) as triangles abc, acd: normals -y
+    i, j = np.nonzero(cells)
+    a, b, c, d = ids[i, j], ids[i, j + 1], ids[i + 1, j + 1], ids[i + 1, j]
+    faces = [np.stack([a, b, c], axis=-1), np.stack([a, c, d], axis=-1)]
+
+    if hole_radius > 0:
+        # the square sides counterclockwise from the corner (half, -half), at the angles of the circle vertices
+        square = np.concatenate([
+            ids[z0:z1, x1],  # right side, z going up
+            ids[z1, x1:x0:-1],  # top, x going left
+            ids[z1:z0:-1, x0],  # left side, z going down
+            ids[z0, x0:x1],  # bottom, x going right
+        ])
+        angle = -np.pi / 4 + 2 * np.pi * np.arange(segments) / segments
+        circle = hole_radius * np.stack([np.cos(angle), np.sin(angle)], axis=-1) + [0, center_z]
+        outer = vertices[0][square]
+        # rings as long as wide: the radius grows by the length of a circle segment at every ring
+        ratio = half / hole_radius
+        num_rings = max(1, int(np.ceil(np.log(ratio) / np.log1p(2 * np.pi / segments))))
+        weights = (ratio ** (np.arange(num_rings) / num_rings) - 1) / (ratio - 1)
+        rings = circle[None] + weights[:, None, None] * (outer - circle)[None]
+        ring_ids = np.concatenate([len(vertices[0]) + np.arange(num_rings * segments).reshape(num_rings, segments),
+                                   square[None]])
+        vertices.append(rings.reshape(-1, 2))
+
+        # quads between rings l, l + 1 and angles k, k + 1, wound as the cells (normals -y)
+        k = np.arange(segments)
+        inner, inner_next = ring_ids[:-1, k], ring_ids[:-1, (k + 1) % segments]
+        outer_ids, outer_next = ring_ids[1:, k], ring_ids[1:, (k + 1) % segments]
+        faces += [np.stack([inner, outer_next, inner_next], axis=-1).reshape(-1, 3),
+                  np.stack([inner, outer_ids, outer_next], axis=-1).reshape(-1, 3)]
+
+    return np.concatenate(vertices), np.concatenate(faces), x, ids[-1]
+
 
 ########### cylinder ########### 
-def create_wormhole(radius_top, radius_bottom, height, segments):
+def create_wormhole(radius_top, radius_bottom, height, segments, dtype=np.float64):
+    """
+    Cylinder of segments x segments quads from y = 0 to height, to be placed between the holes with
+    join_wormhole. Returns the vertices (in dtype) and the faces (int32 indices, as create_bent_space).
+    """
     cylinder_vertices = []
     cylinder_faces = []
 
@@ -201,37 +365,306 @@ def create_wormhole(radius_top, radius_bottom, height, segments):
                 cylinder_faces.append([idx1, idx2, idx4]) # counter clockwise
                 cylinder_faces.append([idx1, idx4, idx3]) # counter clockwise
 
-    return np.array(cylinder_vertices), np.array(cylinder_faces)
+    return (np.array(cylinder_vertices, dtype=dtype),
+            np.array(cylinder_faces, dtype=_index_dtype(len(cylinder_vertices))).reshape(-1, 3))
 
 
+def join_wormhole(vertices, faces, cylinder_vertices, cylinder_faces, radius, extension_length):
+    """
+    Place the cylinder of create_wormhole between the holes of create_bent_space and combine both meshes.
+    Returns all_vertices, all_faces.
+    """
+    cylinder_vertices = _place_cylinder(cylinder_vertices, radius, extension_length)
 
+    # Combine the vertices and faces from the plane and cylinder
+    all_vertices = np.vstack([vertices, cylinder_vertices])
+    all_faces = np.vstack([faces, cylinder_faces + len(vertices)]) # :+ len(vertices) adjusting the indeces after stacking vertices
+    return all_vertices, all_faces
 
 
-# Create the bent space
-vertices, faces = create_bent_space(num_u, num_v, width, radius, extension_length, hole_radius)
+def _place_cylinder(cylinder_vertices, radius, extension_length):
+    """The cylinder vertices moved between the holes of the bent space, as a new array."""
+    cylinder_vertices = np.array(cylinder_vertices) # a copy, the inputs may be read only (cached) arrays
 
-# Create the cylinder
-cylinder_vertices, cylinder_faces = create_wormhole(cylinder_radius_top, cylinder_radius_bottom, cylinder_height, cylinder_segments)
+    # Adjust the cylinder position to connect the holes
+    # Empirically adjust the y-position to place the base on the bottom plane
+    cylinder_vertices[:, 1] -= 2 * radius #+ (cylinder_height / 2 - 0.2) # if we remove 2 as a coeef of radious this works too
+    # I substract the (2*)radius of the bent space (semi-circle) to align the center of it with the center of the cylinder, because the cylinder
+    # was generated with the bottom base alligned with the center of the semi-circle.
 
-# Adjust the cylinder position to connect the holes
-# Empirically adjust the y-position to place the base on the bottom plane
-cylinder_vertices[:, 1] -= 2 * radius #+ (cylinder_height / 2 - 0.2) # if we remove 2 as a coeef of radious this works too
-# I substract the (2*)radius of the bent space (semi-circle) to align the center of it with the center of the cylinder, because the cylinder
-# was generated with the bottom base alligned with the center of the semi-circle.
+    # Empirically align the cylinder with the z-axis holes
+    cylinder_vertices[:, 2] -= extension_length / 2
+    # Similar to radius above
+    return cylinder_vertices
 
-# Empirically align the cylinder with the z-axis holes
-cylinder_vertices[:, 2] -= extension_length / 2  
-# Similar to radius above
 
-# Combine the vertices and faces from the plane and cylinder
-all_vertices = np.vstack([vertices, cylinder_vertices])
-all_faces = np.vstack([faces, cylinder_faces + len(vertices)]) # :+ len(vertices) adjusting the indeces after stacking vertices
+########### stitching ###########
 
-# Register the combined mesh in Polyscope
-ps.register_surface_mesh("Wormhole", all_vertices, all_faces)
+def spanning_height(radius, segments):
+    """
+    cylinder_height of create_wormhole whose end rings lie exactly in the planes of both holes (create_wormhole
+    leaves its last row of quads out), instead of the empirical 2 * radius + 0.4 of the script.
+    """
+    return 2 * radius * segments / (segments - 1)
 
 
-# show the visualization in polyscope
-ps.show()
+def stitch_wormhole(vertices, faces, cylinder_vertices, cylinder_faces, radius, extension_length,
+                    weld_tolerance=1e-6):
+    """
+    Place the cylinder of create_wormhole between the holes of create_bent_space (or create_bent_space_adaptive)
+    like join_wormhole, and connect it to them: a single edge-manifold, consistently oriented mesh.
 
+    Both meshes are welded (weld_vertices, which also joins the bend of create_bent_space to its extensions and
+    drops the vertices of the holes) and oriented (orient_faces), their boundary loops are traced
+    (boundary_loops) and every end ring of the cylinder is zipped to the loop around it, the hole rim with the
+    nearest centroid, by a strip of triangles ordered by angle around the ring (bridge_loops). The result is
+    welded and oriented once more. The strip lies between the rim and the ring: in the plane
+    of the hole when the ring is in it (cylinder_height = spanning_height), folded over where the jagged rim of
+    create_bent_space cuts inside the ring.
 
+    Parameters:
+    - vertices, faces (np.array): The bent space.
+    - cylinder_vertices, cylinder_faces (np.array): The cylinder of create_wormhole, before placement.
+    - radius, extension_length (float): The parameters of the bent space, to place the cylinder.
+    - weld_tolerance (float): Vertices closer than this (per coordinate) are merged.
+
+    Returns:
+    - vertices (np.array): (N, 3) float64 (float32 when both inputs are) welded vertices.
+    - faces (np.array): (M, 3) int32 triangles, the bent space, the cylinder, then the bridges.
+
+    Example usage:
+    >>> cylinder = create_wormhole(1, 1, spanning_height(radius, 30), 30)
+    >>> vertices, faces = stitch_wormhole(*create_bent_space(100, 90, 10, 5, 10, 1.0), *cylinder, 5, 10)
+    """
+    cylinder_vertices = _place_cylinder(cylinder_vertices, radius, extension_length)
+    parts = []
+    for part_vertices, part_faces in ((vertices, faces), (cylinder_vertices, cylinder_faces)):
+        with span("stitch.weld", len(part_vertices)):
+            part_vertices, part_faces, _ = weld_vertices(part_vertices, part_faces, weld_tolerance)
+        with span("stitch.orient", len(part_faces)):
+            # the loops follow the boundary half-edges, which only chain up on consistently oriented faces
+            part_faces = orient_faces(part_faces)
+        with span("stitch.loops"):
+            parts.append((part_vertices, part_faces, boundary_loops(part_faces)))
+    (vertices, faces, rims), (cylinder_vertices, cylinder_faces, rings) = parts
+    if len(rings) != 2:
+        raise ValueError(f"expected the two end rings of the cylinder, found {len(rings)} boundary loops")
+
+    all_vertices = np.vstack([vertices, cylinder_vertices])
+    bridges = [faces.astype(np.int64), cylinder_faces.astype(np.int64) + len(vertices)]
+    rim_centers = np.array([vertices[rim].mean(axis=0) for rim in rims]).reshape(-1, 3)
+    rims_bridged = []
+    with span("stitch.bridges"):
+        for ring in rings:
+            ring = ring + len(vertices)
+            center = all_vertices[ring].mean(axis=0)
+            distance = np.linalg.norm(rim_centers - center, axis=1)
+            nearest = int(np.argmin(distance)) if len(rims) else -1
+            if nearest < 0 or distance[nearest] > np.ptp(all_vertices[ring], axis=0).max():
+                raise ValueError(f"no hole of the bent space around the cylinder end at {center}")
+            rims_bridged.append(rims.pop(nearest))
+            bridges.append(bridge_loops(all_vertices, rims_bridged[-1], ring))
+            rim_centers = np.delete(rim_centers, nearest, axis=0)
+
+    # vertices shared by a ring and its rim (an adaptive hole with the angles of the cylinder) merge, and the
+    # bridge triangles between them vanish
+    all_faces = np.concatenate(bridges)
+    rim_cells = np.round(vertices[np.concatenate(rims_bridged)] / weld_tolerance)
+    ring_cells = np.round(cylinder_vertices[np.concatenate(rings)] / weld_tolerance)
+    if len(np.unique(np.concatenate([rim_cells, ring_cells]), axis=0)) < len(rim_cells) + len(ring_cells):
+        with span("stitch.weld", len(all_vertices)):
+            all_vertices, all_faces, _ = weld_vertices(all_vertices, all_faces, weld_tolerance)
+    all_faces = all_faces.astype(_index_dtype(len(all_vertices)))
+    with span("stitch.orient", len(all_faces)):
+        # the cylinder was oriented on its own, the bridges join it to the bent space
+        all_faces = orient_faces(all_faces)
+    _check_manifold(all_faces)
+    return all_vertices, all_faces
+
+
+def weld_vertices(vertices, faces, tolerance=1e-6):
+    """
+    Merge the vertices equal up to tolerance and drop the vertices no face uses. The coordinates are hashed to
+    integer cells of size tolerance and deduplicated in one np.unique over the cells.
+    Returns the vertices, the faces (indices into them) and for every vertex kept the index of its first copy
+    in the input.
+    """
+    used = np.flatnonzero(np.bincount(faces.ravel(), minlength=len(vertices)))
+    cells = np.round(np.asarray(vertices[used], dtype=np.float64) / tolerance).astype(np.int64)
+    # one int64 hash per cell (wrapping multiplications), much faster to unique than rows; the rows are only
+    # compared when two different cells hash alike
+    with np.errstate(over="ignore"):
+        keys = cells[:, 0] * np.int64(73856093) ^ cells[:, 1] * np.int64(19349663) ^ cells[:, 2] * np.int64(83492791)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    if np.any(cells[first[inverse]] != cells):
+        _, first, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    # keep the input order of the first copies, so welding a mesh without duplicates only drops unused vertices
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    remap = np.zeros(len(vertices), dtype=np.int64)
+    remap[used] = rank[inverse.ravel()]
+    kept = used[first[order]]
+    welded = remap[faces]
+    # triangles collapsed by the weld (two corners in the same cell) are dropped
+    degenerate = (welded[:, 0] == welded[:, 1]) | (welded[:, 1] == welded[:, 2]) | (welded[:, 0] == welded[:, 2])
+    return vertices[kept], welded[~degenerate].astype(_index_dtype(len(kept))), kept
+
+
+def _edge_sides(faces):
+    """
+    For every side (face f, corner k: the half-edge faces[f, k] -> faces[f, k + 1]) of the (F, 3) faces, flattened
+    as 3 * f + k, the index of its undirected edge, and the number of sides on every edge.
+    """
+    start = faces.reshape(-1).astype(np.int64)
+    end = np.roll(faces, -1, axis=1).reshape(-1).astype(np.int64)
+    n = int(faces.max(initial=0)) + 1
+    _, side_edge, counts = np.unique(np.minimum(start, end) * n + np.maximum(start, end), return_inverse=True,
+                                     return_counts=True)
+    return start, end, side_edge.ravel(), counts
+
+
+def orient_faces(faces):
+    """
+    Faces flipped so that every two triangles sharing an edge traverse it in opposite directions, connected part
+    by connected part, each keeping the winding of its first face. The parts are found at once over the double
+    cover of the mesh (every face as itself and flipped, joined when they agree across an edge), in which an
+    orientable part is two components.
+    """
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import connected_components
+
+    num_faces = len(faces)
+    start, end, side_edge, counts = _edge_sides(faces)
+    order = np.argsort(side_edge, kind="stable")
+    first = np.searchsorted(side_edge[order], np.flatnonzero(counts == 2))
+    a, b = order[first], order[first + 1]  # the two sides of every manifold edge
+    f, g = a // 3, b // 3
+    agree = start[a] == end[b]  # opposite directions: the faces are oriented alike
+    # f ~ g and f' ~ g' when they agree, f ~ g' and f' ~ g otherwise (f' = f + num_faces, flipped)
+    source = np.concatenate([f, f + num_faces])
+    target = np.concatenate([np.where(agree, g, g + num_faces), np.where(agree, g + num_faces, g)])
+    graph = sp.coo_matrix((np.ones(len(source)), (source, target)), shape=(2 * num_faces, 2 * num_faces))
+    _, labels = connected_components(graph, directed=False)
+    as_is, flipped = labels[:num_faces], labels[num_faces:]
+    if np.any(as_is == flipped):
+        raise ValueError("the mesh is not orientable (a face agrees with its own flip)")
+
+    # every part keeps the winding of its first face
+    part = np.minimum(as_is, flipped)
+    _, first_face = np.unique(part, return_index=True)
+    reference = np.zeros(labels.max() + 1, dtype=labels.dtype)
+    reference[part[first_face]] = as_is[first_face]
+    flip = as_is != reference[part]
+    oriented = faces.copy()
+    oriented[flip] = oriented[flip, ::-1]
+    return oriented
+
+
+def boundary_loops(faces):
+    """
+    The boundary loops of consistently oriented faces, each an array of vertex ids in the direction of its
+    half-edges (the edges with a single triangle). The loops are traced for all the boundary at once by pointer
+    jumping: every half-edge learns the smallest half-edge of its loop and its distance to it in log steps.
+    """
+    start, end, side_edge, counts = _edge_sides(faces)
+    boundary = np.flatnonzero(counts[side_edge] == 1)
+    if not len(boundary):
+        return []
+    start, end = start[boundary], end[boundary]
+    n = int(faces.max(initial=0)) + 1
+    if np.any(np.bincount(start, minlength=n) > 1):
+        raise ValueError("the boundary touches itself (a vertex on two boundary loops), it has no single loop order")
+    outgoing = np.full(n, -1, dtype=np.int64)
+    outgoing[start] = np.arange(len(start))
+    following = outgoing[end]
+    if np.any(following < 0):
+        raise ValueError("the boundary does not close up, orient the faces first (orient_faces)")
+
+    # smallest half-edge of every loop, doubling the reach of every half-edge at each step
+    steps = max(1, int(np.ceil(np.log2(len(start)))))
+    loop, jump = np.arange(len(start)), following.copy()
+    for _ in range(steps):
+        loop = np.minimum(loop, loop[jump])
+        jump = jump[jump]
+    # distance to the end of the loop once it is cut before its smallest half-edge (list ranking)
+    head = loop == np.arange(len(start))
+    cut = np.where(head[following], np.arange(len(start)), following)
+    remaining = (cut != np.arange(len(start))).astype(np.int64)
+    jump = cut
+    for _ in range(steps):
+        remaining = remaining + remaining[jump]
+        jump = jump[jump]
+
+    order = np.lexsort((-remaining, loop))
+    heads = np.flatnonzero(loop[order] == order)
+    return np.split(start[order], heads[1:])
+
+
+def bridge_loops(vertices, rim, ring):
+    """
+    Triangles joining two loops around the same axis (a hole rim and a cylinder ring): both are walked by angle
+    around the center of ring, and every step advances the loop whose next vertex comes first, so the strip has
+    one triangle per vertex of either loop. The winding is left to orient_faces.
+    """
+    points = np.asarray(vertices[ring], dtype=np.float64)
+    center = points.mean(axis=0)
+    # the plane of the ring: its two largest directions
+    _, _, axes = np.linalg.svd(points - center, full_matrices=False)
+
+    def unwrapped_angles(loop):
+        p = np.asarray(vertices[loop], dtype=np.float64) - center
+        angle = np.arctan2(p @ axes[1], p @ axes[0])
+        if np.sum(np.angle(np.exp(1j * np.diff(np.append(angle, angle[0]))))) < 0:
+            loop, angle = loop[::-1], angle[::-1]  # walk both loops counterclockwise
+        first = int(np.argmin(angle))
+        loop, angle = np.roll(loop, -first), np.roll(angle, -first)
+        # continuous along the loop, then closed with the first vertex one turn later
+        steps = np.angle(np.exp(1j * np.diff(angle)))
+        angle = angle[0] + np.concatenate([[0], np.cumsum(steps)])
+        return loop, np.append(angle[1:], angle[0] + 2 * np.pi)
+
+    rim, rim_next = unwrapped_angles(np.asarray(rim))
+    ring, ring_next = unwrapped_angles(np.asarray(ring))
+    # one event per vertex of either loop: advancing that loop past it, in the order of the vertex it reaches
+    on_rim = np.concatenate([np.ones(len(rim), dtype=bool), np.zeros(len(ring), dtype=bool)])
+    events = np.argsort(np.concatenate([rim_next, ring_next]), kind="stable")
+    on_rim = on_rim[events]
+    i = np.cumsum(on_rim) - on_rim  # rim vertex before every event
+    j = np.cumsum(~on_rim) - ~on_rim  # ring vertex before every event
+    rim_i, rim_i1 = rim[i % len(rim)], rim[(i + 1) % len(rim)]
+    ring_j, ring_j1 = ring[j % len(ring)], ring[(j + 1) % len(ring)]
+    return np.where(on_rim[:, None], np.stack([rim_i, ring_j, rim_i1], axis=-1),
+                    np.stack([ring_j, rim_i, ring_j1], axis=-1))
+
+
+def _check_manifold(faces):
+    _, _, _, counts = _edge_sides(faces)
+    if np.any(counts > 2):
+        raise ValueError(f"{int(np.sum(counts > 2))} edges have more than two triangles after stitching")
+
+
+
+if __name__ == "__main__":
+    import polyscope as ps
+    from wormhole_cache import cached_bent_space, cached_wormhole
+
+    # Initialize polyscope
+    ps.init()
+
+    # Create the bent space (or load it from the on-disk cache if these parameters were already generated)
+    vertices, faces = cached_bent_space(num_u, num_v, width, radius, extension_length, hole_radius)
+
+    # Create the cylinder, with its end rings in the planes of the holes for stitching
+    cylinder_vertices, cylinder_faces = cached_wormhole(cylinder_radius_top, cylinder_radius_bottom,
+                                                        spanning_height(radius, cylinder_segments), cylinder_segments)
+
+    # Move the cylinder onto the holes and stitch it to their rims: a single manifold mesh
+    all_vertices, all_faces = stitch_wormhole(vertices, faces, cylinder_vertices, cylinder_faces, radius, extension_length)
+
+    # Register the combined mesh in Polyscope
+    ps.register_surface_mesh("Wormhole", all_vertices, all_faces)
+
+
+    # show the visualization in polyscope
+    ps.show()
@@ -0,0 +1,356 @@
+"""
+Benchmarks for the wormhole pipelines.
+
+The suite times every stage over a sweep of resolutions: the bent space mesher (num_u x num_v), the SDF grid
+evaluation, the kNN mesher and marching cubes (grid_size^3), and the sphere traced render (width x height).
+Every case runs in a fresh process so its peak resident memory is its own, and is recorded with its wall time
+(best of repeat) and throughput (points/s, triangles/s). Records are written as JSON for trend tracking, and
+--compare flags the cases that got slower or bigger than a stored baseline. With --precision float32 float64
+every case runs in both precisions and the float32 time and memory are reported relative to float64.
+
+Parallel scaling of the SDF grid evaluation: the combined wormhole field is evaluated for every worker count,
+the time is compared with the serial run and the volume is checked to be bit-identical to it.
+
+Example usage:
+$ python wormhole_bench.py suite --json baseline.json
+$ python wormhole_bench.py suite --stages sdf_grid marching_cubes --compare baseline.json --tolerance 0.2
+$ python wormhole_bench.py suite --stages sdf_grid knn marching_cubes --precision float32 float64
+$ python wormhole_bench.py scaling --grid-size 256 --workers 1 2 4 8 16 32 --backend thread
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from wormhole_grid import evaluate_grid, scene_axes
+from wormhole_sdf import wormhole_scene
+
+
+# Resolutions of the suite: (num_u, num_v) for the bent space, grid_size for the others
+SUITE_SIZES = {
+    "bent_space": [(100, 90), (500, 450), (1000, 900), (4000, 3600)],
+    "sdf_grid": [64, 128, 256, 512],
+    "knn": [64, 128, 256],
+    "marching_cubes": [64, 128, 256, 512],
+    "render": [(128, 128), (256, 256), (512, 512), (1024, 1024)],
+}
+QUICK_SIZES = {
+    "bent_space": [(100, 90), (500, 450)],
+    "sdf_grid": [64, 128],
+    "knn": [64],
+    "marching_cubes": [64, 128],
+    "render": [(128, 128)],
+}
+
+# Structure of the df scripts
+SCENE = dict(new_outer_radius=0.5, height=3, cube_size=1.5)
+
+
+########### stages: setup (not timed) and a run returning the element counts ###########
+
+def _stage_bent_space(size, workers, precision):
+    from wormhole import create_bent_space
+
+    num_u, num_v = size
+
+    def run():
+        vertices, faces = create_bent_space(num_u, num_v, 10, 5, 10, 1.0, precision)
+        return {"points": len(vertices), "triangles": len(faces)}
+    return run
+
+
+def _stage_sdf_grid(size, workers, precision):
+    x, y, z, grid_spacing = scene_axes(size, **SCENE)
+    scene = wormhole_scene(grid_spacing=grid_spacing, **SCENE)
+    out = np.empty((size, size, size), dtype=precision)
+
+    def run():
+        evaluate_grid(scene, x, y, z, out=out, workers=workers)
+        return {"points": out.size}
+    return run
+
+
+def _stage_knn(size, workers, precision):
+    from wormhole_grid import grid_points, narrow_band
+    from wormhole_knn import knn_mesh, laplacian_smooth, smoothing_operator
+    import sklearn.neighbors  # imported by knn_mesh, loaded here so the import is not timed
+
+    x, y, z, grid_spacing = scene_axes(size, **SCENE)
+    x, y, z = (axis.astype(precision) for axis in (x, y, z))
+    near_surface, values = narrow_band(wormhole_scene(grid_spacing=grid_spacing, **SCENE), x, y, z, grid_spacing * 0.5,
+                                       dtype=precision)
+    points = grid_points(x, y, z, near_surface.T)
+
+    def run():
+        vertices, faces, indices = knn_mesh(points, k=5)
+        laplacian_smooth(vertices, smoothing_operator(len(vertices), indices=indices, dtype=precision), iterations=5)
+        return {"points": len(points), "triangles": len(faces)}
+    return run
+
+
+def _stage_marching_cubes(size, workers, precision):
+    from wormhole_marching import chunked_marching_cubes
+    import skimage.measure  # imported by the blocks, loaded here so the import is not timed
+
+    x, y, z, grid_spacing = scene_axes(size, **SCENE)
+    scene = wormhole_scene(grid_spacing=grid_spacing, **SCENE)
+
+    def run():
+        verts, faces = chunked_marching_cubes(scene, x, y, z, level=0, workers=workers, dtype=precision)
+        return {"points": size ** 3, "triangles": len(faces)}
+    return run
+
+
+def _stage_render(size, workers, precision):
+    from wormhole_render import render
+
+    # the walls of a 256^3 grid, so the thumbnail shows the structure the grid stages mesh
+    width, height = size
+    x, y, z, grid_spacing = scene_axes(256, **SCENE)
+    scene = wormhole_scene(grid_spacing=grid_spacing, **SCENE)
+
+    def run():
+        image, depth = render(scene, width, height, workers=workers, dtype=precision)
+        return {"points": width * height}
+    return run
+
+
+STAGES = {
+    "bent_space": _stage_bent_space,
+    "sdf_grid": _stage_sdf_grid,
+    "knn": _stage_knn,
+    "marching_cubes": _stage_marching_cubes,
+    "render": _stage_render,
+}
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MiB (ru_maxrss is in KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_case(stage, size, repeat=3, workers=1, precision="float64"):
+    """Time one stage at one size in this process (best of repeat runs). Returns its record."""
+    baseline_rss = _peak_rss_mb()
+    run = STAGES[stage](size, workers, precision)
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counts = run()
+        best = min(best, time.perf_counter() - start)
+    record = {
+        "stage": stage,
+        "size": list(size) if isinstance(size, tuple) else size,
+        "workers": workers,
+        "precision": precision,
+        "seconds": best,
+        "peak_rss_mb": _peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,  # interpreter and imports, before the setup of the case
+    }
+    record.update(counts)
+    for name in ("points", "triangles"):
+        if name in counts:
+            record[f"{name}_per_second"] = counts[name] / best
+    return record
+
+
+def bench_suite(stages=None, sizes=None, repeat=3, workers=1, isolate=True, precisions=("float64",)):
+    """
+    Run every (stage, size, precision) case of the suite, each in its own process when isolate (so peak_rss_mb
+    is the peak of that case alone). sizes maps stage names to their sweeps (SUITE_SIZES by default).
+    Returns the list of records.
+    """
+    sizes = sizes or SUITE_SIZES
+    cases = [(stage, size, precision) for stage in (stages or STAGES) for size in sizes[stage]
+             for precision in precisions]
+    records = []
+    for stage, size, precision in cases:
+        if isolate:
+            # a fresh interpreter per case: the peak memory of earlier cases does not leak into this one
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                records.append(pool.submit(run_case, stage, size, repeat, workers, precision).result())
+        else:
+            records.append(run_case(stage, size, repeat, workers, precision))
+        print(_format_record(records[-1]), file=sys.stderr)
+    return records
+
+
+def _case_key(record):
+    return record["stage"], json.dumps(record["size"]), record.get("workers", 1), record.get("precision", "float64")
+
+
+def compare(records, baseline, tolerance=0.2, memory_tolerance=None):
+    """
+    Compare records with baseline records of the same (stage, size, workers, precision). A case regresses when its time
+    exceeds the baseline by more than tolerance (a fraction), or its peak memory by more than memory_tolerance
+    (tolerance by default). Returns one dict per compared case with the ratios and a "regression" flag.
+    """
+    memory_tolerance = tolerance if memory_tolerance is None else memory_tolerance
+    reference = {_case_key(record): record for record in baseline}
+    comparisons = []
+    for record in records:
+        base = reference.get(_case_key(record))
+        if base is None:
+            continue
+        time_ratio = record["seconds"] / base["seconds"]
+        memory_ratio = record["peak_rss_mb"] / base["peak_rss_mb"]
+        comparisons.append({
+            "stage": record["stage"],
+            "size": record["size"],
+            "workers": record.get("workers", 1),
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "regression": bool(time_ratio > 1 + tolerance or memory_ratio > 1 + memory_tolerance),
+        })
+    return comparisons
+
+
+def _format_record(record):
+    size = "x".join(map(str, record["size"])) if isinstance(record["size"], list) else f"{record['size']}^3"
+    rate = record.get("triangles_per_second", record.get("points_per_second", 0))
+    unit = "tri/s" if "triangles_per_second" in record else "pts/s"
+    return (f"{record['stage']:>15} {size:>11} {record.get('precision', 'float64'):>8} {record['seconds']:>10.3f} s "
+            f"{record['peak_rss_mb']:>9.1f} MiB {rate / 1e6:>9.2f} M{unit}")
+
+
+def compare_precision(records):
+    """
+    Ratios float32 / float64 of the time and of the memory above the interpreter baseline, for every
+    (stage, size, workers) case run in both precisions. Returns one comparison per case.
+    """
+    by_precision = {"float32": {}, "float64": {}}
+    for record in records:
+        precision = record.get("precision", "float64")
+        if precision in by_precision:
+            by_precision[precision][_case_key(record)[:3]] = record
+    comparisons = []
+    for key, single in by_precision["float32"].items():
+        double = by_precision["float64"].get(key)
+        if double is None:
+            continue
+        comparisons.append({
+            "stage": single["stage"],
+            "size": single["size"],
+            "time_ratio": single["seconds"] / double["seconds"],
+            "memory_ratio": (single["peak_rss_mb"] - single["baseline_rss_mb"])
+                            / max(double["peak_rss_mb"] - double["baseline_rss_mb"], 1e-9),
+        })
+    return comparisons
+
+
+def bench_parallel_scaling(grid_size=256, worker_counts=(1, 2, 4, 8), backend="thread", repeat=3,
+                           new_outer_radius=0.5, height=3, cube_size=1.5):
+    """
+    Time evaluate_grid on the wormhole scene for every worker count (best of repeat runs).
+    Returns one record per worker count with the time, throughput, speedup and whether the volume matches
+    the serial one bit for bit.
+    """
+    x, y, z, grid_spacing = scene_axes(grid_size, new_outer_radius, height, cube_size)
+    scene = wormhole_scene(new_outer_radius, height, cube_size, grid_spacing)
+    reference = evaluate_grid(scene, x, y, z)
+    out = np.empty_like(reference)
+
+    records = []
+    for workers in worker_counts:
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            evaluate_grid(scene, x, y, z, out=out, workers=workers, backend=backend)
+            best = min(best, time.perf_counter() - start)
+        records.append({
+            "grid_size": grid_size,
+            "backend": backend,
+            "workers": workers,
+            "seconds": best,
+            "points_per_second": reference.size / best,
+            "identical": bool(np.array_equal(out, reference)),
+        })
+    serial = records[0]["seconds"]
+    for record in records:
+        record["speedup"] = serial / record["seconds"]
+    return records
+
+
+def _main_suite(args):
+    sizes = QUICK_SIZES if args.quick else SUITE_SIZES
+    if args.grid_sizes:
+        sizes = dict(sizes, **{stage: args.grid_sizes for stage in ("sdf_grid", "knn", "marching_cubes")})
+    records = bench_suite(args.stages, sizes, args.repeat, args.workers, isolate=not args.no_isolate,
+                          precisions=args.precision)
+    comparisons = compare_precision(records)
+    if comparisons:
+        print(f"{'stage':>15} {'size':>11} {'f32/f64 time':>13} {'f32/f64 memory':>15}")
+        for c in comparisons:
+            size = "x".join(map(str, c["size"])) if isinstance(c["size"], list) else f"{c['size']}^3"
+            print(f"{c['stage']:>15} {size:>11} {c['time_ratio']:>12.2f}x {c['memory_ratio']:>14.2f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(records, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparisons = compare(records, baseline, args.tolerance, args.memory_tolerance)
+        print(f"{'stage':>15} {'size':>11} {'time':>8} {'memory':>8}")
+        for c in comparisons:
+            size = "x".join(map(str, c["size"])) if isinstance(c["size"], list) else f"{c['size']}^3"
+            flag = "  REGRESSION" if c["regression"] else ""
+            print(f"{c['stage']:>15} {size:>11} {c['time_ratio']:>7.2f}x {c['memory_ratio']:>7.2f}x{flag}")
+        if any(c["regression"] for c in comparisons):
+            return 1
+    return 0
+
+
+def _main_scaling(args):
+    records = bench_parallel_scaling(args.grid_size, sorted(set(args.workers)), args.backend, args.repeat)
+    print(f"{'workers':>8} {'seconds':>10} {'Mpoints/s':>10} {'speedup':>8} {'identical':>10}")
+    for record in records:
+        print(f"{record['workers']:>8} {record['seconds']:>10.3f} {record['points_per_second'] / 1e6:>10.2f} "
+              f"{record['speedup']:>8.2f} {str(record['identical']):>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(records, f, indent=2)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the wormhole pipelines.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite = subparsers.add_parser("suite", help="time, memory and throughput of every stage over a size sweep")
+    suite.add_argument("--stages", nargs="+", choices=list(STAGES), default=None)
+    suite.add_argument("--grid-sizes", type=int, nargs="+", help="override the grid sizes of the grid stages")
+    suite.add_argument("--quick", action="store_true", help="small sizes only")
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--workers", type=int, default=1)
+    suite.add_argument("--precision", nargs="+", choices=["float32", "float64"], default=["float64"],
+                       help="run every case in these precisions (both to compare them)")
+    suite.add_argument("--no-isolate", action="store_true", help="run the cases in this process (shared peak RSS)")
+    suite.add_argument("--json", help="write the records to this JSON file")
+    suite.add_argument("--compare", help="baseline JSON (from --json) to flag regressions against")
+    suite.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown as a fraction")
+    suite.add_argument("--memory-tolerance", type=float, default=None, help="allowed memory growth (default: --tolerance)")
+    suite.set_defaults(run=_main_suite)
+
+    scaling = subparsers.add_parser("scaling", help="parallel scaling of the SDF grid evaluation")
+    scaling.add_argument("--grid-size", type=int, default=256)
+    scaling.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, os.cpu_count() or 1])
+    scaling.add_argument("--backend", choices=["thread", "process"], default="thread")
+    scaling.add_argument("--repeat", type=int, default=3)
+    scaling.add_argument("--json", help="also write the records to this JSON file")
+    scaling.set_defaults(run=_main_scaling)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+On-disk, content-addressed cache for generated meshes and SDF volumes.
+
+An entry is keyed by a hash of what was generated (kind), its parameters and the version of the code that
+generated it (a hash of the source files involved), so changing either simply misses the cache. Every entry
+is a directory of .npy files, loaded memory-mapped, so a repeat run opens even large volumes in milliseconds.
+The cache keeps its total size under max_bytes by evicting the least recently used entries.
+
+Example usage:
+>>> cache = ArrayCache("~/.cache/wormhole", max_bytes=2 * 2**30)
+>>> vertices, faces = cached_bent_space(100, 90, 10, 5, 10, 1.0, cache=cache)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "wormhole")
+DEFAULT_MAX_BYTES = 4 * 2**30
+
+
+def code_version(*modules):
+    """Hash of the source files of the given modules, part of every key so code changes invalidate entries."""
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _plain(value):
+    """Parameters as JSON friendly values (NumPy scalars and arrays, tuples, dtypes...)."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (type, np.dtype)):
+        return np.dtype(value).name
+    return value
+
+
+def cache_key(kind, params, version=""):
+    """Content address of an entry: hash of the kind, the parameters and the code version."""
+    payload = json.dumps({"kind": kind, "params": _plain(params), "version": version}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ArrayCache:
+    """Directory of entries (one sub-directory of .npy files per key) with a least recently used size cap."""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = os.path.expanduser(root)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key, mmap=True):
+        """The arrays stored under key (memory-mapped read only if mmap), or None on a miss."""
+        path = self._path(key)
+        try:
+            names = sorted(name for name in os.listdir(path) if name.endswith(".npy"))
+            arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode="r" if mmap else None) for name in names}
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used
+        return arrays
+
+    def put(self, key, arrays):
+        """
+        Store a dict of arrays under key. The entry appears atomically, concurrent writers are harmless.
+        An entry larger than the whole cache is not stored (it would only evict everything else).
+        """
+        if sum(np.asarray(array).nbytes for array in arrays.values()) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+            os.rename(tmp, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            # another process stored the same entry first
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def get_or_create(self, kind, params, builder, version="", mmap=True):
+        """
+        The arrays for (kind, params, version), from the cache or by calling builder(), which returns a dict of
+        arrays, and storing its result.
+        """
+        key = cache_key(kind, params, version)
+        arrays = self.get(key, mmap=mmap)
+        if arrays is None:
+            built = builder()
+            self.put(key, built)
+            # entries larger than the whole cache are not stored, hand back what was built
+            arrays = self.get(key, mmap=mmap) or built
+        return arrays
+
+    def entries(self):
+        """(key, bytes, last use time) of every entry."""
+        entries = []
+        for key in os.listdir(self.root):
+            path = self._path(key)
+            if key.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                entries.append((key, size, os.stat(path).st_mtime))
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for key, size, used in entries)
+        for key, size, used in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for key, size, used in self.entries():
+            shutil.rmtree(self._path(key), ignore_errors=True)
+
+
+def _default_cache(cache):
+    return ArrayCache() if cache is None else cache
+
+
+def cached_bent_space(num_u, num_v, width, radius, extension_length, hole_radius, dtype=np.float32, cache=None):
+    """create_bent_space through the cache. Returns vertices, faces (memory-mapped on a hit)."""
+    import wormhole
+
+    params = dict(num_u=num_u, num_v=num_v, width=width, radius=radius, extension_length=extension_length,
+                  hole_radius=hole_radius, dtype=dtype)
+
+    def build():
+        vertices, faces = wormhole.create_bent_space(**params)
+        return {"vertices": vertices, "faces": faces}
+
+    arrays = _default_cache(cache).get_or_create("bent_space", params, build, code_version(wormhole))
+    return arrays["vertices"], arrays["faces"]
+
+
+def cached_bent_space_adaptive(width, radius, extension_length, hole_radius, tolerance=0.01, dtype=np.float32,
+                               cache=None):
+    """create_bent_space_adaptive through the cache. Returns vertices, faces (memory-mapped on a hit)."""
+    import wormhole
+
+    params = dict(width=width, radius=radius, extension_length=extension_length, hole_radius=hole_radius,
+                  tolerance=tolerance, dtype=dtype)
+
+    def build():
+        vertices, faces = wormhole.create_bent_space_adaptive(**params)
+        return {"vertices": vertices, "faces": faces}
+
+    arrays = _default_cache(cache).get_or_create("bent_space_adaptive", params, build, code_version(wormhole))
+    return arrays["vertices"], arrays["faces"]
+
+
+def cached_wormhole(radius_top, radius_bottom, height, segments, dtype=np.float64, cache=None):
+    """create_wormhole (the cylinder) through the cache. Returns vertices, faces."""
+    import wormhole
+
+    params = dict(radius_top=radius_top, radius_bottom=radius_bottom, height=height, segments=segments, dtype=dtype)
+
+    def build():
+        vertices, faces = wormhole.create_wormhole(**params)
+        return {"vertices": vertices, "faces": faces}
+
+    arrays = _default_cache(cache).get_or_create("wormhole", params, build, code_version(wormhole))
+    return arrays["vertices"], arrays["faces"]
+
+
+def cached_scene_volume(grid_size, new_outer_radius, height, cube_size, dtype=np.float64, cache=None):
+    """
+    The combined SDF of wormhole_scene on the scene_axes grid through the cache.
+    Returns the volume (memory-mapped on a hit) and the x, y, z axes (in dtype, as evaluate_grid is given them
+    uncached) and grid_spacing.
+    """
+    import wormhole_grid
+    import wormhole_sdf
+
+    x, y, z, grid_spacing = wormhole_grid.scene_axes(grid_size, new_outer_radius, height, cube_size)
+    x, y, z = (axis.astype(dtype) for axis in (x, y, z))
+    params = dict(grid_size=grid_size, new_outer_radius=new_outer_radius, height=height, cube_size=cube_size,
+                  dtype=dtype)
+
+    def build():
+        scene = wormhole_sdf.wormhole_scene(new_outer_radius, height, cube_size, grid_spacing)
+        return {"volume": wormhole_grid.evaluate_grid(scene, x, y, z, dtype=dtype)}
+
+    version = code_version(wormhole_sdf, wormhole_grid)
+    volume = _default_cache(cache).get_or_create("scene_volume", params, build, version)["volume"]
+    return volume, x, y, z, grid_spacing
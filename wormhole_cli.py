@@ -0,0 +1,163 @@
+"""
+Headless command line entry point for the wormhole pipelines (see wormhole_pipelines.PIPELINES).
+
+Parameters come from the defaults of the pipeline, then a JSON config file, then the command line options.
+Results are written to the output directory together with a run.json (parameters, sizes and timing), and
+nothing is displayed unless --show is given, so runs can be scripted and launched as parallel batch jobs.
+
+Example usage:
+$ python wormhole_cli.py marching-cubes --grid-size 256 --workers 8 --output out/mc256
+$ python wormhole_cli.py bent-space --config bent.json --num-u 4000 --num-v 3600 --format obj --output out/bent
+$ python wormhole_cli.py knn --output out/knn --show
+$ python wormhole_cli.py threshold --grid-size 512 --precision float32 --output out/threshold512
+$ python wormhole_cli.py render --width 256 --image-height 256 --azimuth 60 --output out/thumbnail
+$ python wormhole_cli.py marching-cubes --grid-size 400 --lod 6 --output out/mc400
+$ python wormhole_cli.py bent-space --stitch true --geodesic 0,0,-8 --output out/bent-geodesic --show
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import wormhole_profile
+from wormhole_pipelines import PIPELINES, PRECISIONS, run_pipeline, show_results, uses_cache, write_results
+
+
+def _parse_bool(value):
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise argparse.ArgumentTypeError(f"expected a boolean, got {value!r}")
+
+
+def _parse_workers(value):
+    """An int, or 'all'/'none' for one worker per core."""
+    return None if value.lower() in ("all", "none") else int(value)
+
+
+def _parse_point(value):
+    try:
+        point = [float(x) for x in value.split(",")]
+    except ValueError:
+        point = []
+    if len(point) != 3:
+        raise argparse.ArgumentTypeError(f"expected a point x,y,z, got {value!r}")
+    return point
+
+
+def _option_type(name, default):
+    if name == "workers":
+        return _parse_workers
+    if isinstance(default, bool):
+        return _parse_bool
+    if isinstance(default, int):
+        return int
+    if isinstance(default, str):
+        return str
+    return float
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run a wormhole pipeline headless and write its results.")
+    subparsers = parser.add_subparsers(dest="pipeline", required=True)
+    for name, (function, defaults) in PIPELINES.items():
+        sub = subparsers.add_parser(name, help=(function.__doc__ or "").strip().split("\n")[0])
+        sub.add_argument("--config", help="JSON file of parameters (command line options take precedence)")
+        sub.add_argument("--output", "-o", help="output directory (default: out/<pipeline>)")
+        sub.add_argument("--format", choices=["ply", "obj"], default="ply", help="mesh file format")
+        if uses_cache(name):
+            sub.add_argument("--cache-dir", help="reuse generated meshes/volumes from this on-disk cache")
+        sub.add_argument("--show", action="store_true", help="open the result in the viewer after writing it")
+        sub.add_argument("--no-write", action="store_true", help="do not write results (timing runs)")
+        sub.add_argument("--profile", action="store_true", help="print the time spent in every stage")
+        sub.add_argument("--trace-memory", action="store_true", help="also count allocations per stage (slower)")
+        sub.add_argument("--trace", help="write the stages as a Chrome trace JSON file (implies --profile)")
+        sub.add_argument("--lod", type=int, default=0, metavar="LEVELS",
+                         help="also decimate the mesh into up to LEVELS halved levels, written to <output>/lod")
+        sub.add_argument("--geodesic", type=_parse_point, action="append", metavar="X,Y,Z",
+                         help="also compute the geodesic distance over the mesh from the vertex nearest to this "
+                              "point (repeatable: from the nearest of the points), written to <output>/geodesic.npy")
+        for param, default in defaults.items():
+            # every option defaults to None, so only the options actually given override the config file
+            sub.add_argument("--" + param.replace("_", "-"), dest=param, type=_option_type(param, default),
+                             choices=PRECISIONS if param == "precision" else None, default=None,
+                             help=f"default: {default}")
+    return parser
+
+
+def load_params(name, config=None, options=None):
+    """The parameters of a pipeline run: the defaults, updated by the config file, updated by the options."""
+    function, defaults = PIPELINES[name]
+    params = dict(defaults)
+    if config:
+        with open(config) as f:
+            loaded = json.load(f)
+        unknown = set(loaded) - set(defaults)
+        if unknown:
+            raise ValueError(f"unknown parameters in {config}: {', '.join(sorted(unknown))}")
+        params.update(loaded)
+    params.update({key: value for key, value in (options or {}).items() if key in defaults and value is not None})
+    return params
+
+
+def _summary(results):
+    """Sizes of the arrays in a results dict, for run.json."""
+    return {key: list(np.shape(value)) for key, value in results.items() if isinstance(value, np.ndarray)}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    params = load_params(args.pipeline, args.config, vars(args))
+    cache = None
+    if getattr(args, "cache_dir", None):
+        from wormhole_cache import ArrayCache
+
+        cache = ArrayCache(args.cache_dir)
+
+    profiling = args.profile or args.trace_memory or args.trace
+    if profiling:
+        wormhole_profile.enable(trace_memory=args.trace_memory)
+    start = time.perf_counter()
+    results = run_pipeline(args.pipeline, cache=cache, **params)
+    if args.lod:
+        if "faces" not in results:
+            raise ValueError(f"--lod needs a mesh, the {args.pipeline} pipeline does not make one")
+        from wormhole_lod import build_lod
+
+        results["lod"] = build_lod(results["vertices"], results["faces"], max_levels=args.lod)
+    if args.geodesic:
+        if "faces" not in results:
+            raise ValueError(f"--geodesic needs a mesh, the {args.pipeline} pipeline does not make one")
+        from wormhole_geodesic import HeatGeodesics
+
+        geodesics = HeatGeodesics(results["vertices"], results["faces"])
+        results["geodesic"] = geodesics.distance([geodesics.nearest_vertex(point) for point in args.geodesic])
+    seconds = time.perf_counter() - start
+
+    if not args.no_write:
+        output = args.output or os.path.join("out", args.pipeline)
+        paths = write_results(results, output, args.format)
+        with open(os.path.join(output, "run.json"), "w") as f:
+            json.dump({"pipeline": args.pipeline, "params": params, "seconds": seconds, "shapes": _summary(results),
+                       "files": [os.path.relpath(path, output) for path in paths]}, f, indent=2)
+        print(f"{args.pipeline}: {seconds:.3f} s, wrote {', '.join(paths)}", file=sys.stderr)
+    else:
+        print(f"{args.pipeline}: {seconds:.3f} s", file=sys.stderr)
+
+    if profiling:
+        profiler = wormhole_profile.disable()
+        print(profiler.summary(), file=sys.stderr)
+        if args.trace:
+            profiler.write_chrome_trace(args.trace)
+
+    if args.show:
+        show_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Evaluation of wormhole_sdf trees over regular grids without building the dense meshgrid/points arrays.
+
+The grid is described by its three linspace axes (x, y, z), with the same 'ij' layout as
+np.meshgrid(x, y, z, indexing='ij'). It is walked in slabs along x (rows along y if a single x-plane is
+already too big), the coordinates of each slab are generated on the fly into a reused buffer and the
+field is written straight into a preallocated volume, so peak memory follows the slab and not the grid.
+
+Example usage:
+>>> x, y, z, grid_spacing = scene_axes(512, new_outer_radius=0.5, height=3, cube_size=1.5)
+>>> volume = evaluate_grid(wormhole_scene(0.5, 3, 1.5, grid_spacing), x, y, z, dtype=np.float32)
+
+With workers > 1 the blocks are evaluated in a thread pool (NumPy releases the GIL in its loops) or a process
+pool writing into a shared-memory volume. Every point is computed by the same elementwise operations whatever
+block it falls in, so the parallel result is bit-identical to the serial one.
+
+narrow_band only evaluates the points near the surface: it refines blocks of the grid coarse to fine and
+drops every block whose interval bound (see wormhole_sdf.SDF.interval) can not reach the band.
+
+The coordinates and the field are computed in the dtype of the volume: float32 halves the memory and bandwidth
+of every stage. Interval tests are computed in float64 and widened by rounding_margin, so the blocks they drop
+stay out of the band even with the rounding of a float32 evaluation.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from wormhole_profile import span
+from wormhole_sdf import BLOCK_SIZE
+
+
+# Default number of bytes the coordinates and field of one slab may use
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
+
+# Blocks handed to each worker when evaluating in parallel, more blocks balance the load better
+BLOCKS_PER_WORKER = 4
+
+# Rounding error allowed for a field evaluated in a given dtype, in units in the last place of the grid extent
+ROUNDING_ULPS = 64
+
+
+def rounding_margin(x, y, z, dtype=np.float64):
+    """
+    Bound on the rounding error of a field evaluated in dtype over the grid (a few ulps of its largest
+    coordinate, the 1-Lipschitz fields stay within that scale), never below the 1e-12 of float64 runs.
+    Interval tests widen their bounds by it so they never drop a block the evaluated field would keep.
+    """
+    extent = max([np.max(np.abs(axis)) for axis in (x, y, z) if len(axis)] + [1.0])
+    return max(1e-12, ROUNDING_ULPS * np.finfo(dtype).eps * float(extent))
+
+
+def scene_axes(grid_size, new_outer_radius, height, cube_size):
+    """The grid axes and grid_spacing used by the df scripts, for the given size of the structure."""
+    grid_spacing = (2 * (new_outer_radius + 1)) / grid_size
+    x = np.linspace(-new_outer_radius - 1, new_outer_radius + 1 + cube_size, grid_size)
+    y = np.linspace(-height / 2 - 1, height / 2 + 1, grid_size)
+    z = np.linspace(-new_outer_radius - 1, new_outer_radius + 1 + cube_size, grid_size)
+    return x, y, z, grid_spacing
+
+
+def grid_points(x, y, z, indices):
+    """
+    Coordinates of grid points given their (i, j, k) indices, e.g. the output of np.nonzero on a volume.
+    Matches indexing the flattened meshgrid points array, without building it.
+    """
+    i, j, k = indices
+    return np.stack([x[i], y[j], z[k]], axis=-1)
+
+
+def grid_blocks(shape, max_points):
+    """
+    Split a grid of the given shape into blocks of at most max_points points (when possible).
+    Blocks are slabs of whole x-planes, or rows of y inside a single x-plane when one plane is too big;
+    z is never split so every block is contiguous in a C ordered volume. Yields (x slice, y slice).
+    """
+    nx, ny, nz = shape
+    plane = ny * nz
+    if plane <= max_points:
+        step = max(1, max_points // max(plane, 1))
+        for i0 in range(0, nx, step):
+            yield slice(i0, min(i0 + step, nx)), slice(0, ny)
+    else:
+        step = max(1, max_points // max(nz, 1))
+        for i in range(nx):
+            for j0 in range(0, ny, step):
+                yield slice(i, i + 1), slice(j0, min(j0 + step, ny))
+
+
+def slab_points(max_points, memory_budget, itemsize):
+    """Number of grid points per slab that fit the memory budget (3 coordinates and a value per point)."""
+    return max(1, min(max_points, memory_budget // (4 * itemsize)))
+
+
+def fill_block(sdf, x, y, z, out, xs, ys, buffer=None):
+    """
+    Evaluate sdf on the block (xs, ys, all z) of the grid and write the field into out[xs, ys].
+    buffer is an optional flat scratch array for the coordinates, reused across blocks.
+    """
+    bx = len(range(*xs.indices(len(x))))
+    by = len(range(*ys.indices(len(y))))
+    nz = len(z)
+    n = bx * by * nz
+    if buffer is None or buffer.size < 3 * n:
+        buffer = np.empty(3 * n, dtype=np.result_type(x, y, z))
+    points = buffer[:3 * n].reshape(bx, by, nz, 3)
+    with span("grid.points", n):
+        points[..., 0] = x[xs, None, None]
+        points[..., 1] = y[None, ys, None]
+        points[..., 2] = z[None, None, :]
+
+    block = out[xs, ys]
+    if block.flags.c_contiguous:
+        # z is whole, so the block is contiguous in the volume: evaluate straight into it
+        sdf.evaluate(points.reshape(n, 3), out=block.reshape(n), block_size=min(BLOCK_SIZE, n))
+    else:
+        block[...] = sdf.evaluate(points.reshape(n, 3), block_size=min(BLOCK_SIZE, n)).reshape(bx, by, nz)
+    return buffer
+
+
+def evaluate_grid(sdf, x, y, z, out=None, dtype=np.float64, memory_budget=DEFAULT_MEMORY_BUDGET,
+                  workers=1, backend="thread"):
+    """
+    Evaluate sdf on the grid spanned by the x, y, z axes, slab by slab.
+
+    Parameters:
+    - sdf (wormhole_sdf.SDF): The tree to evaluate.
+    - x, y, z (np.array): The grid axes, as in np.meshgrid(x, y, z, indexing='ij').
+    - out (np.array): Optional (len(x), len(y), len(z)) volume to write into, e.g. a np.memmap.
+    - dtype: The dtype of the volume when out is not given (float32 halves its size). The coordinates and the
+      field are computed in the dtype of the volume.
+    - memory_budget (int): Bytes the coordinates and field of a slab may use (shared by all workers).
+    - workers (int): Number of workers, None for one per core. 1 evaluates serially in this process.
+    - backend (str): "thread" or "process" pool when workers > 1.
+
+    Returns:
+    - volume (np.array): The field, equal to sdf(points).reshape(len(x), len(y), len(z)) for the dense points.
+    """
+    shape = (len(x), len(y), len(z))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+    precision = out.dtype if np.issubdtype(out.dtype, np.floating) else np.float64
+    x, y, z = (np.asarray(axis, dtype=precision) for axis in (x, y, z))
+
+    workers = resolve_workers(workers)
+    total = int(np.prod(shape))
+    with span("grid.evaluate", total):
+        _evaluate_blocks(sdf, x, y, z, out, memory_budget, workers, backend)
+    return out
+
+
+def _evaluate_blocks(sdf, x, y, z, out, memory_budget, workers, backend):
+    shape = out.shape
+    total = int(np.prod(shape))
+    if workers == 1:
+        max_points = slab_points(total, memory_budget, x.itemsize)
+        buffer = None
+        for xs, ys in grid_blocks(shape, max_points):
+            buffer = fill_block(sdf, x, y, z, out, xs, ys, buffer)
+        return
+
+    # every worker holds one block at a time, and there should be enough blocks to keep them all busy
+    max_points = min(slab_points(total, memory_budget // workers, x.itemsize),
+                     max(1, -(-total // (workers * BLOCKS_PER_WORKER))))
+    blocks = list(grid_blocks(shape, max_points))
+    if backend == "thread":
+        _evaluate_threads(sdf, x, y, z, out, blocks, workers)
+    elif backend == "process":
+        _evaluate_processes(sdf, x, y, z, out, blocks, workers)
+    else:
+        raise ValueError(f"unknown backend {backend!r}, expected 'thread' or 'process'")
+
+
+def resolve_workers(workers):
+    """The number of workers to use: None means one per core."""
+    if workers is None:
+        return os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    return int(workers)
+
+
+def _evaluate_threads(sdf, x, y, z, out, blocks, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() to surface the exceptions of the workers
+        list(pool.map(lambda block: fill_block(sdf, x, y, z, out, *block), blocks))
+
+
+########### process backend: the volume lives in shared memory, every worker writes its own blocks ###########
+
+_shared = {}
+
+
+def _attach(name, shape, dtype, sdf, x, y, z):
+    """Process pool initializer: map the shared volume and keep the tree and axes for the blocks to come."""
+    memory = shared_memory.SharedMemory(name=name)
+    _shared.update(memory=memory, out=np.ndarray(shape, dtype=dtype, buffer=memory.buf), sdf=sdf, x=x, y=y, z=z)
+
+
+def _fill_shared_block(block):
+    fill_block(_shared["sdf"], _shared["x"], _shared["y"], _shared["z"], _shared["out"], *block)
+
+
+def _evaluate_processes(sdf, x, y, z, out, blocks, workers):
+    memory = shared_memory.SharedMemory(create=True, size=max(out.nbytes, 1))
+    try:
+        volume = np.ndarray(out.shape, dtype=out.dtype, buffer=memory.buf)
+        initargs = (memory.name, out.shape, out.dtype, sdf, x, y, z)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=initargs) as pool:
+            list(pool.map(_fill_shared_block, blocks))
+        out[...] = volume
+        del volume
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+########### sparse narrow band: coarse to fine refinement with interval pruning ###########
+
+# Points per side of the finest blocks, which are evaluated densely
+LEAF_SIZE = 4
+
+# Leaves evaluated together once the refinement is done
+LEAVES_PER_BATCH = 4096
+
+
+def _block_bounds(sdf, x, y, z, origins, size, margin):
+    """
+    Interval of sdf over the blocks of size^3 grid points starting at the (B, 3) origins (clipped to the grid),
+    widened by margin (see rounding_margin).
+    """
+    axes = (x, y, z)
+    first = [axis[o] for axis, o in zip(axes, origins.T)]
+    last = [axis[np.minimum(o + size, len(axis)) - 1] for axis, o in zip(axes, origins.T)]
+    centers = np.stack([(a + b) / 2 for a, b in zip(first, last)], axis=-1)
+    half_diagonal = 0.5 * np.sqrt(sum((b - a) ** 2 for a, b in zip(first, last)))
+    # a hair wider than the cell so rounding never drops a block that touches the band
+    return sdf.interval(centers, half_diagonal * (1 + 1e-9) + margin)
+
+
+def narrow_band_blocks(sdf, x, y, z, band, leaf_size=LEAF_SIZE, dtype=np.float64, workers=1):
+    """
+    Sparse block volume of the points where |sdf| < band.
+
+    The grid is covered by cubic blocks of leaf_size * 2^levels points per side. A block is kept only if
+    the interval of sdf over it meets [-band, band], kept blocks are split in 8 and the process repeats down
+    to leaf_size, where the blocks still alive are evaluated densely.
+
+    The leaves are evaluated in dtype, and so are their values. With workers > 1 the batches of leaves are
+    evaluated in a thread pool (None for one worker per core), with the same values as serially.
+
+    Returns:
+    - origins (np.array): (B, 3) grid indices of the first point of every leaf block.
+    - values (np.array): (B, leaf_size, leaf_size, leaf_size) field of the leaves, NaN past the grid end.
+    """
+    x, y, z = (np.asarray(axis, dtype=dtype) for axis in (x, y, z))
+    margin = rounding_margin(x, y, z, dtype)
+    shape = np.array([len(x), len(y), len(z)])
+    size = leaf_size
+    while size < shape.max():
+        size *= 2
+
+    origins = np.zeros((1, 3), dtype=np.int64)
+    children = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)])
+    while True:
+        with span("narrow_band.bounds", len(origins)):
+            lo, hi = _block_bounds(sdf, x, y, z, origins, size, margin)
+        origins = origins[(lo < band) & (hi > -band)]
+        if size == leaf_size or len(origins) == 0:
+            break
+        size //= 2
+        origins = (origins[:, None, :] + size * children[None, :, :]).reshape(-1, 3)
+        origins = origins[np.all(origins < shape, axis=1)]
+
+    values = np.full((len(origins), leaf_size, leaf_size, leaf_size), np.nan, dtype=dtype)
+    workers = resolve_workers(workers)
+    batch_size = LEAVES_PER_BATCH
+    if workers > 1:
+        # enough batches to keep every worker busy
+        batch_size = min(batch_size, max(1, -(-len(origins) // (workers * BLOCKS_PER_WORKER))))
+    starts = range(0, len(origins), batch_size)
+    if workers == 1:
+        for start in starts:
+            _evaluate_leaves(sdf, x, y, z, shape, origins, values, start, start + batch_size)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # list() to surface the exceptions of the workers
+            list(pool.map(lambda start: _evaluate_leaves(sdf, x, y, z, shape, origins, values, start,
+                                                         start + batch_size), starts))
+    return origins, values
+
+
+def _evaluate_leaves(sdf, x, y, z, shape, origins, values, start, stop):
+    """Evaluate the leaves origins[start:stop] into values[start:stop]."""
+    leaf_size = values.shape[1]
+    offsets = np.arange(leaf_size)
+    batch = origins[start:stop]
+    index = [o[:, None] + offsets[None, :] for o in batch.T]  # (b, leaf) per axis
+    valid = [i < n for i, n in zip(index, shape)]
+    index = [np.minimum(i, n - 1) for i, n in zip(index, shape)]
+    points = np.empty((len(batch), leaf_size, leaf_size, leaf_size, 3), dtype=values.dtype)
+    with span("grid.points", len(batch) * leaf_size ** 3):
+        points[..., 0] = x[index[0]][:, :, None, None]
+        points[..., 1] = y[index[1]][:, None, :, None]
+        points[..., 2] = z[index[2]][:, None, None, :]
+    field = sdf.evaluate(points.reshape(-1, 3)).reshape(points.shape[:-1])
+    inside = valid[0][:, :, None, None] & valid[1][:, None, :, None] & valid[2][:, None, None, :]
+    values[start:start + len(batch)] = np.where(inside, field, np.nan)
+
+
+def narrow_band(sdf, x, y, z, band, leaf_size=LEAF_SIZE, dtype=np.float64, workers=1):
+    """
+    The grid points where |sdf| < band, without evaluating the field anywhere else.
+    Same points and values as thresholding evaluate_grid with the same dtype, e.g. np.nonzero(np.abs(volume) < band).
+    workers evaluates the leaves in a thread pool (see narrow_band_blocks).
+
+    Returns:
+    - indices (np.array): (M, 3) grid indices (i, j, k) of the points, in C order of the grid.
+    - values (np.array): (M,) field at those points.
+    """
+    with span("narrow_band.evaluate"):
+        origins, values = narrow_band_blocks(sdf, x, y, z, band, leaf_size, dtype, workers)
+    with span("narrow_band.threshold", values.size):
+        block, i, j, k = np.nonzero(np.abs(values) < band)  # NaN past the grid end is never in the band
+        indices = origins[block] + np.stack([i, j, k], axis=-1)
+        values = values[block, i, j, k]
+
+        order = np.lexsort(indices.T[::-1])
+    return indices[order], values[order]
@@ -0,0 +1,283 @@
+"""
+Incremental regeneration of the wormhole when a few parameters change, for interactive tuning.
+
+IncrementalWormhole keeps the parts of the wormhole.py mesh (the bend, bottom and upper extension vertex
+blocks, the hole masks of the bend and of the extensions, the cylinder and its placement) with the parameters
+each part was built from (PARTS). update() rebuilds only the parts whose parameters changed and rewrites only
+their blocks of the combined arrays. The result is identical to create_bent_space + create_wormhole +
+join_wormhole.
+
+IncrementalField keeps the field of every node of a wormhole_sdf tree over a fixed grid, keyed by the node
+parameters and the transforms above it. update() evaluates only the nodes that are new in the tree it is
+given, so rebuilding the scene with one parameter changed recomputes the primitives using that parameter and
+the combinations above them. The volume is identical to wormhole_grid.evaluate_grid.
+
+Example usage:
+>>> wormhole = IncrementalWormhole(hole_radius=1.0)
+>>> vertices, faces = wormhole.update(hole_radius=1.5)  # only the hole masks are rebuilt
+>>> field = IncrementalField(x, y, z)
+>>> volume = field.update(bent_space_scene(10, 5, 10, 1.0, 1.0, 10.4))
+>>> volume = field.update(bent_space_scene(10, 5, 10, 1.5, 1.0, 10.4))  # only the plates are re-evaluated
+"""
+
+import numpy as np
+
+import wormhole
+from wormhole_pipelines import BENT_SPACE_DEFAULTS
+from wormhole_profile import span
+from wormhole_sdf import BLOCK_SIZE, SDF
+
+
+########### mesh parts ###########
+
+def _bend_vertices(num_v, radius, precision, x):
+    num_bend, _ = wormhole._split_rows(num_v)
+    return wormhole._row_vertices(x, *wormhole._bend_rows(num_bend, radius), precision)
+
+
+def _bottom_vertices(num_v, radius, extension_length, precision, x):
+    _, num_extension = wormhole._split_rows(num_v)
+    extension_z = wormhole._extension_rows(num_extension, extension_length)
+    return wormhole._row_vertices(x, np.full(num_extension, -2.0 * radius), extension_z, precision)
+
+
+def _upper_vertices(num_v, extension_length, precision, x):
+    _, num_extension = wormhole._split_rows(num_v)
+    extension_z = wormhole._extension_rows(num_extension, extension_length)
+    return wormhole._row_vertices(x, np.zeros(num_extension), extension_z, precision)
+
+
+def _bend_faces(num_u, num_v, width, radius, extension_length, hole_radius):
+    num_bend, _ = wormhole._split_rows(num_v)
+    return wormhole._bend_faces(num_u, num_bend, width, radius, extension_length, hole_radius)
+
+
+def _extension_faces(num_u, num_v, width, extension_length, hole_radius):
+    _, num_extension = wormhole._split_rows(num_v)
+    return wormhole._extension_faces(num_u, num_extension, width, extension_length, hole_radius)
+
+
+def _placed_cylinder(radius, extension_length, cylinder):
+    cylinder_vertices, _ = cylinder
+    return wormhole._place_cylinder(cylinder_vertices, radius, extension_length)
+
+
+# name: (function, parameters, parts), in dependency order. A part is function(*parameters, *parts)
+PARTS = {
+    "columns": (wormhole._columns, ("num_u", "width"), ()),
+    "bend": (_bend_vertices, ("num_v", "radius", "precision"), ("columns",)),
+    "bottom": (_bottom_vertices, ("num_v", "radius", "extension_length", "precision"), ("columns",)),
+    "upper": (_upper_vertices, ("num_v", "extension_length", "precision"), ("columns",)),
+    "bend_faces": (_bend_faces, ("num_u", "num_v", "width", "radius", "extension_length", "hole_radius"), ()),
+    # one hole mask for both extensions, they only differ by their first vertex
+    "extension_faces": (_extension_faces, ("num_u", "num_v", "width", "extension_length", "hole_radius"), ()),
+    "cylinder": (wormhole.create_wormhole,
+                 ("cylinder_radius_top", "cylinder_radius_bottom", "cylinder_height", "cylinder_segments",
+                  "precision"), ()),
+    "placed_cylinder": (_placed_cylinder, ("radius", "extension_length"), ("cylinder",)),
+}
+
+
+def affected_parts(*names):
+    """The parts rebuilt when the named parameters change (directly or through the parts they feed)."""
+    affected = []
+    for part, (function, parameters, parts) in PARTS.items():
+        if set(names) & set(parameters) or set(affected) & set(parts):
+            affected.append(part)
+    return affected
+
+
+def _write_blocks(out, blocks, layout, dirty):
+    """
+    Write the dirty blocks (name, array, index offset) one after the other into out. out is reallocated, and
+    every block written, when the sizes or dtype of the blocks differ from the previous layout. A block whose
+    offset changed is written again even if its part was not rebuilt (e.g. the cylinder faces when num_v moves
+    the vertices before them).
+    """
+    new_layout = (tuple(len(array) for _, array, _ in blocks), np.result_type(*(array for _, array, _ in blocks)),
+                  tuple(offset for _, _, offset in blocks))
+    if out is None or new_layout[:2] != layout[:2]:
+        out = np.empty((sum(new_layout[0]),) + blocks[0][1].shape[1:], dtype=new_layout[1])
+        dirty = {name for name, _, _ in blocks}
+    else:
+        dirty = set(dirty) | {name for (name, _, offset), old in zip(blocks, layout[2]) if offset != old}
+    start = 0
+    for name, array, offset in blocks:
+        stop = start + len(array)
+        if name in dirty:
+            out[start:stop] = array
+            if offset:
+                out[start:stop] += offset
+        start = stop
+    return out, new_layout
+
+
+class IncrementalWormhole:
+    """
+    The wormhole.py mesh (bent space and cylinder joined), rebuilt part by part as its parameters change.
+    The parameters and their defaults are those of wormhole_pipelines.bent_space (cylinder_height None is
+    2 * radius + 0.4), for the uniform mesh only (tolerance must stay None: the adaptive mesh is rebuilt
+    whole, it is cheap) joined without stitching (stitch must stay False). After update, dirty lists the parts
+    that were rebuilt.
+
+    The vertices and faces arrays are updated in place while their sizes do not change (e.g. moving the
+    cylinder or bending the plane), so viewers holding them see the edit; copy them to keep a version.
+    """
+
+    def __init__(self, **params):
+        self.params = dict(BENT_SPACE_DEFAULTS)
+        self._parts = {}
+        self._keys = {}
+        self._layouts = {}
+        self.vertices = self.faces = None
+        self.dirty = []
+        self.update(**params)
+
+    def update(self, **changes):
+        """Change the given parameters and rebuild what depends on them. Returns vertices, faces."""
+        unknown = set(changes) - set(self.params)
+        if unknown:
+            raise ValueError(f"unknown parameters: {', '.join(sorted(unknown))}")
+        if changes.get("tolerance") is not None:
+            raise ValueError("IncrementalWormhole builds the uniform mesh, use create_bent_space_adaptive directly")
+        if changes.get("stitch"):
+            raise ValueError("IncrementalWormhole joins the meshes without stitching, use stitch_wormhole on the result")
+        self.params.update(changes)
+        params = dict(self.params)
+        if params["cylinder_height"] is None:
+            params["cylinder_height"] = 2 * params["radius"] + 0.4
+
+        dirty = []
+        for name, (function, parameters, parts) in PARTS.items():
+            key = tuple(params[parameter] for parameter in parameters)
+            if name in self._parts and self._keys[name] == key and not set(dirty) & set(parts):
+                continue
+            with span(f"incremental.{name}"):
+                self._parts[name] = function(*key, *(self._parts[part] for part in parts))
+            self._keys[name] = key
+            dirty.append(name)
+
+        self.dirty = dirty
+        if dirty:
+            with span("incremental.assemble"):
+                self._assemble(params["num_u"], params["num_v"], set(dirty))
+        return self.vertices, self.faces
+
+    def _assemble(self, num_u, num_v, dirty):
+        parts = self._parts
+        num_bend, _ = wormhole._split_rows(num_v)
+        num_bent = len(parts["bend"]) + len(parts["bottom"]) + len(parts["upper"])
+        cylinder_faces = parts["cylinder"][1]
+
+        self.vertices, self._layouts["vertices"] = _write_blocks(self.vertices, [
+            ("bend", parts["bend"], 0),
+            ("bottom", parts["bottom"], 0),
+            ("upper", parts["upper"], 0),
+            ("placed_cylinder", parts["placed_cylinder"], 0),
+        ], self._layouts.get("vertices"), dirty)
+        self.faces, self._layouts["faces"] = _write_blocks(self.faces, [
+            ("bend_faces", parts["bend_faces"], 0),
+            ("extension_faces", parts["extension_faces"], num_bend * num_u),  # bottom extension
+            ("extension_faces", parts["extension_faces"], num_v * num_u),  # upper extension
+            ("cylinder", cylinder_faces, num_bent),
+        ], self._layouts.get("faces"), dirty)
+
+
+########### fields ###########
+
+def _value_key(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype.str, value.shape, value.tobytes()
+    if isinstance(value, (tuple, list)):
+        return tuple(_value_key(item) for item in value)
+    if isinstance(value, SDF):
+        return None  # children are keyed on their own
+    return value
+
+
+def _parameters_key(node):
+    """The type and parameters of a node, without its children."""
+    return (type(node).__name__,) + tuple((name, _value_key(value)) for name, value in sorted(vars(node).items()))
+
+
+class IncrementalField:
+    """
+    Fields of the nodes of wormhole_sdf trees over the fixed grid spanned by the x, y, z axes.
+
+    A node is identified by its type, its parameters and its children (recursively), and where it is placed by
+    the transforms above it, so a rebuilt tree finds the fields of all its unchanged subtrees. The cache holds
+    the grid points of every placement and one field per node, each the size of the volume: it trades memory
+    for edits that only cost the changed primitives. After update, reused and computed count the nodes.
+    """
+
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = (np.asarray(axis, dtype=np.float64) for axis in (x, y, z))
+        self.shape = (len(self.x), len(self.y), len(self.z))
+        self._points = {}
+        self._fields = {}
+        self.reused = self.computed = 0
+
+    def _grid_points(self):
+        points = np.empty(self.shape + (3,))
+        points[..., 0] = self.x[:, None, None]
+        points[..., 1] = self.y[None, :, None]
+        points[..., 2] = self.z[None, None, :]
+        return points.reshape(-1, 3)
+
+    def update(self, sdf, dtype=np.float64):
+        """
+        The volume of sdf over the grid, computing only the nodes not seen in the previous update.
+        Equal to wormhole_grid.evaluate_grid(sdf, x, y, z); the cache is float64, so a float32 dtype is that
+        volume rounded (evaluate_grid in float32 also rounds the coordinates and differs by a few ulps).
+        """
+        self.reused = self.computed = 0
+        points, fields = {}, {}
+        if () not in self._points:
+            self._points[()] = self._grid_points()
+        points[()] = self._points[()]
+        with span("incremental.field"):
+            field = self._field(sdf, (), {}, points, fields)
+        # keep what this tree uses, the next one is most likely a small edit of it
+        self._points, self._fields = points, fields
+        return field.reshape(self.shape).astype(dtype)  # a copy, the cached fields stay untouched
+
+    def _field(self, node, placement, keys, points, fields):
+        key = (placement, self._node_key(node, keys))
+        if key in fields:
+            return fields[key]
+        field = self._fields.get(key)
+        if field is not None:
+            self.reused += 1
+        elif type(node)._transform is not SDF._transform:
+            # only the placement of a transform is computed here, its field is the field of its child
+            child_placement = placement + (_parameters_key(node),)
+            if child_placement not in points:
+                moved = self._points.get(child_placement)
+                points[child_placement] = node._transform(points[placement]) if moved is None else moved
+            field = self._field(node.children()[0], child_placement, keys, points, fields)
+        elif node.children():
+            fields_of_children = [self._field(child, placement, keys, points, fields) for child in node.children()]
+            with span(f"incremental.{type(node).__name__}"):
+                field = node._combine(fields_of_children)
+            self.computed += 1
+        else:
+            field = self._leaf_field(node, points[placement])
+            self.computed += 1
+        fields[key] = field
+        return field
+
+    def _leaf_field(self, node, p):
+        # block by block as in SDF.evaluate, so the temporaries of the primitive stay small
+        field = np.empty(len(p))
+        with span(f"incremental.{type(node).__name__}", len(p)):
+            for start in range(0, len(p), BLOCK_SIZE):
+                field[start:start + BLOCK_SIZE] = node._field(p[start:start + BLOCK_SIZE], None, ())
+        return field
+
+    def _node_key(self, node, keys):
+        # nodes shared in the tree are keyed once (keys is by id, for the current update only)
+        key = keys.get(id(node))
+        if key is None:
+            key = keys[id(node)] = (_parameters_key(node),
+                                    tuple(self._node_key(child, keys) for child in node.children()))
+        return key
@@ -0,0 +1,319 @@
+"""
+Export and import of meshes and SDF volumes, so results can leave polyscope/pyvista and be reused downstream.
+
+Meshes go to binary PLY (float32 vertices, int32 triangles) or OBJ. Both are written with bulk buffer writes:
+PLY vertex and face records are laid out as NumPy structured arrays and written in one tofile, OBJ lines
+are produced chunk by chunk with one format call per chunk. A binary PLY written here is read back without
+copying, its vertex and face blocks are memory-mapped.
+
+Volumes go to a raw format: a fixed 256 byte header (magic, then JSON with dtype, shape, origin and spacing)
+followed by the C ordered values, so load_volume opens them instantly as a np.memmap of any size.
+
+Images (renders) go to 8 bit PNG, written with zlib alone, without an imaging library.
+
+Example usage:
+>>> save_mesh("wormhole.ply", all_vertices, all_faces)
+>>> vertices, faces = load_mesh("wormhole.ply")
+>>> save_volume("combined_sdf.vol", combined_sdf, origin=(x[0], y[0], z[0]), spacing=(x[1] - x[0], y[1] - y[0], z[1] - z[0]))
+>>> combined_sdf, header = load_volume("combined_sdf.vol")
+"""
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+
+VOLUME_MAGIC = b"WHVOL1\n"
+VOLUME_HEADER_SIZE = 256
+
+# Rows of an OBJ formatted by one call
+OBJ_CHUNK = 1 << 16
+
+PLY_VERTEX = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4")])
+PLY_FACE = np.dtype([("count", "u1"), ("vertices", "<i4", (3,))], align=False)
+
+# NumPy types of the PLY property types
+PLY_TYPES = {"char": "i1", "uchar": "u1", "short": "i2", "ushort": "u2", "int": "i4", "uint": "u4", "float": "f4",
+             "double": "f8", "int8": "i1", "uint8": "u1", "int16": "i2", "uint16": "u2", "int32": "i4",
+             "uint32": "u4", "float32": "f4", "float64": "f8"}
+
+
+########### PLY ###########
+
+def save_ply(path, vertices, faces):
+    """Binary little endian PLY with float32 vertices and int32 triangles (ValueError past 2**31 - 1 vertices)."""
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    if len(faces) and faces.max() > np.iinfo(np.int32).max:
+        # the indices would wrap in the int32 list and the file would be silently corrupt
+        raise ValueError(f"vertex index {faces.max()} does not fit the int32 indices of PLY, save as .obj")
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        "comment written by wormhole_io\n"
+        f"element vertex {len(vertices)}\n"
+        "property float x\nproperty float y\nproperty float z\n"
+        f"element face {len(faces)}\n"
+        "property list uchar int vertex_indices\n"
+        "end_header\n"
+    )
+    vertex_records = np.empty(len(vertices), dtype=PLY_VERTEX)
+    vertex_records["x"], vertex_records["y"], vertex_records["z"] = vertices.T
+    face_records = np.empty(len(faces), dtype=PLY_FACE)
+    face_records["count"] = 3
+    face_records["vertices"] = faces
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        vertex_records.tofile(f)
+        face_records.tofile(f)
+
+
+def _read_ply_header(f):
+    """Parse a PLY header. Returns (format, [(element, count, [(property, type, list types)])], data offset)."""
+    if f.readline().strip() != b"ply":
+        raise ValueError("not a PLY file")
+    ply_format, elements = None, []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("PLY header without end_header")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            return ply_format, elements, f.tell()
+        if words[0] == "format":
+            ply_format = words[1]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            elements[-1][2].append((words[-1], words[1], words[2:-1]))
+
+
+def load_ply(path, mmap=True):
+    """
+    Vertices and triangles of a PLY. Binary little endian files laid out as save_ply writes them (float x y z
+    vertices, then uchar/int triangle lists) are memory-mapped when mmap; other binary PLYs (big endian, other
+    property types, extra properties or elements) and ASCII PLYs are read with a copy, as float32 vertices
+    and int32 triangles.
+    """
+    with open(path, "rb") as f:
+        ply_format, elements, offset = _read_ply_header(f)
+    counts = {name: count for name, count, properties in elements}
+    properties = {name: properties for name, count, properties in elements}
+    compact = (
+        ply_format == "binary_little_endian"
+        and [name for name, count, props in elements] == ["vertex", "face"]
+        and [(p[0], p[1]) for p in properties["vertex"]] == [("x", "float"), ("y", "float"), ("z", "float")]
+        and [p[1:] for p in properties["face"]] == [("list", ["uchar", "int"])]
+    )
+    if ply_format == "ascii":
+        return _load_ascii_ply(path, offset, elements)
+    if ply_format not in ("binary_little_endian", "binary_big_endian"):
+        raise ValueError(f"unknown PLY format {ply_format!r} in {path}")
+    if not compact:
+        return _load_binary_ply(path, offset, elements, "<" if ply_format == "binary_little_endian" else ">")
+
+    n_vertices, n_faces = counts["vertex"], counts["face"]
+    if mmap:
+        vertex_records = np.memmap(path, dtype=PLY_VERTEX, mode="r", offset=offset, shape=(n_vertices,))
+        face_records = np.memmap(path, dtype=PLY_FACE, mode="r", offset=offset + n_vertices * PLY_VERTEX.itemsize,
+                                 shape=(n_faces,))
+    else:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            vertex_records = np.fromfile(f, dtype=PLY_VERTEX, count=n_vertices)
+            face_records = np.fromfile(f, dtype=PLY_FACE, count=n_faces)
+    if n_faces and np.any(face_records["count"] != 3):
+        raise ValueError(f"{path} has faces that are not triangles")
+    # x, y, z are adjacent float32 fields: view them as an (n, 3) array without copying
+    vertices = np.ndarray((n_vertices, 3), dtype="<f4", buffer=vertex_records, strides=(PLY_VERTEX.itemsize, 4))
+    return vertices, face_records["vertices"]
+
+
+def _element_dtype(path, name, properties, endian):
+    """Structured dtype of the records of an element; the lists of faces are read as triangles."""
+    fields = []
+    for prop, kind, list_types in properties:
+        if kind == "list":
+            if name != "face":
+                raise ValueError(f"unsupported list property {prop!r} of {name} in {path}")
+            count_type, item_type = list_types
+            fields += [("count", endian + PLY_TYPES[count_type]), ("vertices", endian + PLY_TYPES[item_type], (3,))]
+        else:
+            fields.append((prop, endian + PLY_TYPES[kind]))
+    return np.dtype(fields)
+
+
+def _load_binary_ply(path, offset, elements, endian):
+    vertices = faces = None
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for name, count, properties in elements:
+            records = np.fromfile(f, dtype=_element_dtype(path, name, properties, endian), count=count)
+            if len(records) != count:
+                raise ValueError(f"{path} is truncated in its {name} element")
+            if name == "vertex":
+                vertices = np.stack([records[axis] for axis in "xyz"], axis=-1).astype(np.float32)
+            elif name == "face":
+                # a face of another size would shift every record after it, so the first one is caught
+                if count and np.any(records["count"] != 3):
+                    raise ValueError(f"{path} has faces that are not triangles")
+                faces = records["vertices"].astype(np.int32)
+    return vertices, faces
+
+
+def _load_ascii_ply(path, offset, elements):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        lines = f.read().decode("ascii").split("\n")
+    vertices = faces = None
+    start = 0
+    for name, count, properties in elements:
+        rows = lines[start:start + count]
+        start += count
+        if name == "vertex":
+            columns = [p[0] for p in properties]
+            table = np.array(" ".join(rows).split(), dtype=np.float64).reshape(count, len(columns))
+            vertices = table[:, [columns.index(axis) for axis in "xyz"]].astype(np.float32)
+        elif name == "face":
+            table = np.array(" ".join(rows).split(), dtype=np.int64).reshape(count, -1)
+            if count and np.any(table[:, 0] != 3):
+                raise ValueError(f"{path} has faces that are not triangles")
+            faces = table[:, 1:4].astype(np.int32)
+    return vertices, faces
+
+
+########### OBJ ###########
+
+def _write_rows(f, prefix, array, fmt):
+    """Write 'prefix a b c' lines, OBJ_CHUNK rows per format call."""
+    line = prefix + " " + " ".join([fmt] * array.shape[1]) + "\n"
+    for start in range(0, len(array), OBJ_CHUNK):
+        chunk = array[start:start + OBJ_CHUNK]
+        f.write((line * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def save_obj(path, vertices, faces):
+    """Wavefront OBJ with v and f lines (1-based indices)."""
+    with open(path, "w") as f:
+        f.write("# written by wormhole_io\n")
+        _write_rows(f, "v", np.asarray(vertices, dtype=np.float64), "%.9g")
+        _write_rows(f, "f", np.asarray(faces, dtype=np.int64) + 1, "%d")
+
+
+def load_obj(path):
+    """Vertices (float32) and triangles (int32) of an OBJ; texture/normal indices (v/vt/vn) are ignored."""
+    with open(path) as f:
+        lines = f.read().split("\n")
+    vertex_lines = [line[2:] for line in lines if line.startswith("v ")]
+    face_lines = [line[2:] for line in lines if line.startswith("f ")]
+    vertices = np.array(" ".join(vertex_lines).split(), dtype=np.float64).reshape(len(vertex_lines), -1)[:, :3]
+    corners = [corner.split("/")[0] for corner in " ".join(face_lines).split()]
+    faces = np.array(corners, dtype=np.int64).reshape(len(face_lines), -1)
+    if faces.size and faces.shape[1] != 3:
+        raise ValueError(f"{path} has faces that are not triangles")
+    # negative indices count back from the end of the vertex list
+    faces = np.where(faces < 0, faces + len(vertices), faces - 1)
+    return vertices.astype(np.float32), faces.reshape(-1, 3).astype(np.int32)
+
+
+########### meshes: dispatch on the extension ###########
+
+def save_mesh(path, vertices, faces):
+    """Save a triangle mesh as .ply (binary) or .obj, from the extension of path."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".ply":
+        save_ply(path, vertices, faces)
+    elif extension == ".obj":
+        save_obj(path, vertices, faces)
+    else:
+        raise ValueError(f"unknown mesh format {extension!r}, expected .ply or .obj")
+
+
+def load_mesh(path, mmap=True):
+    """Load a triangle mesh saved by save_mesh. Returns vertices, faces."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".ply":
+        return load_ply(path, mmap=mmap)
+    if extension == ".obj":
+        return load_obj(path)
+    raise ValueError(f"unknown mesh format {extension!r}, expected .ply or .obj")
+
+
+########### volumes ###########
+
+def _volume_header(dtype, shape, origin, spacing):
+    meta = json.dumps({
+        "dtype": np.dtype(dtype).str,
+        "shape": [int(n) for n in shape],
+        "origin": [float(o) for o in origin],
+        "spacing": [float(s) for s in spacing],
+    }).encode("ascii")
+    header = VOLUME_MAGIC + meta + b"\n"
+    if len(header) > VOLUME_HEADER_SIZE:
+        raise ValueError("volume header too long")
+    return header.ljust(VOLUME_HEADER_SIZE, b" ")
+
+
+def save_volume(path, volume, origin=(0.0, 0.0, 0.0), spacing=(1.0, 1.0, 1.0)):
+    """Write a 3D field (e.g. combined_sdf reshaped to the grid) with its grid origin and spacing."""
+    volume = np.asarray(volume)
+    with open(path, "wb") as f:
+        f.write(_volume_header(volume.dtype, volume.shape, origin, spacing))
+        np.ascontiguousarray(volume).tofile(f)
+
+
+def create_volume(path, shape, dtype=np.float32, origin=(0.0, 0.0, 0.0), spacing=(1.0, 1.0, 1.0)):
+    """
+    Create a volume file of the given shape and return it as a writable np.memmap, e.g. to pass as the out
+    of wormhole_grid.evaluate_grid and stream a field larger than RAM straight to disk.
+    """
+    with open(path, "wb") as f:
+        f.write(_volume_header(dtype, shape, origin, spacing))
+        f.truncate(VOLUME_HEADER_SIZE + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return np.memmap(path, dtype=dtype, mode="r+", offset=VOLUME_HEADER_SIZE, shape=tuple(shape))
+
+
+def read_volume_header(path):
+    """The header of a volume file as a dict: dtype, shape, origin, spacing."""
+    with open(path, "rb") as f:
+        header = f.read(VOLUME_HEADER_SIZE)
+    if not header.startswith(VOLUME_MAGIC):
+        raise ValueError(f"{path} is not a wormhole volume")
+    meta = json.loads(header[len(VOLUME_MAGIC):].decode("ascii"))
+    meta["shape"] = tuple(meta["shape"])
+    return meta
+
+
+def load_volume(path, mode="r"):
+    """Memory-map a volume file (zero-copy, mode 'r' or 'r+'). Returns the volume and its header dict."""
+    meta = read_volume_header(path)
+    volume = np.memmap(path, dtype=np.dtype(meta["dtype"]), mode=mode, offset=VOLUME_HEADER_SIZE, shape=meta["shape"])
+    return volume, meta
+
+
+########### images ###########
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def save_png(path, image):
+    """Write an (H, W) gray or (H, W, 3) RGB uint8 image (e.g. wormhole_render.render) as a PNG."""
+    image = np.asarray(image)
+    if image.dtype != np.uint8 or image.ndim not in (2, 3) or (image.ndim == 3 and image.shape[2] != 3):
+        raise ValueError(f"expected an (H, W) or (H, W, 3) uint8 image, got {image.dtype} {image.shape}")
+    height, width = image.shape[:2]
+    color_type = 2 if image.ndim == 3 else 0
+    # every scanline starts with its filter type, 0 (none)
+    rows = np.zeros((height, 1 + image[0].size), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, -1)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+        f.write(_png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        f.write(_png_chunk(b"IEND", b""))
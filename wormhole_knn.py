@@ -0,0 +1,149 @@
+"""
+Meshing of near-surface point clouds from their k nearest neighbors, as in wormhole_df_kNN.py.
+
+Every point i is connected to each earlier neighbor j and to the earlier neighbors k of j, giving the
+triangle (i, j, k). The candidates of all points are generated at once from the kneighbors indices,
+canonicalised by sorting and deduplicated with np.unique on packed int64 keys.
+
+Example usage:
+>>> distances, indices = NearestNeighbors(n_neighbors=5).fit(points).kneighbors(points)
+>>> faces = knn_triangles(indices)
+
+The smoothing averages every vertex with its neighbors through a sparse (CSR) operator built once, so each
+iteration is a single sparse matrix product. Taubin's lambda/mu steps keep the mesh from shrinking.
+>>> vertices = laplacian_smooth(vertices, smoothing_operator(len(vertices), indices=indices), iterations=5)
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+from wormhole_profile import span
+
+
+# Largest number of points for which a sorted triangle (a, b, c) packs into one int64 key (a*n + b)*n + c
+MAX_PACKED_POINTS = 2_097_151
+
+
+def knn_triangles(indices):
+    """
+    Triangles of the kNN mesh from the (n, k) array returned by NearestNeighbors.kneighbors.
+
+    Point i makes the triangle (i, j, k) for every neighbor j < i of i and every neighbor k < i of j with
+    k != j. Triangles are returned once, sorted (smallest index first), in the order they are first met when
+    walking the points, their neighbors and their neighbors' neighbors one by one.
+
+    Returns:
+    - faces (np.array): (M, 3) int32 array of vertex indices (int64 for very large clouds).
+    """
+    with span("knn.faces", len(indices)):
+        return _knn_triangles(np.asarray(indices))
+
+
+def _knn_triangles(indices):
+    n = len(indices)
+    index_dtype = np.int32 if n <= np.iinfo(np.int32).max else np.int64
+
+    i = np.arange(n)[:, None, None]
+    j = indices[:, :, None]  # neighbors of i
+    k = indices[indices]  # neighbors of the neighbors, (n, k, k)
+    # j and k must already have been visited (smaller than i) and be distinct
+    valid = (j < i) & (k < i) & (k != j)
+
+    j = np.broadcast_to(j, valid.shape)[valid]
+    k = k[valid]
+    i = np.broadcast_to(i, valid.shape)[valid]
+    # i is the largest of the three, only j and k need ordering
+    faces = np.stack([np.minimum(j, k), np.maximum(j, k), i], axis=-1)
+
+    if n <= MAX_PACKED_POINTS:
+        keys = (faces[:, 0].astype(np.int64) * n + faces[:, 1]) * n + faces[:, 2]
+        _, first = np.unique(keys, return_index=True)
+    else:
+        _, first = np.unique(faces, axis=0, return_index=True)
+    return faces[np.sort(first)].astype(index_dtype)
+
+
+def knn_mesh(points, k=5):
+    """
+    Mesh a point cloud with knn_triangles. Returns the vertices (the points), the faces and the (n, k)
+    neighbor indices, which the smoothing reuses.
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    with span("knn.fit", len(points)):
+        nbrs = NearestNeighbors(n_neighbors=k).fit(points)
+    with span("knn.kneighbors", len(points)):
+        distances, indices = nbrs.kneighbors(points)
+    return np.asarray(points), knn_triangles(indices), indices
+
+
+def smoothing_operator(num_vertices, indices=None, vertices=None, faces=None, weights="uniform", dtype=np.float64):
+    """
+    Sparse averaging operator W (rows sum to 1): (W @ vertices)[i] is the weighted mean of the neighbors of i.
+
+    Parameters:
+    - num_vertices (int): The number of vertices.
+    - indices (np.array): (n, k) kNN indices; with uniform weights every vertex averages its k neighbors
+      (itself included when kneighbors returns it), exactly as the kNN script did.
+    - vertices, faces (np.array): The mesh, for neighbors along the edges of the faces instead of the kNN.
+    - weights (str): "uniform", or "cotangent" (needs vertices and faces; negative weights are clipped to 0).
+    - dtype: The dtype of the weights, float32 keeps float32 vertices in float32 when smoothing.
+
+    Returns:
+    - W (scipy.sparse.csr_matrix): The (n, n) operator.
+    """
+    if weights == "uniform" and indices is not None:
+        indices = np.asarray(indices)
+        rows = np.repeat(np.arange(num_vertices), indices.shape[1])
+        data = np.full(rows.size, 1.0 / indices.shape[1], dtype=dtype)
+        return sp.csr_matrix((data, (rows, indices.ravel())), shape=(num_vertices, num_vertices))
+
+    if faces is None:
+        raise ValueError("faces are needed unless uniform weights are built from kNN indices")
+    faces = np.asarray(faces)
+    # the three (edge, opposite corner) pairs of every triangle
+    a, b, c = faces[:, 0], faces[:, 1], faces[:, 2]
+    rows = np.concatenate([a, b, c])
+    cols = np.concatenate([b, c, a])
+    if weights == "uniform":
+        data = np.ones(rows.size)
+    elif weights == "cotangent":
+        if vertices is None:
+            raise ValueError("cotangent weights need the vertices")
+        v = np.asarray(vertices, dtype=np.float64)
+        opposite = np.concatenate([c, a, b])
+        u = v[rows] - v[opposite]
+        w = v[cols] - v[opposite]
+        cross = np.linalg.norm(np.cross(u, w), axis=1)
+        cot = np.einsum("ij,ij->i", u, w) / np.maximum(cross, np.finfo(np.float64).tiny)
+        data = np.maximum(cot / 2, 0)  # obtuse angles would give negative weights
+    else:
+        raise ValueError(f"unknown weights {weights!r}, expected 'uniform' or 'cotangent'")
+
+    # symmetric: every edge contributes to both of its vertices (duplicates are summed)
+    C = sp.csr_matrix((np.concatenate([data, data]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                      shape=(num_vertices, num_vertices))
+    if weights == "uniform":
+        C.data[:] = 1  # an edge shared by two faces is still a single neighbor
+    row_sums = np.asarray(C.sum(axis=1)).ravel()
+    # isolated vertices (no positive weight) stay where they are
+    C = C + sp.diags((row_sums == 0).astype(np.float64))
+    row_sums[row_sums == 0] = 1
+    return sp.csr_matrix(sp.diags(1 / row_sums) @ C, dtype=dtype)
+
+
+def laplacian_smooth(vertices, operator, iterations=5, lam=1.0, mu=None):
+    """
+    Smooth the vertices with v <- v + lam * (W v - v) per iteration (lam=1 replaces every vertex by the mean).
+    With mu (negative, |mu| slightly above lam, e.g. lam=0.5, mu=-0.53) every iteration is followed by an
+    inflating v <- v + mu * (W v - v) step: Taubin smoothing, which avoids the shrinkage of plain averaging.
+    """
+    operator = sp.csr_matrix(operator)
+    vertices = np.asarray(vertices)
+    steps = [lam] if mu is None else [lam, mu]
+    with span("smooth.iterations", len(vertices) * iterations * len(steps)):
+        for _ in range(iterations):
+            for step in steps:
+                averaged = operator @ vertices
+                vertices = averaged if step == 1 else vertices + step * (averaged - vertices)
+    return vertices
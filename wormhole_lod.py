@@ -0,0 +1,459 @@
+"""
+Level of detail pyramids of the wormhole meshes (create_bent_space, join_wormhole, marching cubes, kNN...):
+the mesh decimated by quadric error edge collapse (Garland and Heckbert 1997) to half its faces per level,
+every level stored with an estimate of its distance to the full mesh, so a viewer or an exporter picks the
+cheapest level whose estimate is small enough (select_level).
+
+Collapses are done in rounds over arrays instead of one at a time from a heap. Every round costs all the edges
+(the quadric error of the best of their endpoints, midpoint and optimal point), drops the collapses that would
+make the mesh non-manifold (link condition) or flip a triangle, ranks the rest, and collapses at once every edge
+among the cheapest (ROUND_WINDOW) whose rank is the lowest of all the edges around both its endpoints: those
+edges are independent (no two touch the same triangle), so they all apply together, and the cheapest edges of
+the mesh always go first as with a priority queue. Flat regions are decimated exactly before anything curved.
+
+Boundaries (the holes, the sides of the plane, the ends of the cylinder where it meets the holes) and sharp
+edges (above feature_angle, e.g. the seam of a stitched cylinder) are kept: their vertices only merge along
+them, other vertices collapse onto them and never move them off, and the planes through them perpendicular to
+their triangles are added to their quadrics so straight runs simplify and curved ones stay.
+
+The error estimate of a level is the Hausdorff distance sampled at the vertices: the largest distance from the
+vertices of either mesh to the other mesh. It is not a bound but a lower bound of the true Hausdorff distance
+(the interiors of the faces of either mesh are not sampled), close to it on the wormhole meshes (densely
+sampled, the flat levels stay exact and the curved ones differ by less than 1e-3). The distances are exact (BVH queries)
+but only computed for the vertices whose cheap upper bound (distance to the triangles around the vertex they
+were merged into) could still exceed the largest distance found so far.
+
+Example usage:
+>>> levels = build_lod(all_vertices, all_faces)
+>>> level = select_level(levels, max_estimate=0.01)
+>>> save_lod("out/wormhole/lod", levels)
+"""
+
+import json
+import os
+
+import numpy as np
+
+from wormhole import _index_dtype
+from wormhole_bvh import QUERY_BATCH, TriangleBVH, closest_point_on_triangles
+from wormhole_io import load_mesh, save_mesh
+from wormhole_profile import span
+
+
+# Weight of the planes through the boundary and feature edges, relative to the planes of the triangles
+BOUNDARY_WEIGHT = 100.0
+
+# Dihedral angle (degrees) above which an edge is a feature kept like a boundary
+FEATURE_ANGLE = 60.0
+
+# A collapse is skipped when it turns a triangle by more than acos of this
+MIN_NORMAL_COS = 0.5
+
+# The optimal point of a quadric is only used when its smallest eigenvalue is at least this fraction of the largest
+MIN_EIGENVALUE_RATIO = 1e-3
+
+# Selection passes of a collapse round (see _independent)
+INDEPENDENT_PASSES = 3
+
+# Cheapest collapses competing in a round, relative to the collapses still needed for the level
+ROUND_WINDOW = 2
+
+# A level ends at the first round collapsing fewer edges than this fraction of its faces: what is left to
+# collapse is blocked around the few costly edges (long boundary runs), each round costs a pass over the mesh
+MIN_ROUND_FRACTION = 0.002
+
+# Samples the error of a level is measured at, recorded in lod.json
+ERROR_SAMPLES = "vertices"
+
+# Point-triangle pairs of the error upper bounds computed at once
+PAIR_CHUNK = 1 << 18
+
+
+########### quadrics ###########
+
+def _accumulate(index, values, n):
+    """Sum the rows of values (K, ...) into n rows by index."""
+    flat = values.reshape(len(values), -1)
+    out = np.stack([np.bincount(index, weights=flat[:, k], minlength=n) for k in range(flat.shape[1])], axis=-1)
+    return out.reshape((n,) + values.shape[1:])
+
+
+def _plane_quadrics(normals, points):
+    """Quadrics (K, 4, 4) of the planes through points with unit normals: squared distance to the plane."""
+    planes = np.concatenate([normals, -np.einsum("ij,ij->i", normals, points)[:, None]], axis=1)
+    return planes[:, :, None] * planes[:, None, :]
+
+
+def _unit(v):
+    length = np.linalg.norm(v, axis=1, keepdims=True)
+    return np.divide(v, length, out=np.zeros_like(v), where=length > 0)
+
+
+########### mesh structure ###########
+
+def _edges(faces):
+    """
+    Unique edges (E, 2) with the smaller vertex first, the number of triangles on each, and for every side of
+    every face (3F, ordered edges ab, bc, ca of each face) the index of its edge.
+    """
+    first = np.concatenate([faces[:, 0], faces[:, 1], faces[:, 2]])
+    second = np.concatenate([faces[:, 1], faces[:, 2], faces[:, 0]])
+    # one int64 key per side, much faster to unique than rows
+    n = int(faces.max(initial=0)) + 1
+    keys, side_edge, counts = np.unique(np.minimum(first, second) * n + np.maximum(first, second),
+                                        return_inverse=True, return_counts=True)
+    return np.stack([keys // n, keys % n], axis=-1), counts, side_edge
+
+
+def _features(vertices, faces, feature_angle):
+    """
+    The boundary, sharp and non-manifold edges. Returns the feature vertices (on such edges) and the quadrics
+    of the planes perpendicular to the triangles along those edges.
+    """
+    edges, counts, side_edge = _edges(faces)
+    a, b, c = (vertices[faces[:, k]] for k in range(3))
+    normals = _unit(np.cross(b - a, c - a))
+
+    feature = counts != 2
+    if feature_angle is not None and len(edges):
+        # the two triangles of a manifold edge: first and last side in edge order
+        order = np.argsort(side_edge, kind="stable")
+        first = np.searchsorted(side_edge[order], np.arange(len(edges)))
+        manifold = counts == 2
+        f0 = order[first[manifold]] % len(faces)
+        f1 = order[first[manifold] + 1] % len(faces)
+        cosine = np.einsum("ij,ij->i", normals[f0], normals[f1])
+        feature[manifold] |= cosine < np.cos(np.radians(feature_angle))
+
+    # every side (face, edge) on a feature edge constrains its endpoints to its plane across the face
+    sides = np.flatnonzero(feature[side_edge])
+    face = sides % len(faces)
+    start = faces[face, sides // len(faces)]
+    end = faces[face, (sides // len(faces) + 1) % 3]
+    across = _unit(np.cross(vertices[end] - vertices[start], normals[face]))
+    quadrics = BOUNDARY_WEIGHT * _plane_quadrics(across, vertices[start])
+    constraint = (_accumulate(start, quadrics, len(vertices)) + _accumulate(end, quadrics, len(vertices)))
+
+    feature_vertex = np.zeros(len(vertices), dtype=bool)
+    feature_vertex[edges[feature].ravel()] = True
+    return feature_vertex, constraint
+
+
+def _vertex_corners(faces, n):
+    """For every vertex, its corners in the faces (face * 3 + position in the face): (starts, corners) in CSR layout."""
+    order = np.argsort(faces.ravel(), kind="stable")
+    starts = np.concatenate([[0], np.cumsum(np.bincount(faces.ravel(), minlength=n))])
+    return starts, order
+
+
+########### collapses ###########
+
+def _collapse_costs(quadrics, positions, edges, feature_vertex):
+    """Best position of every edge collapse among its endpoints, midpoint and optimal point, and its cost."""
+    u, v = edges[:, 0], edges[:, 1]
+    q = quadrics[u] + quadrics[v]
+    candidates = [positions[u], positions[v], (positions[u] + positions[v]) / 2]
+
+    # the minimum of the quadric, where it is a point (planes in all directions, not a flat or a ridge, where
+    # it slides away along the surface) and close to the edge
+    optimal = candidates[2].copy()
+    a = q[:, :3, :3]
+    eigenvalues = np.linalg.eigvalsh(a)
+    solvable = eigenvalues[:, 0] > MIN_EIGENVALUE_RATIO * eigenvalues[:, 2]
+    if np.any(solvable):
+        optimal[solvable] = np.linalg.solve(a[solvable], -q[solvable, :3, 3:])[:, :, 0]
+    length = np.linalg.norm(positions[u] - positions[v], axis=1)
+    solvable &= np.linalg.norm(optimal - candidates[2], axis=1) <= length
+    candidates.append(np.where(solvable[:, None], optimal, candidates[2]))
+
+    points = np.stack(candidates, axis=1)  # (E, 4, 3)
+    homogeneous = np.concatenate([points, np.ones(points.shape[:2] + (1,))], axis=2)
+    costs = np.einsum("eki,eij,ekj->ek", homogeneous, q, homogeneous)
+    # a feature vertex only stays or merges with another feature vertex (the midpoint and optimum of a
+    # feature edge are kept, the quadrics hold them on its planes)
+    fu, fv = feature_vertex[u], feature_vertex[v]
+    costs[fv & ~fu, 0] = costs[fu & ~fv, 1] = np.inf
+    costs[fu ^ fv, 2:] = np.inf
+    best = np.argmin(costs, axis=1)
+    return np.maximum(costs[np.arange(len(edges)), best], 0), points[np.arange(len(edges)), best]
+
+
+def _independent(edges, rank, n, passes=INDEPENDENT_PASSES):
+    """
+    Edges no two of which touch the same triangle, cheapest first: every pass takes the edges whose rank is
+    the smallest over all the edges touching their endpoints or the neighbors of those, and the next passes
+    choose among the edges away from the ones taken. Edges of rank len(edges) are never taken.
+    """
+    u, v = edges[:, 0], edges[:, 1]
+    rank = rank.copy()
+    selected = np.zeros(len(edges), dtype=bool)
+    for _ in range(passes):
+        lowest = np.full(n, len(edges))
+        np.minimum.at(lowest, u, rank)
+        np.minimum.at(lowest, v, rank)
+        around = lowest.copy()
+        np.minimum.at(around, u, lowest[v])
+        np.minimum.at(around, v, lowest[u])
+        taken = (rank == around[u]) & (rank == around[v]) & (rank < len(edges))
+        if not np.any(taken):
+            break
+        selected |= taken
+        # the endpoints of the taken edges and their neighbors are off limits for the next passes
+        blocked = np.zeros(n, dtype=bool)
+        blocked[u[taken]] = blocked[v[taken]] = True
+        near = blocked[u] | blocked[v]
+        blocked[u[near]] = blocked[v[near]] = True
+        rank[blocked[u] | blocked[v]] = len(edges)
+    return selected
+
+
+def _link_condition(edges, counts, selected, n):
+    """Collapses whose endpoints share no neighbor besides the apexes of their triangles (stay manifold)."""
+    import scipy.sparse as sp
+
+    adjacency = sp.csr_matrix((np.ones(2 * len(edges)), (edges.ravel(), edges[:, ::-1].ravel())), shape=(n, n))
+    u, v = edges[selected, 0], edges[selected, 1]
+    common = np.asarray(adjacency[u].multiply(adjacency[v]).sum(axis=1)).ravel()
+    return common == counts[selected]
+
+
+def _ring_pairs(starts, corners, vertex):
+    """(owner, corner) pairs of every corner of every vertex in vertex (CSR of _vertex_corners), owner indexing vertex."""
+    degree = starts[vertex + 1] - starts[vertex]
+    owner = np.repeat(np.arange(len(vertex)), degree)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(degree) - degree, degree)
+    return owner, corners[np.repeat(starts[vertex], degree) + offsets]
+
+
+def _cross(a, b):
+    # np.cross is several times slower on (N, 3) arrays
+    return np.stack([a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1], a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+                     a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]], axis=1)
+
+
+def _flips(positions, faces, u, v, targets):
+    """Collapses of u, v to targets that would turn a triangle around them too far (checked one by one)."""
+    starts, corners = _vertex_corners(faces, len(positions))
+    flat = faces.ravel()
+    flips = np.zeros(len(u), dtype=bool)
+    for start in range(0, len(u), PAIR_CHUNK // 16):
+        chunk = slice(start, start + PAIR_CHUNK // 16)
+        owner_u, corner_u = _ring_pairs(starts, corners, u[chunk])
+        owner_v, corner_v = _ring_pairs(starts, corners, v[chunk])
+        owner = start + np.concatenate([owner_u, owner_v])
+        corner = np.concatenate([corner_u, corner_v])
+        # the other two corners of the triangle, in order after the moving one
+        b = flat[corner - corner % 3 + (corner + 1) % 3]
+        c = flat[corner - corner % 3 + (corner + 2) % 3]
+        # the triangles on the edge itself disappear
+        survives = (b != u[owner]) & (b != v[owner]) & (c != u[owner]) & (c != v[owner])
+        owner, corner, b, c = owner[survives], corner[survives], b[survives], c[survives]
+
+        a, b, c = positions[flat[corner]], positions[b], positions[c]
+        target = targets[owner]
+        before = _cross(b - a, c - a)
+        after = _cross(b - target, c - target)
+        norms = np.sqrt(np.einsum("ij,ij->i", before, before) * np.einsum("ij,ij->i", after, after))
+        flips[owner[~(np.einsum("ij,ij->i", before, after) > MIN_NORMAL_COS * norms)]] = True
+    return flips
+
+
+def _collapse_round(positions, faces, quadrics, feature_vertex, representative, target_faces):
+    """
+    Collapse one round of independent edges, at most as many as needed to reach target_faces.
+    Updates positions, quadrics, feature_vertex and representative in place. Returns the faces and the number
+    of collapses done.
+    """
+    n = len(positions)
+    edges, counts, _ = _edges(faces)
+    costs, targets = _collapse_costs(quadrics, positions, edges, feature_vertex)
+    # no collapse through the interior between two feature vertices, nor of non-manifold edges
+    allowed = (counts <= 2) & np.isfinite(costs)
+    allowed &= ~(feature_vertex[edges[:, 0]] & feature_vertex[edges[:, 1]] & (counts == 2))
+    candidates = np.flatnonzero(allowed)
+    # only the collapses that can apply compete: an invalid cheap edge would block its neighbors every round
+    candidates = candidates[_link_condition(edges, counts, candidates, n)]
+    candidates = candidates[~_flips(positions, faces, edges[candidates, 0], edges[candidates, 1], targets[candidates])]
+    # equal costs (flat regions cost 0) are ordered by a hash of the edge: ordered by index, they would rise
+    # steadily across the mesh and leave almost no edge cheaper than all its neighbors
+    scramble = (edges[candidates, 0] * 2654435761 + edges[candidates, 1] * 40503) % (1 << 32)
+    # as with a priority queue, only the cheapest edges compete: an expensive edge alone in a costly region
+    # (a corner of a hole boundary) must not go before the cheap edges elsewhere
+    needed = max(1, (len(faces) - target_faces) // 2)
+    order = candidates[np.lexsort((scramble, costs[candidates]))][:ROUND_WINDOW * needed]
+    rank = np.full(len(edges), len(edges))
+    rank[order] = np.arange(len(order))
+
+    # independent collapses do not share triangles, so each stays valid with the others applied
+    selected = np.flatnonzero(_independent(edges, rank, n))
+    selected = selected[np.argsort(rank[selected])][:needed]
+    u, v = edges[selected, 0], edges[selected, 1]
+    if not len(selected):
+        return faces, 0
+
+    # v merges into u, which moves to the collapse target
+    positions[u] = targets[selected]
+    quadrics[u] += quadrics[v]
+    feature_vertex[u] |= feature_vertex[v]
+    remap = np.arange(n)
+    remap[v] = u
+    representative[:] = remap[representative]
+    faces = remap[faces]
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+    return faces[~degenerate], len(selected)
+
+
+########### errors ###########
+
+def _ring_distances(points, ring_vertex, vertices, faces):
+    """
+    Distance from every point to the triangles around its ring_vertex (inf when it has none): an upper bound of
+    its distance to the mesh.
+    """
+    point, corner = _ring_pairs(*_vertex_corners(faces, len(vertices)), ring_vertex)
+    face = corner // 3
+    distance = np.full(len(points), np.inf)
+    for start in range(0, len(point), PAIR_CHUNK):
+        p, f = point[start:start + PAIR_CHUNK], face[start:start + PAIR_CHUNK]
+        a, b, c = (vertices[faces[f, k]] for k in range(3))
+        closest, _ = closest_point_on_triangles(points[p], a, b, c)
+        np.minimum.at(distance, p, np.linalg.norm(closest - points[p], axis=1))
+    return distance
+
+
+def _max_distance(points, upper, bvh):
+    """Largest distance from the points to the mesh of bvh, querying only the points whose upper bound could exceed it."""
+    order = np.argsort(-upper, kind="stable")
+    largest = 0.0
+    for start in range(0, len(order), QUERY_BATCH):
+        batch = order[start:start + QUERY_BATCH]
+        if upper[batch[0]] <= largest:
+            break
+        largest = max(largest, float(bvh.query(points[batch])[0].max()))
+    return largest
+
+
+def _level_error(vertices, faces, original_bvh, positions, level_faces, representative, used, referenced):
+    """
+    The error estimate, a vertex-sampled Hausdorff distance: the largest distance from the original vertices (the
+    referenced ones, create_bent_space keeps the vertices of its holes) to the level and from the level vertices
+    to the original.
+    """
+    level_vertices = positions[used]
+    # original -> level: each original vertex merged into a level vertex, whose triangles are its bound
+    to_level = _ring_distances(vertices[referenced], representative[referenced], positions, level_faces)
+    error = _max_distance(vertices[referenced], to_level, TriangleBVH(positions, level_faces))
+    # level -> original: a level vertex is named after an original vertex, whose triangles are its bound
+    to_original = _ring_distances(level_vertices, used, vertices, faces)
+    return max(error, _max_distance(level_vertices, to_original, original_bvh))
+
+
+########### pyramid ###########
+
+def build_lod(vertices, faces, ratio=0.5, min_faces=500, max_levels=8, feature_angle=FEATURE_ANGLE):
+    """
+    Decimate a triangle mesh into a pyramid of levels.
+
+    Parameters:
+    - vertices (np.array): (N, 3) vertices.
+    - faces (np.array): (M, 3) triangles.
+    - ratio (float): Faces of a level relative to the previous one.
+    - min_faces (int): No level is built below this many faces.
+    - max_levels (int): Levels after the full mesh.
+    - feature_angle (float): Dihedral angle (degrees) above which edges are kept like boundaries, None for
+      boundaries only.
+
+    Returns:
+    - levels (list): One dict per level, the full mesh first: "vertices" (in the dtype of the input), "faces"
+      (int32, or int64 for huge meshes) and "error_estimate", the Hausdorff distance between the level and the
+      full mesh sampled at their vertices (the largest distance from the vertices of either to the other).
+      A level stops short of its target when the collapses stall, and the pyramid stops at a level removing less
+      than half the faces it should.
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    dtype = vertices.dtype if np.issubdtype(vertices.dtype, np.floating) else np.float64
+    original = vertices.astype(np.float64)
+    faces = faces.astype(np.int64)
+    levels = [{"vertices": vertices, "faces": faces.astype(_index_dtype(len(vertices))), "error_estimate": 0.0}]
+
+    with span("lod.quadrics", len(faces)):
+        a, b, c = (original[faces[:, k]] for k in range(3))
+        quadrics = _accumulate(faces.ravel(), np.repeat(_plane_quadrics(_unit(np.cross(b - a, c - a)), a), 3, axis=0),
+                               len(original))
+        feature_vertex, constraint = _features(original, faces, feature_angle)
+        quadrics += constraint
+    original_bvh = TriangleBVH(original, faces)
+    referenced = np.unique(faces)
+
+    positions = original.copy()
+    representative = np.arange(len(original))
+    current = faces
+    for _ in range(max_levels):
+        target = int(len(current) * ratio)
+        if target < min_faces:
+            break
+        with span("lod.decimate", len(current)) as s:
+            while len(current) > target:
+                current, collapsed = _collapse_round(positions, current, quadrics, feature_vertex, representative,
+                                                     target)
+                if collapsed < MIN_ROUND_FRACTION * len(current) and len(current) > target:
+                    break
+            s.count = len(current)
+        if len(current) > len(levels[-1]["faces"]) * (1 + ratio) / 2:
+            break  # stuck on features or the link condition: no meaningful level left
+
+        used, level_faces = np.unique(current, return_inverse=True)
+        level_faces = level_faces.reshape(-1, 3)
+        with span("lod.error", len(original)):
+            error = _level_error(original, faces, original_bvh, positions, current, representative, used,
+                                 referenced)
+        levels.append({"vertices": positions[used].astype(dtype), "faces": level_faces.astype(_index_dtype(len(used))),
+                       "error_estimate": error})
+    return levels
+
+
+def select_level(levels, max_estimate):
+    """
+    The level with the fewest faces whose error estimate (see build_lod) is at most max_estimate, the full mesh
+    at worst.
+    """
+    within = [level for level in levels if level["error_estimate"] <= max_estimate]
+    return min(within, key=lambda level: len(level["faces"]))
+
+
+def save_lod(output_dir, levels, mesh_format="ply"):
+    """
+    Write every level as lod<i>.<mesh_format> and their sizes and error estimates (with the samples they are
+    measured at) in lod.json (read by load_lod).
+    Returns the paths written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths, index = [], []
+    for i, level in enumerate(levels):
+        name = f"lod{i}.{mesh_format}"
+        paths.append(os.path.join(output_dir, name))
+        save_mesh(paths[-1], level["vertices"], level["faces"])
+        index.append({"file": name, "vertices": len(level["vertices"]), "faces": len(level["faces"]),
+                      "error_estimate": level["error_estimate"], "error_samples": ERROR_SAMPLES})
+    paths.append(os.path.join(output_dir, "lod.json"))
+    with open(paths[-1], "w") as f:
+        json.dump(index, f, indent=2)
+    return paths
+
+
+def load_lod(output_dir, max_estimate=None):
+    """
+    The levels written by save_lod, or with max_estimate only the cheapest level whose error estimate is at
+    most max_estimate (the others are not read). Meshes are memory-mapped when they are binary PLY.
+    """
+    with open(os.path.join(output_dir, "lod.json")) as f:
+        index = json.load(f)
+    if max_estimate is not None:
+        index = [min((entry for entry in index if entry["error_estimate"] <= max_estimate),
+                     key=lambda entry: entry["faces"])]
+    levels = []
+    for entry in index:
+        vertices, faces = load_mesh(os.path.join(output_dir, entry["file"]))
+        levels.append({"vertices": vertices, "faces": faces, "error_estimate": entry["error_estimate"]})
+    return levels if max_estimate is None else levels[0]
@@ -0,0 +1,154 @@
+"""
+Out-of-core marching cubes over SDF trees, as a replacement for reshaping the whole field into one voxels cube.
+
+The grid is cut into blocks of block_size cells per side that share their boundary layer of points (one voxel
+of overlap), so every cell belongs to exactly one block. Blocks the surface can not cross are skipped from
+their interval bound without being evaluated, the others are evaluated on their own and meshed with
+skimage's marching_cubes, and only the block being meshed is ever held as a dense field.
+
+The per-block meshes are stitched by welding the vertices on shared block faces: a marching cubes vertex
+lies on a grid edge, and it is computed from the same two field values (hence the same bits) by every block
+that contains the edge, so the edge it sits on is a hash key shared by all of them.
+
+Example usage:
+>>> x, y, z, grid_spacing = scene_axes(1024, 0.5, 3, 1.5)
+>>> verts, faces = chunked_marching_cubes(wormhole_scene(0.5, 3, 1.5, grid_spacing), x, y, z, workers=None)
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from wormhole_grid import evaluate_grid, resolve_workers, rounding_margin
+from wormhole_profile import span
+
+
+# Cells per side of a block
+BLOCK_SIZE = 64
+
+# Values closer to the level than this fraction of the grid spacing are moved just inside of it, see _mesh_block
+LEVEL_SNAP = 1e-3
+
+
+def _block_origins(shape, block_size):
+    """Index of the first point of every block; block b covers the points origin .. origin + block_size."""
+    ranges = [np.arange(0, max(n - 1, 1), block_size) for n in shape]
+    return np.stack(np.meshgrid(*ranges, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def _block_may_cross(sdf, x, y, z, origins, block_size, level, margin):
+    """False for the blocks the interval bound (widened by margin) proves to be entirely above or below level."""
+    axes = (x, y, z)
+    first = [axis[o] for axis, o in zip(axes, origins.T)]
+    last = [axis[np.minimum(o + block_size, len(axis) - 1)] for axis, o in zip(axes, origins.T)]
+    centers = np.stack([(a + b) / 2 for a, b in zip(first, last)], axis=-1)
+    half_diagonal = 0.5 * np.sqrt(sum((b - a) ** 2 for a, b in zip(first, last)))
+    lo, hi = sdf.interval(centers, half_diagonal * (1 + 1e-9) + margin)
+    return (lo <= level) & (hi >= level)
+
+
+def _mesh_block(sdf, x, y, z, origin, block_size, level, snap, dtype, volume=None):
+    """
+    Marching cubes of one block, evaluated or read from volume. Returns the vertices in global (fractional)
+    grid indices and the faces, or None when the block turns out not to contain the surface.
+    """
+    from skimage.measure import marching_cubes
+
+    stop = [min(o + block_size, len(axis) - 1) + 1 for o, axis in zip(origin, (x, y, z))]
+    if any(s - o < 2 for o, s in zip(origin, stop)):
+        return None
+    if volume is None:
+        field = evaluate_grid(sdf, x[origin[0]:stop[0]], y[origin[1]:stop[1]], z[origin[2]:stop[2]], dtype=dtype)
+    else:
+        # a copy, the snap below writes into it
+        field = np.array(volume[origin[0]:stop[0], origin[1]:stop[1], origin[2]:stop[2]], dtype=dtype)
+    # a point (almost) at the level would put the vertices of all its edges on top of each other, closer than
+    # the float32 vertices of marching_cubes can tell apart, and welding them would pinch the surface. Such
+    # points are moved just inside (by snap, far below the grid spacing), identically in every block, which
+    # keeps the one-voxel walls of the scene (rows of exact zeros) as thin closed walls.
+    field[np.abs(field - level) < snap] = level - snap
+    if not (field.min() < level < field.max()):
+        return None
+    with span("mc.marching_cubes", field.size) as s:
+        verts, faces, normals, values = marching_cubes(field, level=level, allow_degenerate=True)
+        s.count = len(faces)
+    # shifting by an integer keeps every bit of the edge fractions, so shared vertices stay identical
+    return verts.astype(np.float64) + origin, faces
+
+
+def _edge_keys(verts, shape):
+    """
+    Hash key of the grid edge every vertex lies on: ((i * ny + j) * nz + k) * 4 + axis for the edge leaving
+    point (i, j, k) along axis, axis 3 for vertices exactly on a grid point.
+    """
+    base = np.floor(verts)
+    fractional = verts != base
+    axis = np.where(fractional.any(axis=1), np.argmax(fractional, axis=1), 3)
+    base = base.astype(np.int64)
+    nx, ny, nz = shape
+    return ((base[:, 0] * ny + base[:, 1]) * nz + base[:, 2]) * 4 + axis
+
+
+def weld(verts, faces, keys):
+    """Merge the vertices sharing a key, dropping the triangles that collapse. Returns verts, faces."""
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    faces = inverse.ravel()[faces]
+    collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+    return verts[first], faces[~collapsed]
+
+
+def _map_blocks(function, args, workers, backend):
+    if workers == 1:
+        return [function(*a) for a in args]
+    executor = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}.get(backend)
+    if executor is None:
+        raise ValueError(f"unknown backend {backend!r}, expected 'thread' or 'process'")
+    with executor(max_workers=workers) as pool:
+        return list(pool.map(function, *zip(*args)))
+
+
+def chunked_marching_cubes(sdf, x, y, z, level=0.0, block_size=BLOCK_SIZE, workers=1, backend="thread",
+                           dtype=np.float64, volume=None):
+    """
+    Extract the level set of sdf on the grid spanned by the x, y, z axes, block by block.
+
+    Parameters:
+    - sdf (wormhole_sdf.SDF): The field to mesh.
+    - x, y, z (np.array): The grid axes, as in np.meshgrid(x, y, z, indexing='ij').
+    - level (float): The iso value (0 for the surface).
+    - block_size (int): Cells per side of a block, bounds the memory of a block to (block_size + 1)^3 values.
+    - workers (int): Blocks meshed in parallel, None for one per core.
+    - backend (str): "thread" or "process" pool when workers > 1.
+    - dtype: The dtype the blocks are evaluated in (float32 is what marching_cubes works in anyway) and of verts.
+    - volume (np.array): The field of sdf already evaluated on the grid in dtype (e.g. memory-mapped from a
+      wormhole_cache.ArrayCache): the blocks are read from it instead of evaluated, with the same result.
+
+    Returns:
+    - verts (np.array): (V, 3) vertices in world coordinates (the axes values, not offsets from the corner).
+    - faces (np.array): (F, 3) int32 triangles, one mesh with the block boundaries welded.
+    """
+    x, y, z = (np.asarray(axis, dtype=np.float64) for axis in (x, y, z))
+    shape = (len(x), len(y), len(z))
+
+    origins = _block_origins(shape, block_size)
+    margin = rounding_margin(x, y, z, dtype)
+    with span("mc.cull", len(origins)):
+        origins = origins[_block_may_cross(sdf, x, y, z, origins, block_size, level, margin)]
+    # the snap stays above the rounding of the field, so float32 noise around the level is snapped too
+    snap = max(LEVEL_SNAP * min(np.min(np.diff(axis)) for axis in (x, y, z) if len(axis) > 1), margin)
+    args = [(sdf, x, y, z, origin, block_size, level, snap, dtype, volume) for origin in origins]
+    blocks = [block for block in _map_blocks(_mesh_block, args, resolve_workers(workers), backend) if block is not None]
+    if not blocks:
+        return np.empty((0, 3), dtype=dtype), np.empty((0, 3), dtype=np.int32)
+
+    offsets = np.cumsum([0] + [len(verts) for verts, faces in blocks[:-1]])
+    verts = np.concatenate([verts for verts, faces in blocks])
+    faces = np.concatenate([faces + offset for (verts_, faces), offset in zip(blocks, offsets)])
+
+    with span("mc.weld", len(verts)):
+        verts, faces = weld(verts, faces, _edge_keys(verts, shape))
+    index_dtype = np.int32 if len(verts) <= np.iinfo(np.int32).max else np.int64
+
+    # grid indices to world coordinates, exact at the grid points and linear along the edges
+    world = np.stack([np.interp(verts[:, a], np.arange(len(axis)), axis) for a, axis in enumerate((x, y, z))], axis=-1)
+    return world.astype(dtype, copy=False), faces.astype(index_dtype)
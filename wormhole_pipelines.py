@@ -0,0 +1,318 @@
+"""
+The wormhole pipelines as plain functions, without any viewer: the bent space mesher of wormhole.py, the
+four distance field scripts (point cloud, kNN mesh, marching cubes and pyvista threshold) and a sphere traced
+render of their field, for previews without any mesh.
+
+Every pipeline takes its parameters as keyword arguments (PIPELINES lists them with their defaults, the values
+of the scripts) and returns a dict of results: "vertices"/"faces" for meshes, "points"/"values" for point
+clouds, "volume" with its "origin" and "spacing" for fields, "surface" for the pyvista threshold and
+"image"/"depth" for renders. write_results saves such a dict with wormhole_io and show_results opens it in
+polyscope (or pyvista, or matplotlib for images).
+
+precision="float32" carries single precision coordinates and fields through every stage (grid, SDF evaluation,
+thresholding, meshing and smoothing) with int32 faces, halving the memory and bandwidth of the float64 default.
+
+Example usage:
+>>> results = run_pipeline("marching-cubes", grid_size=256, workers=None)
+>>> write_results(results, "out/marching-cubes")
+"""
+
+import inspect
+import os
+
+import numpy as np
+
+from wormhole_io import save_mesh, save_ply, save_png, save_volume
+from wormhole_profile import span
+
+
+BENT_SPACE_DEFAULTS = dict(
+    num_u=100, num_v=90, width=10.0, radius=5.0, extension_length=10.0, hole_radius=1.0,
+    cylinder_radius_top=1.0, cylinder_radius_bottom=1.0, cylinder_height=None, cylinder_segments=30,
+    tolerance=None, stitch=False, precision="float64",
+)
+
+# Shared by the distance field pipelines: the structure (new_outer_radius = initial_radius - radius_reduction)
+SCENE_DEFAULTS = dict(grid_size=100, initial_radius=2.0, radius_reduction=1.5, height=3.0, cube_size=1.5, workers=1,
+                      precision="float64")
+
+PRECISIONS = ("float32", "float64")
+
+
+def _dtype(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+    return np.dtype(precision)
+
+
+def _scene(grid_size, initial_radius, radius_reduction, height, cube_size, precision="float64"):
+    """The grid axes (in the precision), grid_spacing and SDF tree of the df scripts."""
+    from wormhole_grid import scene_axes
+    from wormhole_sdf import wormhole_scene
+
+    new_outer_radius = initial_radius - radius_reduction
+    x, y, z, grid_spacing = scene_axes(grid_size, new_outer_radius, height, cube_size)
+    x, y, z = (axis.astype(_dtype(precision)) for axis in (x, y, z))
+    return x, y, z, grid_spacing, wormhole_scene(new_outer_radius, height, cube_size, grid_spacing)
+
+
+def _cached_volume(grid_size, initial_radius, radius_reduction, height, cube_size, precision, cache):
+    """The combined field of the df scripts on their grid through the cache, with the axes, grid_spacing and scene."""
+    from wormhole_cache import cached_scene_volume
+
+    x, y, z, grid_spacing, scene = _scene(grid_size, initial_radius, radius_reduction, height, cube_size, precision)
+    volume, *_ = cached_scene_volume(grid_size, initial_radius - radius_reduction, height, cube_size,
+                                     dtype=_dtype(precision), cache=cache)
+    return volume, x, y, z, grid_spacing, scene
+
+
+def _field_results(volume, x, y, z):
+    return {"volume": volume, "origin": (x[0], y[0], z[0]), "spacing": (x[1] - x[0], y[1] - y[0], z[1] - z[0])}
+
+
+def bent_space(num_u=100, num_v=90, width=10.0, radius=5.0, extension_length=10.0, hole_radius=1.0,
+               cylinder_radius_top=1.0, cylinder_radius_bottom=1.0, cylinder_height=None, cylinder_segments=30,
+               tolerance=None, stitch=False, precision="float64", cache=None):
+    """
+    wormhole.py: the bent space with the cylinder joining its holes. cylinder_height defaults to
+    2 * radius + 0.4 as in the script. With a tolerance the bent space is the adaptive mesh of
+    create_bent_space_adaptive (num_u and num_v are not used). With stitch the cylinder is connected to the
+    holes (wormhole.stitch_wormhole) into a single manifold mesh, and cylinder_height defaults to the height
+    whose ends lie in the holes (wormhole.spanning_height). With a wormhole_cache.ArrayCache both meshes go
+    through the cache.
+    """
+    import wormhole
+
+    dtype = _dtype(precision)
+    if cylinder_height is None:
+        cylinder_height = wormhole.spanning_height(radius, cylinder_segments) if stitch else 2 * radius + 0.4
+    if cache is None:
+        if tolerance is None:
+            vertices, faces = wormhole.create_bent_space(num_u, num_v, width, radius, extension_length, hole_radius,
+                                                         dtype)
+        else:
+            vertices, faces = wormhole.create_bent_space_adaptive(width, radius, extension_length, hole_radius,
+                                                                  tolerance, dtype)
+        cylinder = wormhole.create_wormhole(cylinder_radius_top, cylinder_radius_bottom, cylinder_height, cylinder_segments,
+                                            dtype)
+    else:
+        from wormhole_cache import cached_bent_space, cached_bent_space_adaptive, cached_wormhole
+
+        if tolerance is None:
+            vertices, faces = cached_bent_space(num_u, num_v, width, radius, extension_length, hole_radius, dtype,
+                                                cache=cache)
+        else:
+            vertices, faces = cached_bent_space_adaptive(width, radius, extension_length, hole_radius, tolerance,
+                                                         dtype, cache=cache)
+        cylinder = cached_wormhole(cylinder_radius_top, cylinder_radius_bottom, cylinder_height, cylinder_segments,
+                                   dtype, cache=cache)
+    combine = wormhole.stitch_wormhole if stitch else wormhole.join_wormhole
+    all_vertices, all_faces = combine(vertices, faces, *cylinder, radius, extension_length)
+    return {"vertices": all_vertices, "faces": all_faces}
+
+
+def point_cloud(grid_size=100, initial_radius=2.0, radius_reduction=1.5, height=3.0, cube_size=1.5, workers=1,
+                precision="float64", cache=None):
+    """
+    wormhole_df_on_grid.py: the grid points within half a grid spacing of the surface and their values. With a
+    wormhole_cache.ArrayCache they are thresholded from the cached field instead of evaluated near the surface
+    (the same points and values).
+    """
+    from wormhole_grid import grid_points, narrow_band
+
+    if cache is None:
+        x, y, z, grid_spacing, scene = _scene(grid_size, initial_radius, radius_reduction, height, cube_size,
+                                              precision)
+        near_surface, values = narrow_band(scene, x, y, z, grid_spacing * 0.5, dtype=x.dtype, workers=workers)
+    else:
+        volume, x, y, z, grid_spacing, _ = _cached_volume(grid_size, initial_radius, radius_reduction, height,
+                                                          cube_size, precision, cache)
+        with span("grid.threshold", volume.size):
+            near_surface = np.argwhere(np.abs(volume) < grid_spacing * 0.5)  # in C order, as narrow_band
+            values = np.asarray(volume[tuple(near_surface.T)])
+    with span("grid.near_surface_points", len(values)):
+        points = grid_points(x, y, z, near_surface.T)
+    return {"points": points, "values": values}
+
+
+def knn(grid_size=100, initial_radius=2.0, radius_reduction=1.5, height=3.0, cube_size=1.5, workers=1,
+        k=5, smoothing_iterations=5, precision="float64", cache=None):
+    """wormhole_df_kNN.py: the near-surface points meshed from their k nearest neighbors, then smoothed."""
+    from wormhole_knn import knn_mesh, laplacian_smooth, smoothing_operator
+
+    points = point_cloud(grid_size, initial_radius, radius_reduction, height, cube_size, workers, precision,
+                         cache)["points"]
+    vertices, faces, indices = knn_mesh(points, k=k)
+    with span("smooth.operator", len(vertices)):
+        operator = smoothing_operator(len(vertices), indices=indices, dtype=points.dtype)
+    vertices = laplacian_smooth(vertices, operator, smoothing_iterations)
+    return {"vertices": vertices, "faces": faces}
+
+
+def marching_cubes(grid_size=100, initial_radius=2.0, radius_reduction=1.5, height=3.0, cube_size=1.5, workers=1,
+                   level=0.0, block_size=64, precision="float64", cache=None):
+    """
+    wormhole_df_marching_cubes.py: the level set of the combined field, meshed block by block. With a
+    wormhole_cache.ArrayCache the blocks are read from the cached field (the same mesh).
+    """
+    from wormhole_marching import chunked_marching_cubes
+
+    volume = None
+    if cache is None:
+        x, y, z, grid_spacing, scene = _scene(grid_size, initial_radius, radius_reduction, height, cube_size,
+                                              precision)
+    else:
+        volume, x, y, z, grid_spacing, scene = _cached_volume(grid_size, initial_radius, radius_reduction, height,
+                                                              cube_size, precision, cache)
+    verts, faces = chunked_marching_cubes(scene, x, y, z, level=level, block_size=block_size, workers=workers,
+                                          dtype=x.dtype, volume=volume)
+    return {"vertices": verts, "faces": faces}
+
+
+def threshold(grid_size=100, initial_radius=2.0, radius_reduction=1.5, height=3.0, cube_size=1.5, workers=1,
+              precision="float64", cache=None):
+    """
+    wormhole_distance_fields.py: the whole combined field, and (when pyvista is installed) the cells of the
+    structured grid within half a grid spacing of the surface.
+    """
+    from wormhole_grid import evaluate_grid
+
+    if cache is None:
+        x, y, z, grid_spacing, scene = _scene(grid_size, initial_radius, radius_reduction, height, cube_size, precision)
+        volume = evaluate_grid(scene, x, y, z, dtype=_dtype(precision), workers=workers)
+    else:
+        volume, x, y, z, grid_spacing, _ = _cached_volume(grid_size, initial_radius, radius_reduction, height,
+                                                          cube_size, precision, cache)
+    results = _field_results(volume, x, y, z)
+    try:
+        import pyvista as pv
+    except ImportError:
+        return results  # the volume alone, threshold it downstream
+
+    surface_threshold = grid_spacing * 0.5
+    with span("threshold.pyvista", volume.size):
+        grid = pv.StructuredGrid(*np.meshgrid(x, y, z, indexing="ij"))
+        grid["sdf"] = np.asarray(volume).flatten()
+        results["surface"] = grid.threshold([-surface_threshold, surface_threshold])
+    return results
+
+
+def render(grid_size=100, initial_radius=2.0, radius_reduction=1.5, height=3.0, cube_size=1.5, workers=1,
+           width=512, image_height=512, azimuth=30.0, elevation=20.0, fov=40.0, zoom=1.0, precision="float64"):
+    """
+    The combined field of the df scripts sphere traced to an image, without meshing. grid_size only sets the
+    wall thickness (one grid spacing) as in the other pipelines, no grid is evaluated (so nothing is cached).
+    """
+    from wormhole_render import render as render_image
+
+    x, y, z, grid_spacing, scene = _scene(grid_size, initial_radius, radius_reduction, height, cube_size, precision)
+    image, depth = render_image(scene, width, image_height, azimuth, elevation, fov, zoom, workers=workers,
+                                dtype=_dtype(precision))
+    return {"image": image, "depth": depth}
+
+
+# name: (function, default parameters)
+PIPELINES = {
+    "bent-space": (bent_space, BENT_SPACE_DEFAULTS),
+    "point-cloud": (point_cloud, SCENE_DEFAULTS),
+    "knn": (knn, dict(SCENE_DEFAULTS, k=5, smoothing_iterations=5)),
+    "marching-cubes": (marching_cubes, dict(SCENE_DEFAULTS, level=0.0, block_size=64)),
+    "threshold": (threshold, SCENE_DEFAULTS),
+    "render": (render, dict(SCENE_DEFAULTS, width=512, image_height=512, azimuth=30.0, elevation=20.0, fov=40.0,
+                            zoom=1.0)),
+}
+
+
+def uses_cache(name):
+    """Whether the named pipeline takes a wormhole_cache.ArrayCache (run_pipeline rejects one otherwise)."""
+    function, defaults = PIPELINES[name]
+    return "cache" in inspect.signature(function).parameters
+
+
+def run_pipeline(name, cache=None, **params):
+    """Run the named pipeline with its defaults overridden by params. Returns its results dict."""
+    if name not in PIPELINES:
+        raise ValueError(f"unknown pipeline {name!r}, expected one of {', '.join(PIPELINES)}")
+    function, defaults = PIPELINES[name]
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise ValueError(f"unknown parameters for {name}: {', '.join(sorted(unknown))}")
+    if cache is not None:
+        if not uses_cache(name):
+            raise ValueError(f"the {name} pipeline evaluates no grid or mesh, it can not use a cache")
+        params = dict(params, cache=cache)
+    with span(f"pipeline.{name}"):
+        return function(**dict(defaults, **params))
+
+
+def write_results(results, output_dir, mesh_format="ply"):
+    """
+    Save a results dict in output_dir: mesh.<mesh_format>, points.ply with values.npy, volume.vol
+    (see wormhole_io.load_volume), surface.vtu, image.png with depth.npy, the lod directory of a
+    wormhole_lod pyramid and geodesic.npy (per-vertex distances, see wormhole_geodesic). Returns the paths written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with span("write"):
+        return _write(results, output_dir, mesh_format)
+
+
+def _write(results, output_dir, mesh_format):
+    paths = []
+    if "faces" in results:
+        paths.append(os.path.join(output_dir, f"mesh.{mesh_format}"))
+        save_mesh(paths[-1], results["vertices"], results["faces"])
+    if "points" in results:
+        paths.append(os.path.join(output_dir, "points.ply"))
+        save_ply(paths[-1], results["points"], np.empty((0, 3), dtype=np.int32))
+        paths.append(os.path.join(output_dir, "values.npy"))
+        np.save(paths[-1], results["values"])
+    if "volume" in results:
+        paths.append(os.path.join(output_dir, "volume.vol"))
+        save_volume(paths[-1], results["volume"], results["origin"], results["spacing"])
+    if "surface" in results:
+        paths.append(os.path.join(output_dir, "surface.vtu"))
+        results["surface"].save(paths[-1])
+    if "image" in results:
+        paths.append(os.path.join(output_dir, "image.png"))
+        save_png(paths[-1], results["image"])
+        paths.append(os.path.join(output_dir, "depth.npy"))
+        np.save(paths[-1], results["depth"])
+    if "lod" in results:
+        from wormhole_lod import save_lod
+
+        paths.extend(save_lod(os.path.join(output_dir, "lod"), results["lod"], mesh_format))
+    if "geodesic" in results:
+        paths.append(os.path.join(output_dir, "geodesic.npy"))
+        np.save(paths[-1], results["geodesic"])
+    return paths
+
+
+def show_results(results, name="Wormhole"):
+    """Open the results in polyscope, or the threshold surface in a pyvista plotter, as the scripts did."""
+    if "surface" in results:
+        import pyvista as pv
+
+        plotter = pv.Plotter()
+        plotter.add_mesh(results["surface"], color="w", opacity=0.5)
+        plotter.show()
+        return
+    if "image" in results:
+        import matplotlib.pyplot as plt
+
+        plt.imshow(results["image"])
+        plt.axis("off")
+        plt.title(name)
+        plt.show()
+        return
+
+    import polyscope as ps
+
+    ps.init()
+    if "faces" in results:
+        ps.register_surface_mesh(name, results["vertices"], results["faces"])
+        if "geodesic" in results:
+            ps.get_surface_mesh(name).add_scalar_quantity("geodesic", results["geodesic"], enabled=True)
+    elif "points" in results:
+        ps.register_point_cloud(name, results["points"])
+        ps.get_point_cloud(name).add_scalar_quantity("SDF", results["values"], enabled=True)
+    ps.show()
@@ -0,0 +1,210 @@
+"""
+Lightweight instrumentation of the wormhole pipelines: named timing spans with element counts, and allocation
+counters through tracemalloc when asked for.
+
+The pipeline code wraps its stages in span(name, count). While profiling is disabled (the default) span
+returns a shared do-nothing context manager after a single global check, so the spans stay in the code.
+Between enable() and disable() (or inside a profile() block) every span is recorded with its start, duration,
+self time (without its nested spans), count and, with trace_memory, the net and peak bytes it allocated.
+
+Example usage:
+>>> with profile(trace_memory=True) as profiler:
+...     run_pipeline("knn", grid_size=256)
+>>> print(profiler.summary())
+>>> profiler.write_chrome_trace("knn.trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+
+Spans of worker threads are recorded on their own track; spans inside worker processes are not recorded.
+tracemalloc counts are process wide, so with threads they include the allocations of the other threads.
+When tracemalloc was already tracing before enable(), its peak belongs to the caller and is never reset: the
+span peaks are then lower bounds (a peak below the caller's earlier peak is not seen).
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+_profiler = None
+
+
+class _NullSpan:
+    """The span handed out while profiling is disabled. Setting count on it does nothing useful."""
+
+    count = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One recorded span. count may also be set inside the with block, once the number of elements is known."""
+
+    __slots__ = ("profiler", "name", "count", "start", "duration", "child_time", "thread", "depth",
+                 "memory_start", "peak_start", "peak_seen", "allocated", "peak")
+
+    def __init__(self, profiler, name, count):
+        self.profiler = profiler
+        self.name = name
+        self.count = count
+
+    def __enter__(self):
+        profiler = self.profiler
+        stack = profiler._stack()
+        self.thread = threading.get_ident()
+        self.depth = len(stack)
+        self.child_time = 0.0
+        if profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if profiler._started_tracing:
+                # the peak is ours: hand the one so far to the enclosing span and measure this span from here
+                if stack:
+                    stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+                tracemalloc.reset_peak()
+                peak = current
+            self.memory_start = self.peak_seen = current
+            self.peak_start = peak
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        profiler = self.profiler
+        stack = profiler._stack()
+        stack.pop()
+        if profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # a peak not above the one at entry may predate the span, only current is known to be in it
+            peak = max(peak if peak > self.peak_start else current, self.peak_seen)
+            self.allocated = current - self.memory_start
+            self.peak = peak - self.memory_start
+            if stack:
+                stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+        else:
+            self.allocated = self.peak = None
+        if stack:
+            stack[-1].child_time += self.duration
+        profiler.spans.append(self)  # list.append is atomic, worker threads can record concurrently
+        return False
+
+
+class Profiler:
+    """The spans recorded between enable() and disable()."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self._started_tracing = False  # set by enable() when it starts tracemalloc
+        self.spans = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def totals(self):
+        """Per span name: calls, total and self seconds, summed count and the largest peak allocation."""
+        totals = {}
+        for s in self.spans:
+            entry = totals.setdefault(s.name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "count": None,
+                                               "allocated": None, "peak": None})
+            entry["calls"] += 1
+            entry["seconds"] += s.duration
+            entry["self_seconds"] += s.duration - s.child_time
+            if s.count is not None:
+                entry["count"] = (entry["count"] or 0) + s.count
+            if s.allocated is not None:
+                entry["allocated"] = (entry["allocated"] or 0) + s.allocated
+                entry["peak"] = max(entry["peak"] or 0, s.peak)
+        return totals
+
+    def summary(self, sort="seconds"):
+        """Table of the totals, one row per span name, the most expensive first."""
+        totals = sorted(self.totals().items(), key=lambda item: -item[1][sort])
+        width = max([len(name) for name, entry in totals] + [4])
+        lines = [f"{'span':<{width}} {'calls':>7} {'total s':>10} {'self s':>10} {'count':>12} {'Mcount/s':>9}"
+                 + (f" {'alloc MiB':>10} {'peak MiB':>9}" if self.trace_memory else "")]
+        for name, e in totals:
+            count = "" if e["count"] is None else str(e["count"])
+            rate = "" if e["count"] is None or e["seconds"] == 0 else f"{e['count'] / e['seconds'] / 1e6:.2f}"
+            line = (f"{name:<{width}} {e['calls']:>7} {e['seconds']:>10.4f} {e['self_seconds']:>10.4f} "
+                    f"{count:>12} {rate:>9}")
+            if self.trace_memory:
+                line += f" {(e['allocated'] or 0) / 2**20:>10.1f} {(e['peak'] or 0) / 2**20:>9.1f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """The spans as Chrome trace events (complete 'X' events, microseconds)."""
+        pid = os.getpid()
+        events = []
+        for s in self.spans:
+            args = {"count": s.count} if s.count is not None else {}
+            if s.allocated is not None:
+                args.update(allocated=s.allocated, peak=s.peak)
+            events.append({"name": s.name, "cat": s.name.split(".")[0], "ph": "X", "pid": pid, "tid": s.thread,
+                           "ts": (s.start - self.origin) * 1e6, "dur": s.duration * 1e6, "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def span(name, count=None):
+    """
+    Context manager timing the enclosed stage under name, with an optional element count (points, faces...).
+    Nearly free while profiling is disabled.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_SPAN
+    return Span(profiler, name, count)
+
+
+def enabled():
+    return _profiler is not None
+
+
+def enable(trace_memory=False):
+    """Start recording spans (and allocations with trace_memory). Returns the Profiler."""
+    global _profiler
+    # stop tracemalloc on disable only if it is started here (or by the profiler this one replaces), a trace
+    # the caller started keeps running
+    started = _profiler is not None and _profiler._started_tracing
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started = True
+    _profiler = Profiler(trace_memory)
+    _profiler._started_tracing = started
+    return _profiler
+
+
+def disable():
+    """Stop recording. Returns the Profiler with the recorded spans (None if profiling was not enabled)."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler._started_tracing:
+        tracemalloc.stop()
+    return profiler
+
+
+@contextmanager
+def profile(trace_memory=False):
+    """Record the spans of the enclosed code. Yields the Profiler, complete once the block exits."""
+    profiler = enable(trace_memory)
+    try:
+        yield profiler
+    finally:
+        disable()
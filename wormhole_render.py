@@ -0,0 +1,204 @@
+"""
+Headless sphere tracing of wormhole_sdf trees, to preview a field without meshing it.
+
+All the rays of an image are marched together as arrays: every step evaluates the tree once at the current
+point of the rays still marching and advances each of them by its distance value, which the 1-Lipschitz
+fields guarantee not to cross the surface. A ray stops when the value falls below its pixel footprint (the
+surface is hit at the resolution of the image) or when it leaves the bounding box of the tree, and stopped
+rays are dropped from the arrays, so late steps only cost the few rays grazing the surface. Rays start where
+they enter the box (bounds), the empty space around the scene costs nothing.
+
+Normals are the central differences of the field at the hit points, one tree evaluation for all the offsets
+of all the hits. Shading is two-sided Lambert with an ambient term, so open surfaces and the unsigned fields
+of bent_space_scene render like the closed walls of wormhole_scene.
+
+Example usage:
+>>> image, depth = render(wormhole_scene(0.5, 3, 1.5, 0.03), width=512, height=512, azimuth=30, elevation=20)
+>>> save_png("wormhole.png", image)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from wormhole_grid import resolve_workers
+from wormhole_profile import span
+
+
+# Steps after which a ray still marching is given up (a miss)
+MAX_STEPS = 256
+
+SURFACE_COLOR = np.array([0.82, 0.84, 0.9])
+BACKGROUND_COLOR = np.array([1.0, 1.0, 1.0])
+AMBIENT = 0.25
+
+
+def orbit_camera(sdf, azimuth=30.0, elevation=20.0, fov=40.0, zoom=1.0):
+    """
+    Eye and target of a camera looking at the center of the bounding box of sdf (y up), from the azimuth
+    and elevation in degrees, far enough for the bounding sphere to fill the field of view at zoom 1.
+    """
+    lo, hi = sdf.bounds()
+    if not (np.all(np.isfinite(lo)) and np.all(np.isfinite(hi))):
+        raise ValueError("the tree is unbounded (e.g. rotated), give the eye and target of the camera")
+    target = (lo + hi) / 2
+    distance = np.linalg.norm(hi - lo) / 2 / np.sin(np.radians(fov) / 2) / zoom
+    azimuth, elevation = np.radians(azimuth), np.radians(elevation)
+    direction = np.array([np.cos(elevation) * np.sin(azimuth), np.sin(elevation), np.cos(elevation) * np.cos(azimuth)])
+    return target + distance * direction, target
+
+
+def camera_rays(width, height, eye, target, up=(0.0, 1.0, 0.0), fov=40.0, dtype=np.float64):
+    """
+    Unit directions (height * width, 3) of the rays through the pixel centers, row by row from the top left,
+    of a pinhole camera at eye looking at target with a vertical field of view of fov degrees.
+    Returns the directions and the angle of a pixel (radians), the footprint of a pixel at distance t is t * angle.
+    """
+    eye, target, up = (np.asarray(v, dtype=np.float64) for v in (eye, target, up))
+    forward = target - eye
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, up)
+    right /= np.linalg.norm(right)
+    true_up = np.cross(right, forward)
+
+    half_height = np.tan(np.radians(fov) / 2)
+    pixel_angle = 2 * half_height / height
+    u = ((np.arange(width) + 0.5) - width / 2) * pixel_angle
+    v = (height / 2 - (np.arange(height) + 0.5)) * pixel_angle
+    directions = (forward + u[None, :, None] * right + v[:, None, None] * true_up).reshape(-1, 3)
+    directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+    return directions.astype(dtype, copy=False), pixel_angle
+
+
+def box_span(eye, directions, lo, hi):
+    """
+    Ray parameters (near, far) where the rays from eye enter and leave the box lo..hi (slab method), near > far
+    for the rays missing it. Infinite boxes give (0, inf).
+    """
+    eye = np.asarray(eye, dtype=np.float64)
+    near = np.zeros(len(directions))
+    far = np.full(len(directions), np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for axis in range(3):
+            d = directions[:, axis].astype(np.float64)
+            t0 = (lo[axis] - eye[axis]) / d
+            t1 = (hi[axis] - eye[axis]) / d
+            # rays parallel to the slab: inside it for every t, or never
+            parallel = d == 0
+            inside = (lo[axis] <= eye[axis]) & (eye[axis] <= hi[axis])
+            t0[parallel], t1[parallel] = (-np.inf, np.inf) if inside else (np.inf, -np.inf)
+            near = np.maximum(near, np.minimum(t0, t1))
+            far = np.minimum(far, np.maximum(t0, t1))
+    return near, far
+
+
+def sphere_trace(sdf, eye, directions, near, far, pixel_angle, max_steps=MAX_STEPS):
+    """
+    March the rays from eye along directions between near and far. A ray hits when the field falls below
+    half its pixel footprint. Returns the hit distances (inf for the misses) and the steps of every ray.
+    """
+    dtype = directions.dtype
+    eye = np.asarray(eye, dtype=dtype)
+    t = near.astype(dtype)
+    far = far.astype(dtype)
+    hit = np.zeros(len(directions), dtype=bool)
+    steps = np.zeros(len(directions), dtype=np.int32)
+    tolerance = dtype.type(pixel_angle / 2)
+
+    active = np.flatnonzero(near < far)
+    for _ in range(max_steps):
+        if not len(active):
+            break
+        with span("render.step", len(active)):
+            t_active = t[active]
+            distance = sdf(eye + t_active[:, None] * directions[active])
+            done = distance < tolerance * t_active
+            hit[active[done]] = True
+            t_active += distance
+            t[active] = np.where(done, t[active], t_active)
+            steps[active] += 1
+            # compaction: only the rays still in front of the box exit march on
+            active = active[~done & (t_active < far[active])]
+    t[~hit] = np.inf
+    return t, steps
+
+
+def estimate_normals(sdf, points, step):
+    """
+    Unit normals at the (N, 3) points from central differences of the field, step (N,) along every axis.
+    Where one side is not finite (the semi-cylinder is inf past its cut), the difference is one-sided.
+    """
+    offsets = np.concatenate([np.zeros((1, 3)), np.eye(3), -np.eye(3)]).astype(points.dtype)
+    probes = points[None, :, :] + step[None, :, None] * offsets[:, None, :]
+    values = sdf(probes.reshape(-1, 3)).reshape(7, len(points))
+    center, plus, minus = values[0], values[1:4], values[4:]
+    with np.errstate(invalid="ignore"):
+        gradient = np.where(np.isfinite(plus), plus, center) - np.where(np.isfinite(minus), minus, center)
+    gradient = np.nan_to_num(gradient.T, nan=0.0, posinf=0.0, neginf=0.0)
+    length = np.linalg.norm(gradient, axis=1, keepdims=True)
+    return np.divide(gradient, length, out=np.zeros_like(gradient), where=length > 0)
+
+
+def shade(normals, directions, light):
+    """Two-sided Lambert colors (N, 3) in 0..1: the normals are flipped to face the rays."""
+    facing = np.where(np.sum(normals * directions, axis=1, keepdims=True) > 0, -normals, normals)
+    diffuse = np.clip(facing @ light, 0, 1)
+    return SURFACE_COLOR * (AMBIENT + (1 - AMBIENT) * diffuse[:, None])
+
+
+def _render_rays(sdf, eye, directions, near, far, pixel_angle, light, max_steps):
+    with span("render.trace", len(directions)):
+        t, steps = sphere_trace(sdf, eye, directions, near, far, pixel_angle, max_steps)
+    hit = np.isfinite(t)
+    colors = np.broadcast_to(BACKGROUND_COLOR, (len(directions), 3)).copy()
+    with span("render.shade", int(hit.sum())):
+        points = eye.astype(directions.dtype) + t[hit, None] * directions[hit]
+        # half a pixel wide (thinner than the walls at useful resolutions), and well above the coordinate rounding
+        step = np.maximum(t[hit] * pixel_angle / 2, 1e-4 * np.abs(points).max(initial=1))
+        normals = estimate_normals(sdf, points, step.astype(points.dtype))
+        colors[hit] = shade(normals.astype(np.float64), directions[hit].astype(np.float64), light)
+    return colors, t
+
+
+def render(sdf, width=512, height=512, azimuth=30.0, elevation=20.0, fov=40.0, zoom=1.0, eye=None, target=None,
+           max_steps=MAX_STEPS, workers=1, dtype=np.float64):
+    """
+    Render the surface (zero level set) of sdf.
+
+    Parameters:
+    - sdf (wormhole_sdf.SDF): The field to render.
+    - width, height (int): The image size in pixels.
+    - azimuth, elevation (float): Orbit of the camera around the bounding box center (degrees), see orbit_camera.
+    - fov (float): Vertical field of view (degrees).
+    - zoom (float): > 1 moves the orbit camera closer.
+    - eye, target (np.array): Explicit camera position and look-at point, instead of the orbit.
+    - max_steps (int): Steps after which a ray is a miss.
+    - workers (int): Threads marching slices of the rays, None for one per core.
+    - dtype: The dtype of the rays and of the field evaluations (float32 or float64).
+
+    Returns:
+    - image (np.array): (height, width, 3) uint8 RGB image.
+    - depth (np.array): (height, width) distance from the eye to the hit along the ray, inf for the background.
+    """
+    if eye is None or target is None:
+        eye, target = orbit_camera(sdf, azimuth, elevation, fov, zoom)
+    eye = np.asarray(eye, dtype=np.float64)
+    directions, pixel_angle = camera_rays(width, height, eye, target, fov=fov, dtype=dtype)
+    near, far = box_span(eye, directions, *sdf.bounds())
+
+    # light from above the camera and to its left, slightly
+    forward = np.asarray(target, dtype=np.float64) - eye
+    light = -forward / np.linalg.norm(forward) + np.array([-0.3, 0.6, 0.0])
+    light /= np.linalg.norm(light)
+
+    slices = np.array_split(np.arange(len(directions)), resolve_workers(workers))
+    args = [(sdf, eye, directions[s], near[s], far[s], pixel_angle, light, max_steps) for s in slices if len(s)]
+    if len(args) == 1:
+        results = [_render_rays(*args[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(args)) as pool:
+            results = list(pool.map(lambda a: _render_rays(*a), args))
+    colors = np.concatenate([colors for colors, t in results])
+    depth = np.concatenate([t for colors, t in results])
+    image = np.round(np.clip(colors, 0, 1) * 255).astype(np.uint8).reshape(height, width, 3)
+    return image, depth.reshape(height, width)
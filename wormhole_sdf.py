@@ -0,0 +1,612 @@
+"""
+Distance field primitives shared by the wormhole_df_* scripts, and a small expression tree to combine them.
+
+Importing this module has no side effects (no viewer, no grid): build a tree, then evaluate it over any
+(N, 3) points buffer. The tree is evaluated block by block in a single pass, so the intermediate fields of
+every primitive only ever exist for one cache sized block of points instead of the whole grid.
+
+Every node can also bound its values over balls (interval): the primitives are 1-Lipschitz, so over a cell of
+half-diagonal h their values stay within h of the value at the cell center, and the bounds are carried
+exactly through min/max/negation. This is what lets the grid evaluators skip cells far from the surface.
+
+Every node also has a bounding box (bounds) outside which its field is at least the distance to the box. Unions
+and subtractions use it to evaluate a child only at the points where it can still change the min/max, so
+primitives cost in proportion to the part of the block they can reach, with unchanged results.
+
+Example usage:
+>>> scene = wormhole_scene(new_outer_radius=0.5, height=3, cube_size=1.5, grid_spacing=0.03)
+>>> combined_sdf = scene(points)
+"""
+
+import numpy as np
+
+from wormhole_profile import span
+
+
+# Number of points evaluated at once by a tree, the intermediate fields are this long
+BLOCK_SIZE = 1 << 16
+
+
+# SDF for an open cylinder (no caps)
+def sdOpenCylinder(p, radius, height):
+    radial_dist = np.sqrt(p[:, 0]**2 + p[:, 2]**2) - radius
+    vertical_dist = np.abs(p[:, 1]) - height / 2
+    return np.maximum(radial_dist, vertical_dist)
+
+# SDF for a rotated and translated semi-cylinder along the X-axis
+def sdSemiCylinder(p, radius, height, shift_x):
+    # Rotate points around Y-axis to orient the semi-cylinder
+    rotated_x = p[:, 2] - shift_x  # z becomes x in the semi-cylinder, translate along x
+    rotated_z = p[:, 0]  # x becomes z in the semi-cylinder
+    radial_dist = np.sqrt(rotated_x**2 + p[:, 1]**2) - radius
+
+    uncapped_dist = radial_dist  # Only consider radial distance for SDF
+
+    # Apply uncapping condition: keep inside the height but do not cap ends
+    no_cap_condition = (rotated_z >= -height / 2) & (rotated_z <= height / 2)
+    capped_sdf = np.where(no_cap_condition, uncapped_dist, np.inf)  # Use radial distance where within height limits, else infinity
+
+    # Enforce semi-cylinder (only one half)
+    capped_sdf = np.where(rotated_x > 0, capped_sdf, np.inf)
+
+    return capped_sdf
+
+# SDF for a cube
+def sdBox(p, size):
+    d = np.abs(p) - size
+    return np.maximum(np.maximum(d[:, 0], d[:, 1]), d[:, 2])  # max over the columns, np.max(axis=1) is slow on (N, 3)
+
+
+# Exact (unsigned) distances to the open surfaces of wormhole.py, which have no inside
+
+# Distance to a half pipe: the half circle of the given radius around the x axis on the z >= 0 side, swept
+# over x in [-width/2, width/2] (the bend of create_bent_space, centered on its axis)
+def sdHalfPipe(p, width, radius):
+    y, z = p[:, 1], p[:, 2]
+    radial = np.abs(np.sqrt(y**2 + z**2) - radius)  # to the full circle, the nearest point is on the arc for z >= 0
+    endpoint = np.sqrt((np.abs(y) - radius)**2 + z**2)  # for z < 0 the nearest point is one of the two arc ends
+    arc_dist = np.where(z >= 0, radial, endpoint)
+    along_x = np.maximum(np.abs(p[:, 0]) - width / 2, 0)  # the sweep is a product: distances add in quadrature
+    return np.sqrt(arc_dist**2 + along_x**2)
+
+# Distance to a size_x by size_z rectangle in the y = 0 plane centered at the origin, with a circular hole of
+# hole_radius at its center (an extension of create_bent_space, centered on its hole)
+def sdHoledRectangle(p, size_x, size_z, hole_radius):
+    x, z = p[:, 0], p[:, 2]
+    a, b, r = size_x / 2, size_z / 2, hole_radius
+    in_hole = x**2 + z**2 < r**2
+    in_plane = (np.abs(x) <= a) & (np.abs(z) <= b) & ~in_hole
+
+    # otherwise the nearest point of the holed rectangle is the nearest point of one of its edges (when not in
+    # the hole), the nearest point of the hole circle (when inside the rectangle), or a corner between them
+    nearest_sq = np.full(len(p), np.inf, dtype=p.dtype)
+    for fixed_x in (-a, a):
+        foot_z = np.clip(z, -b, b)
+        valid = fixed_x**2 + foot_z**2 >= r**2
+        nearest_sq = np.where(valid, np.minimum(nearest_sq, (x - fixed_x)**2 + (z - foot_z)**2), nearest_sq)
+    for fixed_z in (-b, b):
+        foot_x = np.clip(x, -a, a)
+        valid = foot_x**2 + fixed_z**2 >= r**2
+        nearest_sq = np.where(valid, np.minimum(nearest_sq, (x - foot_x)**2 + (z - fixed_z)**2), nearest_sq)
+
+    rho = np.sqrt(x**2 + z**2)
+    safe_rho = np.where(rho > 0, rho, 1)
+    circle_x = np.where(rho > 0, r * x / safe_rho, r)
+    circle_z = np.where(rho > 0, r * z / safe_rho, 0)
+    valid = (np.abs(circle_x) <= a) & (np.abs(circle_z) <= b)
+    nearest_sq = np.where(valid, np.minimum(nearest_sq, (rho - r)**2), nearest_sq)
+
+    for corner_x, corner_z in _circle_rectangle_corners(a, b, r):
+        nearest_sq = np.minimum(nearest_sq, (x - corner_x)**2 + (z - corner_z)**2)
+
+    in_plane_dist = np.where(in_plane, 0, np.sqrt(nearest_sq))
+    return np.sqrt(in_plane_dist**2 + p[:, 1]**2)
+
+def _circle_rectangle_corners(a, b, r):
+    """Points where the circle of radius r crosses the edges of the [-a, a] x [-b, b] rectangle."""
+    corners = []
+    # plain floats, NumPy float64 scalars would promote float32 points
+    if r >= a and float(np.sqrt(r**2 - a**2)) <= b:
+        corners += [(sx * a, sz * float(np.sqrt(r**2 - a**2))) for sx in (-1, 1) for sz in (-1, 1)]
+    if r >= b and float(np.sqrt(r**2 - b**2)) <= a:
+        corners += [(sx * float(np.sqrt(r**2 - b**2)), sz * b) for sx in (-1, 1) for sz in (-1, 1)]
+    return corners
+
+# Distance to an open tube around the y axis from y = 0 (radius_bottom) to y = height (radius_top), a cone
+# frustum when the radii differ: the distance in the (radial, y) half plane to the profile segment
+def sdTube(p, radius_bottom, radius_top, height):
+    rho = np.sqrt(p[:, 0]**2 + p[:, 2]**2)
+    y = p[:, 1]
+    dr, dy = radius_top - radius_bottom, height
+    t = np.clip(((rho - radius_bottom) * dr + y * dy) / (dr**2 + dy**2), 0, 1)
+    return np.sqrt((rho - radius_bottom - t * dr)**2 + (y - t * dy)**2)
+
+
+def _block_box(p):
+    """Bounding box (lo, hi) of the points (column by column, reductions along the short axis of (N, 3) are slow)."""
+    return (np.array([p[:, axis].min(initial=np.inf) for axis in range(3)]),
+            np.array([p[:, axis].max(initial=-np.inf) for axis in range(3)]))
+
+
+def _evaluate_below(node, p, block, limit, memo, shared):
+    """
+    Evaluate node where its bounds allow it to be below limit (one value per point), which is all a min (or a
+    max against -limit) needs. block is the bounding box of p (see _block_box). Returns (points, field):
+    points is None when all of p was evaluated, else a boolean mask of the points evaluated, with the field at
+    p[points]. Elsewhere the node is above limit.
+    """
+    lo, hi = node.bounds()
+    # the whole block at once first: inside the box, or farther from it than every limit
+    block_gap = max(np.max(lo - block[1]), np.max(block[0] - hi))
+    if block_gap <= 0:
+        return None, node._evaluate(p, memo, shared)
+    limit = np.maximum(limit, 0)
+    if block_gap > limit.max():
+        return np.zeros(len(p), dtype=bool), np.empty(0, dtype=limit.dtype)
+
+    # per point: the gap to the box, positive outside it, is the lower bound of the field
+    gap = np.maximum(lo[0] - p[:, 0], p[:, 0] - hi[0])
+    for axis in (1, 2):
+        np.maximum(gap, lo[axis] - p[:, axis], out=gap)
+        np.maximum(gap, p[:, axis] - hi[axis], out=gap)
+    needed = gap <= limit
+    count = np.count_nonzero(needed)
+    if count > len(p) // 2:
+        return None, node._evaluate(p, memo, shared)  # gathering most points costs more than it saves
+    if count == 0:
+        return needed, np.empty(0, dtype=limit.dtype)
+    return needed, node._evaluate(p[needed], memo, shared)
+
+
+class SDF:
+    """
+    Node of a distance field expression tree. Leaves are primitives, inner nodes combine or move their children.
+    Nodes are combined with | (union), & (intersection) and - (subtraction), and moved with translate/rotate.
+    """
+
+    def __call__(self, points, out=None, block_size=BLOCK_SIZE):
+        return self.evaluate(points, out=out, block_size=block_size)
+
+    def evaluate(self, points, out=None, block_size=BLOCK_SIZE):
+        """
+        Evaluate the whole tree over an (N, 3) points buffer, block_size points at a time.
+        The result is written into out (allocated with the dtype of the points if not given).
+        """
+        points = np.asarray(points)
+        if out is None:
+            dtype = points.dtype if np.issubdtype(points.dtype, np.floating) else np.float64
+            out = np.empty(len(points), dtype=dtype)
+        shared = self._shared_nodes()
+        for start in range(0, len(points), block_size):
+            stop = min(start + block_size, len(points))
+            out[start:stop] = self._evaluate(points[start:stop], {} if shared else None, shared)
+        return out
+
+    def _evaluate(self, p, memo, shared):
+        """
+        Evaluate the node over one block of points, reusing the field of nodes used more than once when they
+        are reached with the same points (a node placed twice by different transforms sees different points).
+        """
+        if memo is not None and id(self) in shared:
+            entry = memo.get(id(self))
+            if entry is None or entry[0] is not p:
+                with span(f"sdf.{type(self).__name__}", len(p)):
+                    entry = memo[id(self)] = (p, self._field(p, memo, shared))
+            return entry[1]
+        with span(f"sdf.{type(self).__name__}", len(p)):
+            return self._field(p, memo, shared)
+
+    def _field(self, p, memo, shared):
+        raise NotImplementedError
+
+    def _combine(self, fields):
+        """For nodes combining their children: the field of the node from the fields of its children."""
+        raise NotImplementedError
+
+    def interval(self, centers, half_diagonal):
+        """
+        Bounds (lo, hi) of the node over the balls of radius half_diagonal around the (N, 3) centers, which
+        contain the cells they are the centers of. Used to skip the cells the surface can not go through.
+        """
+        centers = np.asarray(centers, dtype=np.float64)
+        return self._interval(centers, np.broadcast_to(np.asarray(half_diagonal, dtype=np.float64), len(centers)))
+
+    def _interval(self, c, h):
+        # default for leaves: a 1-Lipschitz field changes by at most h over the ball
+        f = self._field(c, None, ())
+        return f - h, f + h
+
+    def bounds(self):
+        """
+        Box (lo, hi) bounding the node from below: outside it, the field is at least the Chebyshev (L-inf)
+        distance to the box (inside, anything). The default is unbounded, every node overrides it when it can.
+        """
+        return np.full(3, -np.inf), np.full(3, np.inf)
+
+    def children(self):
+        return ()
+
+    def _shared_nodes(self):
+        """Ids of the nodes reachable through more than one path (e.g. the inner cylinder of the wormhole)."""
+        seen, shared, stack = set(), set(), [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                shared.add(id(node))
+                continue
+            seen.add(id(node))
+            stack.extend(node.children())
+        return shared
+
+    def __or__(self, other):
+        return Union(self, other)
+
+    def __and__(self, other):
+        return Intersection(self, other)
+
+    def __sub__(self, other):
+        return Subtraction(self, other)
+
+    def _transform(self, p):
+        """For nodes moving their child: the points at which the child is evaluated (None for other nodes)."""
+        return None
+
+    def translate(self, offset):
+        return Translate(self, offset)
+
+    def rotate(self, axis, angle):
+        return Rotate(self, axis, angle)
+
+
+########### primitives ###########
+
+class OpenCylinder(SDF):
+    """Cylinder around the y axis, see sdOpenCylinder."""
+
+    def __init__(self, radius, height):
+        self.radius = radius
+        self.height = height
+
+    def _field(self, p, memo, shared):
+        return sdOpenCylinder(p, self.radius, self.height)
+
+    def bounds(self):
+        r = max(self.radius, 0)
+        return np.array([-r, -self.height / 2, -r]), np.array([r, self.height / 2, r])
+
+
+class SemiCylinder(SDF):
+    """Half cylinder along the x axis shifted by shift_x along z, see sdSemiCylinder."""
+
+    def __init__(self, radius, height, shift_x):
+        self.radius = radius
+        self.height = height
+        self.shift_x = shift_x
+
+    def _field(self, p, memo, shared):
+        return sdSemiCylinder(p, self.radius, self.height, self.shift_x)
+
+    def bounds(self):
+        # infinite outside |x| <= height/2, z > shift_x, and at least the radial distance beyond the half disk
+        r = max(self.radius, 0)
+        return np.array([-self.height / 2, -r, self.shift_x]), np.array([self.height / 2, r, self.shift_x + r])
+
+    def _interval(self, c, h):
+        # radial distance where the half cylinder is defined (|x| <= height/2, z > shift_x), infinity elsewhere
+        rotated_x = c[:, 2] - self.shift_x
+        radial = np.sqrt(rotated_x**2 + c[:, 1]**2) - self.radius
+        outside_x = np.abs(c[:, 0]) - self.height / 2
+        outside_z = -rotated_x
+        distance_to_region = np.hypot(np.maximum(outside_x, 0), np.maximum(outside_z, 0))
+        depth_in_region = -np.maximum(outside_x, outside_z)  # how far the center is inside the region
+
+        lo = np.where(distance_to_region > h, np.inf, radial - h)
+        hi = np.where(depth_in_region >= h, radial + h, np.inf)
+        return lo, hi
+
+
+class Box(SDF):
+    """Axis aligned box centered at the origin with half sizes size, see sdBox."""
+
+    def __init__(self, size):
+        self.size = np.asarray(size, dtype=float)
+
+    def _field(self, p, memo, shared):
+        return sdBox(p, self.size.astype(p.dtype, copy=False))  # keep float32 points in float32
+
+    def bounds(self):
+        size = np.maximum(self.size, 0)
+        return -size, size
+
+
+class HalfPipe(SDF):
+    """Unsigned distance to a half pipe around the x axis (z >= 0 side), see sdHalfPipe."""
+
+    def __init__(self, width, radius):
+        self.width = width
+        self.radius = radius
+
+    def _field(self, p, memo, shared):
+        return sdHalfPipe(p, self.width, self.radius)
+
+    def bounds(self):
+        r = abs(self.radius)
+        return np.array([-self.width / 2, -r, 0]), np.array([self.width / 2, r, r])
+
+
+class HoledRectangle(SDF):
+    """Unsigned distance to a rectangle in the y = 0 plane with a centered circular hole, see sdHoledRectangle."""
+
+    def __init__(self, size_x, size_z, hole_radius):
+        self.size_x = size_x
+        self.size_z = size_z
+        self.hole_radius = hole_radius
+
+    def _field(self, p, memo, shared):
+        return sdHoledRectangle(p, self.size_x, self.size_z, self.hole_radius)
+
+    def bounds(self):
+        return np.array([-self.size_x / 2, 0, -self.size_z / 2]), np.array([self.size_x / 2, 0, self.size_z / 2])
+
+
+class Tube(SDF):
+    """Unsigned distance to an open tube (cylinder or cone frustum) along the y axis, see sdTube."""
+
+    def __init__(self, radius_bottom, radius_top, height):
+        self.radius_bottom = radius_bottom
+        self.radius_top = radius_top
+        self.height = height
+
+    def _field(self, p, memo, shared):
+        return sdTube(p, self.radius_bottom, self.radius_top, self.height)
+
+    def bounds(self):
+        r = max(abs(self.radius_bottom), abs(self.radius_top))
+        return np.array([-r, min(self.height, 0), -r]), np.array([r, max(self.height, 0), r])
+
+
+########### combinations ###########
+
+class Union(SDF):
+    def __init__(self, *nodes):
+        self.nodes = nodes
+
+    def children(self):
+        return self.nodes
+
+    def _field(self, p, memo, shared):
+        # every other node is only evaluated where its bounds let it go below the minimum so far
+        field = self.nodes[0]._evaluate(p, memo, shared)
+        block = _block_box(p)
+        for node in self.nodes[1:]:
+            points, other = _evaluate_below(node, p, block, field, memo, shared)
+            if points is None:
+                field = np.minimum(field, other)
+            elif len(other):
+                field = field.copy()
+                field[points] = np.minimum(field[points], other)
+        return field
+
+    def _combine(self, fields):
+        fields = iter(fields)
+        field = next(fields)
+        for other in fields:
+            field = np.minimum(field, other)
+        return field
+
+    def bounds(self):
+        boxes = [node.bounds() for node in self.nodes]
+        return np.min([lo for lo, _ in boxes], axis=0), np.max([hi for _, hi in boxes], axis=0)
+
+    def _interval(self, c, h):
+        lo, hi = self.nodes[0]._interval(c, h)
+        for node in self.nodes[1:]:
+            node_lo, node_hi = node._interval(c, h)
+            lo, hi = np.minimum(lo, node_lo), np.minimum(hi, node_hi)
+        return lo, hi
+
+
+class Intersection(SDF):
+    def __init__(self, *nodes):
+        self.nodes = nodes
+
+    def children(self):
+        return self.nodes
+
+    def _field(self, p, memo, shared):
+        return self._combine(node._evaluate(p, memo, shared) for node in self.nodes)
+
+    def _combine(self, fields):
+        fields = iter(fields)
+        field = next(fields)
+        for other in fields:
+            field = np.maximum(field, other)
+        return field
+
+    def _interval(self, c, h):
+        lo, hi = self.nodes[0]._interval(c, h)
+        for node in self.nodes[1:]:
+            node_lo, node_hi = node._interval(c, h)
+            lo, hi = np.maximum(lo, node_lo), np.maximum(hi, node_hi)
+        return lo, hi
+
+    def bounds(self):
+        # the max is above every node, so the box of any of them bounds it: take the smallest
+        return min((node.bounds() for node in self.nodes), key=lambda box: np.prod(box[1] - box[0]))
+
+
+class Subtraction(SDF):
+    """Carve b out of a: max(a, -b)."""
+
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def children(self):
+        return (self.a, self.b)
+
+    def _field(self, p, memo, shared):
+        # b only matters where -b can be above a, i.e. b below -a
+        a = self.a._evaluate(p, memo, shared)
+        points, b = _evaluate_below(self.b, p, _block_box(p), -a, memo, shared)
+        if points is None:
+            return self._combine((a, b))
+        field = a.copy()
+        field[points] = self._combine((a[points], b))
+        return field
+
+    def _combine(self, fields):
+        a, b = fields
+        return np.maximum(a, -b)
+
+    def _interval(self, c, h):
+        a_lo, a_hi = self.a._interval(c, h)
+        b_lo, b_hi = self.b._interval(c, h)
+        return np.maximum(a_lo, -b_hi), np.maximum(a_hi, -b_lo)
+
+    def bounds(self):
+        return self.a.bounds()
+
+
+class Shell(SDF):
+    """
+    Thicken the surface of a node into a solid wall of the given thickness: |f| - thickness / 2. Turns the
+    unsigned distance of an open surface into a signed field that marching cubes can extract.
+    """
+
+    def __init__(self, node, thickness):
+        self.node = node
+        self.thickness = thickness
+
+    def children(self):
+        return (self.node,)
+
+    def _field(self, p, memo, shared):
+        return self._combine((self.node._evaluate(p, memo, shared),))
+
+    def _combine(self, fields):
+        field, = fields
+        return np.abs(field) - self.thickness / 2
+
+    def _interval(self, c, h):
+        lo, hi = self.node._interval(c, h)
+        abs_lo = np.where(lo >= 0, lo, np.where(hi <= 0, -hi, 0))
+        abs_hi = np.maximum(np.abs(lo), np.abs(hi))
+        return abs_lo - self.thickness / 2, abs_hi - self.thickness / 2
+
+    def bounds(self):
+        # |f| - t/2 >= d - t/2 where f >= d: the box grows by t/2 on every side
+        lo, hi = self.node.bounds()
+        return lo - self.thickness / 2, hi + self.thickness / 2
+
+
+########### transformations ###########
+
+class Translate(SDF):
+    """Move the node by offset."""
+
+    def __init__(self, node, offset):
+        self.node = node
+        self.offset = np.asarray(offset, dtype=float)
+
+    def children(self):
+        return (self.node,)
+
+    def _transform(self, p):
+        return p - self.offset.astype(p.dtype, copy=False)
+
+    def _field(self, p, memo, shared):
+        return self.node._evaluate(self._transform(p), memo, shared)
+
+    def _interval(self, c, h):
+        return self.node._interval(c - self.offset, h)
+
+    def bounds(self):
+        lo, hi = self.node.bounds()
+        return lo + self.offset, hi + self.offset
+
+
+class Rotate(SDF):
+    """Rotate the node by angle (radians) around axis, through the origin."""
+
+    def __init__(self, node, axis, angle):
+        self.node = node
+        axis = np.asarray(axis, dtype=float)
+        axis = axis / np.linalg.norm(axis)
+        # Rodrigues' rotation formula
+        k = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+        self.matrix = np.eye(3) + np.sin(angle) * k + (1 - np.cos(angle)) * k @ k
+
+    def children(self):
+        return (self.node,)
+
+    def _transform(self, p):
+        # rotating the shape by R is evaluating the node at R^T p, for row vectors p @ R.
+        # Written out elementwise (not with BLAS) so the result does not depend on how the points are blocked
+        m = self.matrix.astype(p.dtype, copy=False)
+        rotated = np.empty_like(p)
+        for axis in range(3):
+            rotated[:, axis] = p[:, 0] * m[0, axis] + p[:, 1] * m[1, axis] + p[:, 2] * m[2, axis]
+        return rotated
+
+    def _field(self, p, memo, shared):
+        return self.node._evaluate(self._transform(p), memo, shared)
+
+    def _interval(self, c, h):
+        return self.node._interval(self._transform(c), h)  # rotations keep distances, the balls keep their radius
+
+    # no bounds: the Chebyshev distance to a box is not kept by rotations, the node stays unbounded
+
+
+def wormhole_scene(new_outer_radius, height, cube_size, grid_spacing):
+    """
+    The combined structure of the df scripts: a hollow cylinder, a hollow cube with the inner cylinder
+    carved through it and a semi-cylinder moved by the cube size. Wall thicknesses are one grid_spacing.
+    Evaluating it gives the same values as the combined_sdf the scripts compute primitive by primitive.
+    """
+    inner_radius = new_outer_radius - grid_spacing
+    inner_cylinder = OpenCylinder(inner_radius, height + 2)
+
+    # hollow cylinder from the outer and inner open cylinders
+    hollow_cylinder = OpenCylinder(new_outer_radius, height) - inner_cylinder
+
+    # hollow cube, with the inner cylinder making holes in it
+    outer_cube = Box([cube_size, cube_size, cube_size])
+    inner_cube = Box(np.array([cube_size + 1, cube_size, cube_size + 1]) - grid_spacing)
+    hollow_cube = outer_cube - inner_cube - inner_cylinder
+
+    # semi-cylinder, moved by the cube size
+    semi_cylinder = SemiCylinder(cube_size, height, cube_size)
+
+    return Union(hollow_cylinder, hollow_cube, semi_cylinder)
+
+
+def bent_space_scene(width, radius, extension_length, hole_radius, cylinder_radius_top, cylinder_height,
+                     thickness=0.0):
+    """
+    Exact distance to the wormhole of wormhole.py, with the parameters of create_bent_space and create_wormhole:
+    the semi-circular bend, the bottom (y = -2 * radius) and upper (y = 0) extensions with their holes, and the
+    cylinder placed between the holes as in the script (base at y = -2 * radius, axis at z = -extension_length / 2).
+
+    Every point costs O(1) whatever the resolution of the mesh. The field is the unsigned distance to the ideal
+    surfaces, so it differs from the distance to the mesh by the tessellation: the mesh approximates the bend
+    and the circles with straight edges, and create_wormhole leaves its last row of quads out. Like
+    create_wormhole, the cylinder has cylinder_radius_top at both ends. With thickness > 0 the surfaces are
+    thickened into walls (see Shell) and the result is a signed field.
+
+    Example usage:
+    >>> field = bent_space_scene(width, radius, extension_length, hole_radius, cylinder_radius_top, cylinder_height)
+    >>> distances = field(points)
+    """
+    bend = HalfPipe(width, radius).translate([0, -radius, 0])  # arc from y = 0 down to y = -2 * radius, z >= 0
+
+    # both extensions run from z = 0 back to z = -extension_length, the hole at their middle
+    plate = HoledRectangle(width, extension_length, hole_radius)
+    bottom_extension = plate.translate([0, -2 * radius, -extension_length / 2])
+    upper_extension = plate.translate([0, 0, -extension_length / 2])
+
+    cylinder = Tube(cylinder_radius_top, cylinder_radius_top, cylinder_height).translate(
+        [0, -2 * radius, -extension_length / 2])
+
+    field = Union(bend, bottom_extension, upper_extension, cylinder)
+    return Shell(field, thickness) if thickness > 0 else field
@@ -0,0 +1,280 @@
+"""
+Parameter sweeps of the wormhole pipelines (see wormhole_pipelines.PIPELINES) over a process pool.
+
+A sweep is a pipeline and a list of configs, given as a grid (every combination of the listed values) and/or
+as explicit configs, each completed with the pipeline defaults. Configs equal once completed are run once:
+every run is named by the cache_key of its pipeline and parameters. The runs are spread over a pool of
+processes, one core each (the pipelines run with their own workers, 1 by default), so the throughput of a
+sweep of many small runs grows with the core count.
+
+Each run writes its results (wormhole_pipelines.write_results) and a run.json into <output>/<key>, built in a
+temporary directory and renamed when complete, then the parent appends its record to <output>/manifest.jsonl as
+soon as it finishes, in completion order. A sweep restarted on the same output (after a crash or an
+interruption) skips the runs already in the manifest and retries the failed ones. The key does not include a
+code version: sweep into a new output directory after changing the generators.
+
+Example usage:
+$ python wormhole_sweep.py bent-space --set radius=3,5,8 --set hole_radius=0.5,1.0 --output out/sweep --workers 8
+$ python wormhole_sweep.py marching-cubes --grid grid.json --configs extra.json --output out/mc-sweep
+>>> records = run_sweep("marching-cubes", expand_grid({"grid_size": [64, 128], "cube_size": [1.0, 1.5]}), "out/mc")
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from wormhole_cache import cache_key
+from wormhole_grid import resolve_workers
+from wormhole_pipelines import PIPELINES, run_pipeline, uses_cache, write_results
+
+
+MANIFEST = "manifest.jsonl"
+
+
+########### configs ###########
+
+def expand_grid(grid):
+    """Every combination of the values of grid (name: list of values), the last name varying fastest."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _normalize(value, default):
+    # 64 and 64.0 are the same float parameter (and the same key)
+    if isinstance(default, float) and isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def complete_configs(pipeline, configs, base=None):
+    """
+    The configs completed with base and the pipeline defaults, and their keys (cache_key of the pipeline and the
+    parameters). Raises ValueError on unknown pipelines or parameters.
+    """
+    if pipeline not in PIPELINES:
+        raise ValueError(f"unknown pipeline {pipeline!r}, expected one of {', '.join(PIPELINES)}")
+    _, defaults = PIPELINES[pipeline]
+    completed = []
+    for config in configs:
+        # the config overrides base, which overrides the defaults
+        params = {**defaults, **(base or {}), **config}
+        unknown = set(params) - set(defaults)
+        if unknown:
+            raise ValueError(f"unknown parameters for {pipeline}: {', '.join(sorted(unknown))}")
+        params = {name: _normalize(value, defaults[name]) for name, value in params.items()}
+        completed.append((cache_key(f"sweep.{pipeline}", params), params))
+    return completed
+
+
+########### runs ###########
+
+def load_manifest(output_dir):
+    """The records of the completed runs of a sweep by key (a torn last line, from a crash, is ignored)."""
+    records = {}
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return records
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("error") is None:
+            records[record["key"]] = record
+    return records
+
+
+def _torn(path):
+    """Whether the file does not end with a newline (its last line was cut short)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if not f.tell():
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def _run(pipeline, params, key, output_dir, mesh_format, cache_dir, write):
+    """One run, in a pool process. Writes its results into output_dir/key (if write) and returns its record."""
+    cache = None
+    if cache_dir:
+        from wormhole_cache import ArrayCache
+
+        cache = ArrayCache(cache_dir)
+    start = time.perf_counter()
+    results = run_pipeline(pipeline, cache=cache, **params)
+    seconds = time.perf_counter() - start
+    record = {"key": key, "pipeline": pipeline, "params": params, "seconds": seconds,
+              "shapes": {name: list(np.shape(value)) for name, value in results.items()
+                         if isinstance(value, np.ndarray)}}
+    if write:
+        # complete or absent: a crash while writing leaves a temporary directory, never a partial run
+        tmp = os.path.join(output_dir, f".tmp-{uuid.uuid4().hex}")
+        try:
+            paths = write_results(results, tmp, mesh_format)
+            record["files"] = [os.path.relpath(path, tmp) for path in paths]
+            with open(os.path.join(tmp, "run.json"), "w") as f:
+                json.dump(record, f, indent=2)
+            final = os.path.join(output_dir, key)
+            # left by a run that crashed before its manifest line
+            shutil.rmtree(final, ignore_errors=True)
+            os.rename(tmp, final)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        record["dir"] = key
+    return record
+
+
+def run_sweep(pipeline, configs, output_dir, base=None, workers=None, mesh_format="ply", cache_dir=None,
+              write=True, resume=True):
+    """
+    Run a pipeline for every config over a pool of processes.
+
+    Parameters:
+    - pipeline (str): A name of wormhole_pipelines.PIPELINES.
+    - configs (list): Dicts of parameters (see expand_grid), completed with base and the pipeline defaults.
+    - output_dir (str): Where the runs and manifest.jsonl go.
+    - base (dict): Parameters shared by every config.
+    - workers (int): Processes, None for one per core.
+    - mesh_format (str): "ply" or "obj".
+    - cache_dir (str): A wormhole_cache.ArrayCache shared by the runs (entries are written atomically).
+    - write (bool): Write the results of every run (False for timing sweeps: only the manifest is written).
+    - resume (bool): Skip the runs already in the manifest of output_dir.
+
+    Returns:
+    - records (list): The record of every config, in config order: key, pipeline, params, seconds, shapes,
+      files and dir (relative to output_dir), or error for a failed run. Identical configs share a record.
+    """
+    if cache_dir and not uses_cache(pipeline):
+        raise ValueError(f"the {pipeline} pipeline evaluates no grid or mesh, it can not use a cache")
+    completed = complete_configs(pipeline, configs, base)
+    os.makedirs(output_dir, exist_ok=True)
+    done = load_manifest(output_dir) if resume else {}
+    # the runs an interrupted sweep was writing (one sweep at a time per output directory)
+    for name in os.listdir(output_dir):
+        if name.startswith(".tmp-"):
+            shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+    pending = {}
+    for key, params in completed:
+        if key not in done:
+            pending.setdefault(key, params)
+    print(f"sweep {pipeline}: {len(completed)} configs, {len(set(key for key, _ in completed))} distinct, "
+          f"{len(pending)} to run", file=sys.stderr)
+
+    records = dict(done)
+    if pending:
+        workers = min(resolve_workers(workers), len(pending))
+        # fresh interpreters: no state (threads, caches, locks) inherited from the caller
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, \
+                open(os.path.join(output_dir, MANIFEST), "a" if resume else "w") as manifest:
+            if _torn(manifest.name):
+                manifest.write("\n")  # ends the line a crash cut short, so the next record starts its own
+            futures = {pool.submit(_run, pipeline, params, key, output_dir, mesh_format, cache_dir, write): key
+                       for key, params in pending.items()}
+            for count, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                try:
+                    record = future.result()
+                except Exception as error:  # a failed config must not stop the sweep
+                    record = {"key": key, "pipeline": pipeline, "params": pending[key],
+                              "error": f"{type(error).__name__}: {error}"}
+                records[key] = record
+                # one line per finished run, on disk before the next one is awaited
+                manifest.write(json.dumps(record) + "\n")
+                manifest.flush()
+                os.fsync(manifest.fileno())
+                status = record.get("error") or f"{record['seconds']:.3f} s"
+                print(f"[{count}/{len(pending)}] {key[:12]} {status}", file=sys.stderr)
+    return [records[key] for key, _ in completed]
+
+
+########### command line ###########
+
+def _parse_value(name, default, value):
+    """A --set value parsed like the wormhole_cli option of the parameter (32.0 is accepted for an int)."""
+    from wormhole_cli import _option_type
+
+    parse = _option_type(name, default)
+    try:
+        return parse(value)
+    except (ValueError, argparse.ArgumentTypeError) as error:
+        if parse is int:
+            try:
+                number = float(value)
+            except ValueError:
+                number = None
+            if number is not None and number.is_integer():
+                return int(number)
+        raise ValueError(f"invalid value {value!r} for {name}: {error}") from None
+
+
+def _parse_set(pipeline, assignment):
+    """name=v1,v2,... with the values parsed like the wormhole_cli options of the pipeline."""
+    name, _, values = assignment.partition("=")
+    name = name.replace("-", "_")
+    _, defaults = PIPELINES[pipeline]
+    if name not in defaults or not values:
+        raise ValueError(f"expected name=value[,value...] with a parameter of {pipeline}, got {assignment!r}")
+    return name, [_parse_value(name, defaults[name], value) for value in values.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a wormhole pipeline over a parameter sweep.")
+    parser.add_argument("pipeline", choices=list(PIPELINES))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2",
+                        help="values of a parameter, the sweep is every combination (repeatable)")
+    parser.add_argument("--grid", help="JSON file of a grid: {name: [values]}, combined with --set")
+    parser.add_argument("--configs", help="JSON file of a list of configs, run in addition to the grid")
+    parser.add_argument("--base", help="JSON file of parameters shared by every config")
+    parser.add_argument("--output", "-o", help="output directory (default: out/sweep-<pipeline>)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("--format", choices=["ply", "obj"], default="ply", help="mesh file format")
+    parser.add_argument("--cache-dir", help="reuse generated meshes/volumes from this on-disk cache")
+    parser.add_argument("--no-write", action="store_true", help="only record the manifest (timing sweeps)")
+    parser.add_argument("--fresh", action="store_true", help="rerun every config instead of resuming")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+    grid.update(_parse_set(args.pipeline, assignment) for assignment in args.set)
+    configs = expand_grid(grid) if grid else []
+    if args.configs:
+        with open(args.configs) as f:
+            configs += json.load(f)
+    base = None
+    if args.base:
+        with open(args.base) as f:
+            base = json.load(f)
+    if not configs:
+        configs = [{}]  # the defaults (and base) alone
+
+    output = args.output or os.path.join("out", f"sweep-{args.pipeline}")
+    start = time.perf_counter()
+    records = run_sweep(args.pipeline, configs, output, base, args.workers, args.format, args.cache_dir,
+                        write=not args.no_write, resume=not args.fresh)
+    failed = sum(1 for record in records if record.get("error"))
+    print(f"sweep {args.pipeline}: {len(records)} configs in {time.perf_counter() - start:.3f} s, {failed} failed, "
+          f"manifest {os.path.join(output, MANIFEST)}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())